@@ -1,7 +1,7 @@
 import asyncio
 from dataclasses import asdict, is_dataclass
 from pathlib import Path
-from typing import Dict, Literal, List, TypeAlias
+from typing import Dict, Iterator, Literal, List, Set, TypeAlias
 
 from playwright.async_api import Page
 
@@ -131,22 +131,19 @@ class ClippyBase:
         task_gen = self.task_generators_avail[self.task_gen_from]
         return task_gen()
 
-    def _get_previous_commands(self, previous_commands: List[str] = []):
-        next_action_idx = 0
-
-        def _match_cmd_with_used_actions(action):
-            if not hasattr(action, "python_locator"):
-                return None
-
-            nonlocal next_action_idx
-            element_id = self.used_next_actions[next_action_idx].element_id
-
-            # if we use the element_id and it is not the last one, then increment the next_action_idx
-            if (next_action_idx + 1) < len(self.used_next_actions):
-                next_action_idx += 1
+    def _task_actions(self) -> Iterator[Action]:
+        if self.task is None:
+            return
+        for step in self.task.steps:
+            yield from step.actions
 
-            return element_id
+    def _link_actions(self, next_action: NextAction, before: Set[int]):
+        """actions captured while next_action was being used (not in `before`, ids of the actions before) are from it"""
+        for action in self._task_actions():
+            if id(action) not in before:
+                action.element_id = next_action.element_id
 
+    def _get_previous_commands(self, previous_commands: List[str] = []):
         if len(self.task.steps) < 1:  #
             return previous_commands
 
@@ -155,17 +152,9 @@ class ClippyBase:
                 if not isinstance(action, Action):
                     raise Exception("action is not an Action")
 
-                # last_cmd = f"{action.__class__.__name__}"
-                last_cmd = action.format_for_llm(
-                    element_id=_match_cmd_with_used_actions(action)
-                )
-
-                # gen_action = self.used_next_actions[next_action_idx]
-                # last_cmd = f"{action.__class__.__name__} {gen_action.element_id}"
-
-                # if gen_action.action_args:
-                #     last_cmd += f" - {gen_action.action_args}"
-
+                # element_id is only on the actions that came from a NextAction (see _link_actions) and since ids are
+                # stable it is the same id the element has in the elements the model sees now
+                last_cmd = action.format_for_llm(element_id=action.element_id)
                 previous_commands.append(last_cmd)
 
         return previous_commands
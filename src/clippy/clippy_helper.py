@@ -1,11 +1,17 @@
+import asyncio
 from collections import UserDict
+from typing import Dict
+from urllib.parse import urlparse
 
 from clippy import constants, logger
 from clippy.callback import Callback
 from clippy.capture import CaptureAsync
 from clippy.clippy_base import ClippyBase, TaskGenFromTypes
 from clippy.crawler import Crawler
+from clippy.crawler.browser_pool import BrowserPool
+from clippy.crawler.parser.ax_tree import AXTreeParser
 from clippy.crawler.parser.dom_snapshot import DOMSnapshotParser, element_allowed_fn
+from clippy.crawler.parser.parse_executor import ParseExecutor
 from clippy.dm import DataManager, LLMTaskGenerator, TaskBankManager
 from clippy.instructor import Instructor, NextAction
 from clippy.states import Action, Task
@@ -24,6 +30,29 @@ class Clippy(ClippyBase):
     data_manager: DataManager
     callback_manager: Callback = Callback()
 
+    # reuse the dom parser between steps and only re-parse what changed on the page (see DOMSnapshotParser.incremental)
+    incremental_parse: bool = False
+    # set to a ParseExecutor to parse large pages in a worker process instead of on the event loop
+    parse_executor: ParseExecutor = None
+    # set to a BrowserPool (started once for all the tasks) so start_capture does not launch a new browser every task
+    browser_pool: BrowserPool = None
+    # requests to block in the browser (images/fonts/trackers), see crawler.block_profiles
+    block_profile: str = "none"
+    # "record" saves the network traffic of the task (har) with the task data, "replay" serves it back offline
+    network_mode: str = "live"
+    # "motion"/"time" stop page animations so the page is stable right after an action, see crawler.FREEZE_MODES
+    freeze_mode: str = "off"
+    # keep the dom snapshot of every step with the task so it can be reparsed (`datamanager reparse`), a few MB a step
+    store_snapshots: bool = False
+    # "browser" does the first pass of the parse in the page rather than sending the whole DOMSnapshot over cdp
+    dom_extraction: str = "snapshot"
+    # how the page is turned into elements, "dom" (DOMSnapshotParser) or "ax" (AXTreeParser, accessibility tree).
+    # page_parser_domains overrides it for some sites, e.g. {"google.com": "ax"} (subdomains match too)
+    page_parser: str = "dom"
+    page_parser_domains: Dict[str, str] = {}
+    # shorter element list in the prompts (see stubs.compact), ids are the same
+    compact_prompt: bool = False
+
     def __init__(
         self,
         objective: str = constants.default_objective,
@@ -38,8 +67,29 @@ class Clippy(ClippyBase):
         database_path: str = f"{constants.ROOT_DIR}/data/db/db.json",
         seed: int = None,
         task_gen_from: TaskGenFromTypes = "taskbank",
+        page_parser: str = None,
+        compact_prompt: bool = None,
+        block_profile: str = None,
+        network_mode: str = None,
+        freeze_mode: str = None,
+        store_snapshots: bool = None,
         **kwargs,
     ) -> None:
+        if page_parser is not None:
+            self.page_parser = page_parser
+        if block_profile is not None:
+            self.block_profile = block_profile
+        if network_mode is not None:
+            self.network_mode = network_mode
+        if freeze_mode is not None:
+            self.freeze_mode = freeze_mode
+        if store_snapshots is not None:
+            self.store_snapshots = store_snapshots
+        # har of the task being replayed, see run_replay
+        self.replay_har_path: str = None
+        if compact_prompt is not None:
+            self.compact_prompt = compact_prompt
+
         super().__init__(
             objective=objective,
             start_page=start_page,
@@ -87,7 +137,16 @@ class Clippy(ClippyBase):
     async def start_capture(self, goto_start_page: bool = True):
         self.data_manager.capture_task(Task(self.objective))
         self.capture = CaptureAsync(data_manager=self.data_manager, clippy=self)
-        self.crawler = Crawler(headless=self.headless, clippy=self)
+        self.crawler = Crawler(
+            headless=self.headless,
+            clippy=self,
+            pool=self.browser_pool,
+            block_profile=self.block_profile,
+            network=self.network_mode,
+            har_path=self.har_path(),
+            freeze=self.freeze_mode,
+            track_dirty=self.incremental_parse,
+        )
 
         page = await self.capture.start(self.crawler, start_page=False)
 
@@ -101,6 +160,13 @@ class Clippy(ClippyBase):
             await page.goto(self.start_page)
         return page
 
+    def har_path(self) -> str | None:
+        if self.network_mode == "record":
+            return f"{self.data_manager.curr_task_output}/{Crawler.har_file}"
+        if self.network_mode == "replay":
+            return self.replay_har_path
+        return None
+
     async def end_capture(self):
         await self.crawler.end(task_dir=self.data_manager.curr_task_output)
         self.data_manager.save()
@@ -134,8 +200,9 @@ class Clippy(ClippyBase):
             await self.use_action(next_action)
 
     async def run_replay(self, **kwargs):
-        task = self.get_task_for_replay(self.data_manager.tasks)
+        task = self.get_task_for_replay()
         self.start_page = task.steps[0].url
+        self.replay_har_path = str(self.data_manager.get_folder(task) / Crawler.har_file)
         await self.start_capture(goto_start_page=True)
 
         for step in task.steps:
@@ -170,6 +237,7 @@ class Clippy(ClippyBase):
         action_type = action.action  # this is a weird name for this attribute
         self.used_next_actions.append(action)
         self.async_tasks["screenshot_event"].clear()
+        before = {id(task_action) for task_action in self._task_actions()}
 
         if action_locator := getattr(action, "locator", None):
             await action_locator.first.scroll_into_view_if_needed(timeout=5000)
@@ -183,9 +251,47 @@ class Clippy(ClippyBase):
 
         # use merge on steps as the capture might be multiple (e.g. click input and type)
         self.task.steps[-1].merge()
+        self._link_actions(action, before)
+
+    def page_parser_for(self, url: str) -> str:
+        hostname = urlparse(url).hostname or ""
+        for domain, page_parser in self.page_parser_domains.items():
+            if hostname == domain or hostname.endswith(f".{domain}"):
+                return page_parser
+        return self.page_parser
+
+    def get_dom_parser(self) -> DOMSnapshotParser | AXTreeParser:
+        if self.page_parser_for(self.crawler.page.url) == "ax":
+            return AXTreeParser(self.crawler)
+
+        dom_parser = getattr(self, "dom_parser", None)
+        if self.incremental_parse and isinstance(dom_parser, DOMSnapshotParser) and dom_parser.crawler is self.crawler:
+            return dom_parser
+        return DOMSnapshotParser(
+            self.crawler,
+            incremental=self.incremental_parse,
+            executor=self.parse_executor,
+            extraction=self.dom_extraction,
+        )
+
+    async def save_snapshot(self):
+        """keep the snapshot the elements came from with the step (if store_snapshots), see `datamanager reparse`"""
+        dom_parser, task = self.dom_parser, self.task
+        if not self.store_snapshots:
+            return
+        if not isinstance(dom_parser, DOMSnapshotParser) or (dom_parser.extraction != "snapshot"):
+            return
+        if (task is None) or (task.current is None) or (dom_parser.tree is None) or (dom_parser.page_size is None):
+            return
+        # copy of the id table now, the next parse can add to it while this is being written
+        backend_node_ids = list(dom_parser.stable_ids._backend_node_ids)
+        # compressing/writing a few MB would block the event loop
+        await asyncio.to_thread(
+            self.data_manager.save_snapshot, task.current.id, dom_parser.tree, dom_parser.page_size, backend_node_ids
+        )
 
     async def get_elements(self, filter_elements: bool = True):
-        self.dom_parser = DOMSnapshotParser(self.crawler)
+        self.dom_parser = self.get_dom_parser()
         await self.dom_parser.parse()
 
         elements = self.dom_parser.elements_of_interest
@@ -215,28 +321,19 @@ class Clippy(ClippyBase):
             except:
                 return el
 
-        def _filter_elem_fn(elems):
-            if not filter_elements:
-                return elems
-
-            return list(filter(element_allowed_fn, elems))
-
-        async with Instructor() as instructor:
+        async with Instructor(compact=self.compact_prompt) as instructor:
             # instructor = Instructor(use_async=True)
-            self.dom_parser = DOMSnapshotParser(self.crawler)  # need cdp_client and page so makes sense to use crawler
-            await self.dom_parser.parse()
-            title = await self.crawler.title
+            self.dom_parser = self.get_dom_parser()  # need cdp_client and page so makes sense to use crawler
 
             # get all the links/actions -- TODO: should these be on the instructor?
-            # filter out text/images that are not actionable
-            # all_elements = await self.get_elements(filter_elements=True)
-            all_elements = _filter_elem_fn(self.dom_parser.elements_of_interest)
+            # filter out text/images that are not actionable and only the first num_elems, stops parsing after that
+            all_elements = await self.dom_parser.parse_elements(
+                num_elems=num_elems, filter_fn=element_allowed_fn if filter_elements else None
+            )
+            await self.save_snapshot()
+            title = await self.crawler.title
             elements = list(map(_suffix_fn, all_elements))
 
-            # filter to only the first num_elems
-            if num_elems:
-                elements = elements[:num_elems]
-
             # filter with the language model to get the most likely actions, not using likelihoods
             if filter_elements:
                 logger.info(f"for `{title[:20]}` filtering {len(elements)} elements...")
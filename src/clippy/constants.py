@@ -7,6 +7,9 @@ ROOT_DIR = os.environ.get("CLIPPY_ROOT_DIR", "/Users/graham/code/clippy")
 # TODO: would be nice if i dont need to use the src/ prefix
 default_preload_injection_script = f"{ROOT_DIR}/src/clippy/crawler/inject/preload.js"
 default_empty_injection_script = f"{ROOT_DIR}/src/clippy/crawler/inject/empty.js"
+default_dirty_tracker_injection_script = f"{ROOT_DIR}/src/clippy/crawler/inject/dirty_tracker.js"
+default_settle_injection_script = f"{ROOT_DIR}/src/clippy/crawler/inject/settle.js"
+default_freeze_injection_script = f"{ROOT_DIR}/src/clippy/crawler/inject/freeze.js"
 
 
 # clippy defaults
@@ -31,6 +34,10 @@ input_delay: int = 100  # ms
 # for instance if we click a button and the page then shows a new modal that we input
 #  into but url does not change ideally this should be more `random`
 action_delay: float = 0.5  # seconds
+# rather than a fixed delay the crawler waits for the page to settle (see crawler/settle.py): no network, dom changes,
+# layout shifts or pending animation frames for settle_quiet seconds, but never longer than settle_timeout
+settle_quiet: float = 0.3  # seconds
+settle_timeout: float = 10.0  # seconds
 
 # related to matching on user input (e.g. allow user to type `r` or `random` to match random word)
 RANDOM_WORD_MATCH = ["random", "r"]
@@ -0,0 +1,167 @@
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Tuple
+from urllib.parse import urlparse
+
+from playwright.async_api import Page, Request, Route
+
+# NOTE:
+# there used to be a `ctx.route("**/*", lambda route: route.continue_())` on every context which sends every request
+# (images, fonts, analytics) through python and back for nothing.  a profile says what to block and by default it is
+# done in the browser with Network.setBlockedURLs (url patterns, nothing goes through python).  resource types can
+# only be matched by url there (file extension), a profile with intercept=True instead checks the actual resource type
+# in a playwright route, which is exact but is a python round trip per request so only use it when that matters.
+# the route falls back for what it does not block so the routes registered before it (har record/replay) still apply.
+
+IMAGE_EXTENSIONS = ("png", "jpg", "jpeg", "gif", "webp", "avif", "bmp", "ico", "svg")
+FONT_EXTENSIONS = ("woff", "woff2", "ttf", "otf", "eot")
+MEDIA_EXTENSIONS = ("mp4", "webm", "ogg", "ogv", "mp3", "wav", "m4a", "mov", "m3u8")
+
+# extensions for the playwright resource types
+RESOURCE_TYPE_EXTENSIONS = {"image": IMAGE_EXTENSIONS, "font": FONT_EXTENSIONS, "media": MEDIA_EXTENSIONS}
+
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googletagservices.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "bat.bing.com",
+    "clarity.ms",
+    "hotjar.com",
+    "segment.io",
+    "segment.com",
+    "mixpanel.com",
+    "amplitude.com",
+    "fullstory.com",
+    "nr-data.net",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "adnxs.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+)
+
+BLOCKED_ERROR = "net::ERR_BLOCKED_BY_CLIENT"
+
+# requests that can stay open for as long as the page does (long polling, streams), the only ones in_flight ages out
+LONG_LIVED_RESOURCE_TYPES = frozenset({"xhr", "fetch", "eventsource"})
+
+
+@dataclass(frozen=True)
+class BlockProfile:
+    name: str
+    resource_types: FrozenSet[str] = frozenset()
+    domains: FrozenSet[str] = frozenset()
+    # check resource types/domains in a playwright route instead of url patterns in the browser
+    intercept: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.resource_types or self.domains)
+
+    def url_patterns(self) -> List[str]:
+        """patterns for Network.setBlockedURLs"""
+        patterns = []
+        for resource_type in sorted(self.resource_types):
+            for ext in RESOURCE_TYPE_EXTENSIONS.get(resource_type, ()):
+                patterns += [f"*.{ext}", f"*.{ext}?*"]
+        for domain in sorted(self.domains):
+            patterns += [f"*://{domain}/*", f"*.{domain}/*"]
+        return patterns
+
+    def blocks(self, request: Request) -> bool:
+        if request.resource_type in self.resource_types:
+            return True
+        host = urlparse(request.url).hostname or ""
+        return any(host == domain or host.endswith(f".{domain}") for domain in self.domains)
+
+    async def route_handler(self, route: Route):
+        if self.blocks(route.request):
+            await route.abort("blockedbyclient")
+        else:
+            # not continue_, that goes straight to the network and skips the har router in record/replay
+            await route.fallback()
+
+
+BLOCK_PROFILES: Dict[str, BlockProfile] = {
+    "none": BlockProfile("none"),
+    "trackers": BlockProfile("trackers", domains=frozenset(TRACKER_DOMAINS)),
+    # images, media, fonts and trackers
+    "lean": BlockProfile(
+        "lean",
+        resource_types=frozenset(RESOURCE_TYPE_EXTENSIONS),
+        domains=frozenset(TRACKER_DOMAINS),
+    ),
+    # same as lean but matched on the resource type (an image without an extension is still blocked)
+    "lean-exact": BlockProfile(
+        "lean-exact",
+        resource_types=frozenset(RESOURCE_TYPE_EXTENSIONS),
+        domains=frozenset(TRACKER_DOMAINS),
+        intercept=True,
+    ),
+}
+
+
+def get_block_profile(profile: str | BlockProfile | None) -> BlockProfile:
+    if isinstance(profile, BlockProfile):
+        return profile
+    try:
+        return BLOCK_PROFILES[profile or "none"]
+    except KeyError:
+        raise ValueError(f"block profile must be one of {list(BLOCK_PROFILES)}, got `{profile}`")
+
+
+@dataclass
+class RequestStats:
+    """allowed/blocked requests for each page (by the url the main frame navigated to)"""
+
+    pages: Dict[str, Counter] = field(default_factory=dict)
+    current: str = None
+    # page each in flight request was counted for (a request can fail after the next navigation started) and when
+    # it was sent
+    _pending: Dict[Request, Tuple[str, float]] = field(default_factory=dict, repr=False)
+
+    def watch(self, page: Page):
+        page.on("request", self.on_request)
+        page.on("requestfailed", self.on_request_failed)
+        page.on("requestfinished", self.on_request_finished)
+
+    def on_request(self, request: Request):
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            self.current = request.url
+        self._pending[request] = (self.current, time.monotonic())
+        self.pages.setdefault(self.current, Counter())["allowed"] += 1
+
+    def on_request_failed(self, request: Request):
+        url, _ = self._pending.pop(request, (self.current, None))
+        if BLOCKED_ERROR in (request.failure or ""):
+            counter = self.pages.setdefault(url, Counter())
+            counter["allowed"] -= 1
+            counter["blocked"] += 1
+
+    def on_request_finished(self, request: Request):
+        self._pending.pop(request, None)
+
+    def in_flight(self, max_age: float = None) -> int:
+        """
+        requests sent but not finished.  with max_age xhr/fetch/eventsource requests sent more than max_age seconds
+        ago are not counted, a navigation (e.g. to a slow server) always is
+        """
+        if max_age is None:
+            return len(self._pending)
+        since = time.monotonic() - max_age
+
+        def counted(request: Request, sent: float) -> bool:
+            long_lived = (request.resource_type in LONG_LIVED_RESOURCE_TYPES) and not request.is_navigation_request()
+            return (sent >= since) or not long_lived
+
+        return sum(counted(request, sent) for request, (_, sent) in self._pending.items())
+
+    def report(self) -> Dict[str, Dict[str, int]]:
+        return {url: {"allowed": c["allowed"], "blocked": c["blocked"]} for url, c in self.pages.items()}
@@ -0,0 +1,298 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Set
+from urllib.parse import urlparse
+
+from playwright.async_api import Browser, BrowserContext, Playwright, Request
+
+from clippy import logger
+from clippy.constants import default_user_agent
+from clippy.crawler.selectors import Selector
+
+if TYPE_CHECKING:
+    from clippy.crawler.crawler import Crawler
+
+# NOTE:
+# starting playwright, registering the selectors and launching chromium is seconds per task which is most of the time
+# when there are hundreds of short tasks queued.  the pool does that once, keeps up to `size` browsers with contexts
+# that already have the preload/settle (and with track_dirty the dirty tracker) scripts, and a Crawler(pool=...) takes
+# one of those contexts on start and gives it back on end instead of closing everything.  a used context is closed
+# (fresh cookies/storage for the next task) and a new warm one is made in the background, or with reuse_contexts it is
+# cleared (cookies, permissions, the http cache and all storage of every origin it loaded a document from) and reused.
+# browsers that are disconnected are replaced, ones that hit max_uses are closed once their leases are back, and ones
+# with nothing leased for idle_timeout seconds are closed.
+
+
+class _MetricsChanged:
+    # the settle script calls __clippyMetricsChanged which is exposed when the context is warmed, before there is a
+    # crawler for it, so it goes through this to whichever crawler has the context at the time
+    def __init__(self):
+        self.crawler: "Crawler" = None
+
+    def __call__(self, *args):
+        if self.crawler is not None:
+            self.crawler.invalidate_page_metrics(*args)
+
+
+@dataclass
+class PooledContext:
+    ctx: BrowserContext
+    metrics_changed: _MetricsChanged
+    browser: "PooledBrowser" = None
+    # origins of the documents (pages/frames) loaded since the last reset, their storage is cleared on reset
+    origins: Set[str] = field(default_factory=set)
+
+    def on_request(self, request: Request):
+        if request.resource_type == "document" and (url := urlparse(request.url)).scheme in ("http", "https"):
+            self.origins.add(f"{url.scheme}://{url.netloc}")
+
+
+@dataclass
+class PooledBrowser:
+    browser: Browser
+    uses: int = 0
+    leased: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    warm: List[PooledContext] = field(default_factory=list)
+    retired: bool = False
+
+    @property
+    def healthy(self) -> bool:
+        return self.browser.is_connected() and not self.retired
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        size: int = 2,
+        headless: bool = False,
+        warm_contexts: int = 1,
+        max_uses_per_browser: int = 50,
+        idle_timeout: float = 300,
+        reuse_contexts: bool = False,
+        inject_preload: bool = True,
+        track_dirty: bool = False,
+    ):
+        self.size = size
+        self.headless = headless
+        # contexts kept ready per browser
+        self.warm_contexts = warm_contexts
+        self.max_uses_per_browser = max_uses_per_browser
+        # seconds a browser can have nothing leased before it is closed, None to keep them
+        self.idle_timeout = idle_timeout
+        self.reuse_contexts = reuse_contexts
+        self.inject_preload = inject_preload
+        # dirty tracker in every context, for crawlers that parse incrementally (see Crawler.track_dirty)
+        self.track_dirty = track_dirty
+
+        self.pw: Playwright = None
+        self.browsers: List[PooledBrowser] = []
+        self._lock = asyncio.Lock()
+        self._background: Set[asyncio.Task] = set()
+        self._reaper: asyncio.Task = None
+
+        self.launched = 0
+        self.leases = 0
+        self.warm_hits = 0
+        self.evicted = 0
+
+    async def __aenter__(self) -> "BrowserPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self, n_browsers: int = 1) -> "BrowserPool":
+        """start playwright, register the selectors and launch/warm n_browsers up front"""
+        from playwright.async_api import async_playwright
+
+        if self.pw is None:
+            self.pw = await async_playwright().start()
+            # selectors are per playwright instance and have to be registered before any context is made
+            self.selectors = await asyncio.gather(*Selector.register(self.pw))
+
+        for _ in range(min(n_browsers, self.size) - len(self.browsers)):
+            pooled = await self._launch()
+            await self._warm(pooled)
+
+        if self.idle_timeout and self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+        return self
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        for pooled in list(self.browsers):
+            await self._close_browser(pooled)
+        if self.pw is not None:
+            await self.pw.stop()
+            self.pw = None
+
+    async def _launch(self) -> PooledBrowser:
+        browser = await self.pw.chromium.launch(headless=self.headless)
+        pooled = PooledBrowser(browser)
+        self.browsers.append(pooled)
+        self.launched += 1
+        logger.info(f"browser pool launched browser {self.launched} ({len(self.browsers)}/{self.size})")
+        return pooled
+
+    async def _close_browser(self, pooled: PooledBrowser):
+        if pooled in self.browsers:
+            self.browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as err:
+            logger.info(f"browser pool error closing browser: {err}")
+
+    async def _new_context(self, pooled: PooledBrowser) -> PooledContext:
+        from clippy.crawler.crawler import Crawler
+
+        metrics_changed = _MetricsChanged()
+        ctx = await pooled.browser.new_context(user_agent=default_user_agent)
+        await Crawler.setup_context(
+            ctx, metrics_changed, inject_preload=self.inject_preload, track_dirty=self.track_dirty
+        )
+        context = PooledContext(ctx, metrics_changed, pooled)
+        if self.reuse_contexts:
+            ctx.on("request", context.on_request)
+        return context
+
+    async def _warm(self, pooled: PooledBrowser):
+        while pooled.healthy and len(pooled.warm) < self.warm_contexts:
+            context = await self._new_context(pooled)
+            # another _warm for the same browser may have filled it while this one was made
+            if len(pooled.warm) >= self.warm_contexts:
+                await context.ctx.close()
+                break
+            pooled.warm.append(context)
+
+    def _in_background(self, coro, pooled: PooledBrowser):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        task.add_done_callback(lambda task: self._background_done(task, pooled))
+
+    def _background_done(self, task: asyncio.Task, pooled: PooledBrowser):
+        if task.cancelled() or (err := task.exception()) is None:
+            return
+        # e.g. the browser crashed while warming, dont hand it out again
+        logger.info(f"browser pool background task failed, retiring browser: {err!r}")
+        pooled.retired = True
+        if pooled.leased == 0 and pooled in self.browsers:
+            self._in_background(self._close_browser(pooled), pooled)
+
+    async def _pick(self) -> PooledBrowser:
+        # health check, anything disconnected is dropped (the leases on it are already broken)
+        for pooled in [p for p in self.browsers if not p.browser.is_connected()]:
+            logger.info("browser pool dropping disconnected browser")
+            self.browsers.remove(pooled)
+
+        available = [p for p in self.browsers if p.healthy]
+        if (not available) or (all(p.leased for p in available) and len(self.browsers) < self.size):
+            return await self._launch()
+        # least busy, then the one with a warm context
+        return min(available, key=lambda p: (p.leased, not p.warm))
+
+    async def acquire(self, crawler: "Crawler") -> PooledContext:
+        """a ready context for crawler, see Crawler.start"""
+        if self.pw is None:
+            await self.start(n_browsers=0)
+
+        async with self._lock:
+            pooled = await self._pick()
+            pooled.uses += 1
+            pooled.leased += 1
+            pooled.last_used = time.monotonic()
+            if pooled.uses >= self.max_uses_per_browser:
+                pooled.retired = True
+
+        if pooled.warm:
+            context = pooled.warm.pop()
+            self.warm_hits += 1
+        else:
+            context = await self._new_context(pooled)
+        self._in_background(self._warm(pooled), pooled)
+
+        self.leases += 1
+        context.metrics_changed.crawler = crawler
+        crawler.pw, crawler.selectors = self.pw, self.selectors
+        crawler.browser, crawler.ctx = pooled.browser, context.ctx
+        return context
+
+    async def release(self, context: PooledContext, recycle: bool = False):
+        """
+        give back a context from acquire, the crawler's page should already be closed.  recycle closes it even with
+        reuse_contexts (e.g. it has har routes/recording that only finish on close)
+        """
+        pooled = context.browser
+        context.metrics_changed.crawler = None
+        pooled.leased -= 1
+        pooled.last_used = time.monotonic()
+
+        if pooled.retired or not pooled.browser.is_connected():
+            await context.ctx.close()
+            if pooled.leased == 0:
+                logger.info(f"browser pool closing browser after {pooled.uses} uses")
+                await self._close_browser(pooled)
+            return
+
+        if self.reuse_contexts and not recycle and len(pooled.warm) < self.warm_contexts:
+            try:
+                await self._reset(context)
+                pooled.warm.append(context)
+                return
+            except Exception as err:
+                logger.info(f"browser pool could not reset context: {err}")
+
+        await context.ctx.close()
+        self._in_background(self._warm(pooled), pooled)
+
+    async def _reset(self, context: PooledContext):
+        for page in context.ctx.pages:
+            await page.close()
+        await context.ctx.clear_cookies()
+        await context.ctx.clear_permissions()
+
+        # local/session storage, indexeddb, service workers and the http cache outlive the pages, Storage is a
+        # browser wide domain but it needs a page to get a cdp session from
+        page = await context.ctx.new_page()
+        try:
+            cdp_client = await context.ctx.new_cdp_session(page)
+            await cdp_client.send("Network.clearBrowserCache")
+            for origin in sorted(context.origins):
+                await cdp_client.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            await cdp_client.detach()
+        finally:
+            await page.close()
+        context.origins.clear()
+
+    async def evict_idle(self, now: float = None):
+        """close browsers that had nothing leased for idle_timeout seconds"""
+        now = now or time.monotonic()
+        for pooled in list(self.browsers):
+            if pooled.leased == 0 and (now - pooled.last_used) >= self.idle_timeout:
+                logger.info("browser pool closing idle browser")
+                self.evicted += 1
+                await self._close_browser(pooled)
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            async with self._lock:
+                await self.evict_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "browsers": len(self.browsers),
+            "leased": sum(p.leased for p in self.browsers),
+            "warm": sum(len(p.warm) for p in self.browsers),
+            "launched": self.launched,
+            "leases": self.leases,
+            "warm_hits": self.warm_hits,
+            "evicted": self.evicted,
+        }
@@ -1,6 +1,9 @@
 import asyncio
+import json
+import os
 import sys
-from typing import Awaitable, Callable, Sequence
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Sequence
+from urllib.parse import urlparse
 
 from playwright.async_api import Browser, BrowserContext, CDPSession, Page, PlaywrightContextManager
 
@@ -8,14 +11,36 @@ from clippy import logger
 from clippy.clippy_base import ClippyBase
 from clippy.constants import (
     END_EARLY_STR,
+    default_dirty_tracker_injection_script,
+    default_freeze_injection_script,
     default_preload_injection_script,
+    default_settle_injection_script,
     default_user_agent,
     default_viewport_size,
     input_delay,
+    settle_quiet,
+    settle_timeout,
 )
+from clippy.crawler.block_profiles import BlockProfile, RequestStats, get_block_profile
 from clippy.crawler.selectors import Selector
+from clippy.crawler.settle import SettleResult, SettleTimes, wait_for_settle
 from clippy.states.actions import NextAction
 
+if TYPE_CHECKING:
+    from clippy.crawler.browser_pool import BrowserPool, PooledContext
+
+
+# live goes to the network as usual.  record writes every request/response of the context to a har (the responses are
+# stored by content hash in the .zip) and replay serves from that har with nothing going to the network, so a task can
+# be re-run offline at disk speed
+NETWORK_MODES = ("live", "record", "replay")
+
+# off leaves the page as is.  motion makes the page reach a stable state right after an action (and snapshots and
+# screenshots the same every run): prefers-reduced-motion, no css transitions/animations, instant scrolling.  time also
+# holds animation loops and repeating timers (carousels, polling) on a virtual clock that moves freeze_time_step after
+# every action, see Crawler.advance_time.  the freeze script goes through Crawler.injection like the other scripts
+FREEZE_MODES = ("off", "motion", "time")
+
 
 class Crawler:
     """ideally i want to use crawler in async context manager but to make
@@ -29,9 +54,36 @@ class Crawler:
 
     # js scripts or evals
     end_early_js: str = "() => {playwright.resume()}"
+    page_metrics_js: str = """() => ({
+        devicePixelRatio: window.devicePixelRatio,
+        scrollX: window.scrollX,
+        scrollY: window.scrollY,
+        pageXOffset: window.pageXOffset,
+        pageYOffset: window.pageYOffset,
+        screenWidth: window.screen.width,
+        screenHeight: window.screen.height,
+        innerWidth: window.innerWidth,
+        innerHeight: window.innerHeight,
+    })"""
     preload_injection_script: str = default_preload_injection_script
+    # used by the incremental/full_page DOMSnapshotParser to know what changed between parses, only injected with
+    # track_dirty since it observes every mutation on the page
+    dirty_tracker_injection_script: str = default_dirty_tracker_injection_script
+    # lets the crawler wait for the page to settle after an action (see settle.py)
+    settle_injection_script: str = default_settle_injection_script
+    # page init script for the freeze modes, see FREEZE_MODES
+    freeze_injection_script: str = default_freeze_injection_script
+    # ms of virtual time that pass for each action with freeze="time", so held timers/loops still run (a fixed step
+    # rather than the real time taken so runs are the same)
+    freeze_time_step: float = 1000
 
     input_delay: int = input_delay
+    settle_quiet: float = settle_quiet
+    settle_timeout: float = settle_timeout
+    # xhr/fetch/eventsource in flight longer than this (long polling, streams) dont keep the page from settling
+    settle_max_request_age: float = 2.0
+    # file in the task folder for network record/replay
+    har_file: str = "network.har.zip"
 
     def __init__(
         self,
@@ -39,13 +91,44 @@ class Crawler:
         headless: bool = False,
         clippy: ClippyBase = None,
         save_trace: bool = False,
+        pool: "BrowserPool" = None,
+        block_profile: str | BlockProfile = "none",
+        network: str = "live",
+        har_path: str = None,
+        freeze: str = "off",
+        track_dirty: bool = False,
     ) -> None:
+        if network not in NETWORK_MODES:
+            raise ValueError(f"network must be one of {NETWORK_MODES}, got `{network}`")
+        if network != "live" and not har_path:
+            raise ValueError(f"network `{network}` needs a har_path")
+        if freeze not in FREEZE_MODES:
+            raise ValueError(f"freeze must be one of {FREEZE_MODES}, got `{freeze}`")
+
         self._started = False
         self.is_async = is_async
         self.headless = headless
         self.clippy = clippy
         self.save_trace = save_trace
+        # with a pool the browser/context come from it on start and go back to it on end (see BrowserPool)
+        self.pool = pool
+        self._lease: "PooledContext" = None
+        # what requests to block (see block_profiles), and the allowed/blocked counts per page
+        self.block_profile = get_block_profile(block_profile)
+        self.request_stats = RequestStats()
+        self.network = network
+        self.har_path = har_path
+        self.freeze = freeze
+        # inject the dirty tracker (for DOMSnapshotParser(incremental=True) or full_page), with a pool it is the pool's
+        self.track_dirty = track_dirty
+        self.settle_times = SettleTimes()
+        # set for tabs (see new_tab), they share the parent's browser/context and only own their page
+        self.parent: Crawler = None
+        # pages the crawler/its tabs are opening right now, see _on_context_page
+        self._opening = 0
         self._trace_running = False
+        # see page_metrics, reset on navigation/scroll/resize
+        self._page_metrics: Dict[str, float] = None
 
         if self.clippy:
             self.async_tasks = self.clippy.async_tasks
@@ -117,6 +200,17 @@ class Crawler:
             await self.cdp_client.detach()
         if hasattr(self, "page"):
             await self.page.close()
+        if self.parent is not None:
+            return
+        if hasattr(self, "ctx"):
+            self.ctx.remove_listener("page", self._on_context_page)
+        if self._lease is not None:
+            # browser/context/playwright belong to the pool
+            lease, self._lease = self._lease, None
+            if self.block_profile.intercept:
+                await self.ctx.unroute("**/*", self.block_profile.route_handler)
+            # the har is written when the context closes
+            return await self.pool.release(lease, recycle=self.network != "live")
         if hasattr(self, "ctx"):
             await self.ctx.close()
         if hasattr(self, "browser"):
@@ -128,6 +222,11 @@ class Crawler:
         if not self.is_async:
             raise Exception("end() can only be called in async mode")
         await self.end_tracer(task_dir=task_dir)
+        if self.block_profile.enabled:
+            for url, counts in self.request_stats.report().items():
+                logger.info(f"requests [{self.block_profile.name}] {counts} for {url}")
+        for domain, stats in self.settle_times.stats().items():
+            logger.info(f"settle times {stats} for {domain}")
 
         return await self._end_async()
 
@@ -137,29 +236,152 @@ class Crawler:
         return self
 
     async def start(self, inject_preload: bool = True):
+        if self.network == "replay" and not os.path.exists(self.har_path):
+            raise FileNotFoundError(f"no recorded network to replay at {self.har_path}")
+
         self._started, self.is_async = True, True
-        # ideally will make all this possible to use with then normal context manager
-        # i.e. something like `with playwright as pw: self.pw = pw``
-        await self.init_without_ctx_manager()
-        # Selectors must be registered before creating the page.
-        self.selectors = await asyncio.gather(*self.extend_selectors())
-        self.browser = await self.pw.chromium.launch(headless=self.headless)
-        self.ctx = await self.browser.new_context(user_agent=default_user_agent)
+        if self.pool is not None:
+            # already launched with selectors registered and the context set up (the pool's inject_preload is used)
+            if self.track_dirty and not self.pool.track_dirty:
+                logger.info("crawler wants track_dirty but the pool contexts dont have it, parses will all be full")
+            self._lease = await self.pool.acquire(self)
+        else:
+            # ideally will make all this possible to use with then normal context manager
+            # i.e. something like `with playwright as pw: self.pw = pw``
+            await self.init_without_ctx_manager()
+            # Selectors must be registered before creating the page.
+            self.selectors = await asyncio.gather(*self.extend_selectors())
+            self.browser = await self.pw.chromium.launch(headless=self.headless)
+            self.ctx = await self.browser.new_context(user_agent=default_user_agent)
+            await self.setup_context(
+                self.ctx,
+                self.invalidate_page_metrics,
+                inject_preload=inject_preload,
+                track_dirty=self.track_dirty,
+                injection=self.injection,
+            )
 
         # setup trace
         await self.start_tracer()
 
-        await self.ctx.route("**/*", lambda route: route.continue_())
-
-        if inject_preload:
-            await self.injection(ctx=self.ctx, script=self.preload_injection_script)
-
-        self.page = await self.ctx.new_page()
+        await self.setup_network()
+        if self.block_profile.intercept:
+            await self.ctx.route("**/*", self.block_profile.route_handler)
+        self.ctx.on("page", self._on_context_page)
+
+        return await self._new_page()
+
+    async def _new_page(self) -> Page:
+        root = self.parent or self
+        root._opening += 1
+        try:
+            self.page = await self.ctx.new_page()
+        finally:
+            root._opening -= 1
+        self.page.on("framenavigated", self._on_frame_navigated)
+        self.request_stats.watch(self.page)
         await self.page.set_viewport_size(default_viewport_size)
+        await self.setup_freeze()
+        self.invalidate_page_metrics()
 
         self.cdp_client = await self.get_cdp_client()
+        await self.block_requests()
         return self.page
 
+    async def new_tab(self) -> "Crawler":
+        """
+        another page in this crawler's context with its own cdp session, used like a crawler (parsers/capture hooks
+        take it the same way).  ending it only closes its page
+        """
+        tab = Crawler(
+            headless=self.headless, block_profile=self.block_profile, freeze=self.freeze, track_dirty=self.track_dirty
+        )
+        tab.parent = self
+        tab._started, tab.is_async = True, True
+        tab.pw, tab.selectors, tab.browser, tab.ctx = self.pw, self.selectors, self.browser, self.ctx
+        await tab._new_page()
+        return tab
+
+    @classmethod
+    async def setup_context(
+        cls,
+        ctx: BrowserContext,
+        metrics_changed: Callable,
+        inject_preload: bool = True,
+        track_dirty: bool = False,
+        injection: Callable[[BrowserContext, str], Awaitable] = None,
+    ):
+        """
+        init scripts every context gets, metrics_changed is called by the settle script on scroll/resize.  injection
+        adds each script (a crawler's `injection`), the pool has no crawler yet when it warms a context so it uses the
+        plain add_init_script
+        """
+        injection = injection or (lambda ctx, script: ctx.add_init_script(path=script))
+        if inject_preload:
+            # called on scroll/resize so the cached page metrics are not stale
+            await ctx.expose_function("__clippyMetricsChanged", metrics_changed)
+            await injection(ctx, cls.preload_injection_script)
+            await injection(ctx, cls.settle_injection_script)
+            if track_dirty:
+                await injection(ctx, cls.dirty_tracker_injection_script)
+
+    async def setup_freeze(self):
+        """
+        freeze init script on the page rather than the context so it works with pooled contexts and tabs, it applies
+        from the next navigation on
+        """
+        if self.freeze == "off":
+            return
+        await self.page.emulate_media(reduced_motion="reduce")
+        options = json.dumps({"time": self.freeze == "time"})
+        # the options are not a script file so they cant go through injection, they only have to run before it
+        await self.page.add_init_script(script=f"window.__clippyFreezeOptions = {options}")
+        await self.injection(self.page, self.freeze_injection_script)
+
+    async def advance_time(self, ms: float) -> int:
+        """with freeze="time", run the held animation frames/timers due in the next ms.  returns how many ran"""
+        if self.freeze != "time":
+            raise ValueError(f"advance_time needs freeze=\"time\", crawler has `{self.freeze}`")
+        ran = await self.page.evaluate("ms => window.__clippyAdvanceTime ? window.__clippyAdvanceTime(ms) : 0", ms)
+        if ran:
+            self.invalidate_page_metrics()
+        return ran
+
+    async def setup_network(self):
+        """har recording/replay for the context, see NETWORK_MODES"""
+        if self.network == "record":
+            os.makedirs(os.path.dirname(os.path.abspath(self.har_path)), exist_ok=True)
+            logger.info(f"recording network to {self.har_path}")
+            await self.ctx.route_from_har(self.har_path, update=True, update_content="attach", update_mode="minimal")
+        elif self.network == "replay":
+            logger.info(f"replaying network from {self.har_path}")
+            # anything that was not recorded fails rather than going to the network
+            await self.ctx.route_from_har(self.har_path, not_found="abort")
+
+    async def block_requests(self, cdp_client: CDPSession = None):
+        """block the profile's requests in the browser (no route, nothing goes through python)"""
+        if not self.block_profile.enabled or self.block_profile.intercept:
+            return
+        cdp_client = cdp_client or self.cdp_client
+        await cdp_client.send("Network.enable")
+        await cdp_client.send("Network.setBlockedURLs", {"urls": self.block_profile.url_patterns()})
+
+    async def _on_context_page(self, page: Page):
+        """
+        pages the site opens (popups, window.open) get the same blocking as the crawler's page and their requests are
+        counted in request_stats.  setBlockedURLs is per cdp session so it has to be sent for each of them, an
+        intercept profile is a context route so it already applies to them (and falls back to the har routes)
+        """
+        # the crawler's own pages/tabs are set up in _new_page, they have no opener
+        if self._opening and (await page.opener()) is None:
+            return
+        self.request_stats.watch(page)
+        try:
+            await self.block_requests(await self.ctx.new_cdp_session(page))
+        except Exception as err:
+            # closed before it could be set up
+            logger.info(f"could not block requests for opened page: {err!r}")
+
     async def start_tracer(self):
         logger.info("starting tracer...")
         if self.save_trace:
@@ -205,21 +427,57 @@ class Crawler:
         logger.info(f"added task {name}")
         return task
 
+    def invalidate_page_metrics(self, *args):
+        self._page_metrics = None
+
+    def _on_frame_navigated(self, frame):
+        if frame == self.page.main_frame:
+            self.invalidate_page_metrics()
+
+    async def page_metrics(self) -> Dict[str, float]:
+        """pixel ratio/scroll/screen size in one evaluate, cached until navigation, scroll, resize or an action"""
+        # the settle script's __clippyMetricsChanged is per context and goes to the parent, so tabs dont cache
+        if ((metrics := self._page_metrics) is None) or (self.parent is not None):
+            metrics = self._page_metrics = await self.page.evaluate(self.page_metrics_js)
+        return metrics
+
     async def page_size(self) -> Sequence[int]:
-        device_pixel_ratio = await self.page.evaluate("window.devicePixelRatio")
-        win_scroll_x = await self.page.evaluate("window.scrollX")
-        win_scroll_y = await self.page.evaluate("window.scrollY")
-        win_upper_bound = await self.page.evaluate("window.pageYOffset")
-        win_left_bound = await self.page.evaluate("window.pageXOffset")
-        win_width = await self.page.evaluate("window.screen.width")
-        win_height = await self.page.evaluate("window.screen.height")
-        return (device_pixel_ratio, win_scroll_x, win_scroll_y, win_upper_bound, win_left_bound, win_width, win_height)
+        metrics = await self.page_metrics()
+        return (
+            metrics["devicePixelRatio"],
+            metrics["scrollX"],
+            metrics["scrollY"],
+            metrics["pageYOffset"],
+            metrics["pageXOffset"],
+            metrics["screenWidth"],
+            metrics["screenHeight"],
+        )
+
+    async def wait_for_settle(self, timeout: float = None) -> SettleResult:
+        """wait for the page to settle after an action, returns as soon as it does (or after timeout seconds)"""
+        if self.freeze == "time":
+            try:
+                await self.advance_time(self.freeze_time_step)
+            except Exception as err:
+                # navigating, the new document starts its own clock
+                logger.info(f"could not advance the page clock: {err!r}")
+        result = await wait_for_settle(
+            self.page,
+            in_flight=lambda: self.request_stats.in_flight(max_age=self.settle_max_request_age),
+            quiet=self.settle_quiet,
+            timeout=timeout or self.settle_timeout,
+        )
+        self.settle_times.record(urlparse(self.page.url).netloc, result)
+        if not result.settled:
+            logger.info(f"page did not settle after {result.elapsed:.1f}s, still busy with {result.busy}")
+        self.invalidate_page_metrics()
+        return result
 
     async def execute_click(self, action: NextAction, **kwargs):
         loc = action.locator.nth(0)
         logger.info(f"doing click at {loc}")
         await loc.click(delay=self.input_delay)
-        await self.page.wait_for_load_state()
+        await self.wait_for_settle()
 
     async def execute_type(self, action: NextAction, **kwargs):
         await self.execute_click(action)
@@ -230,6 +488,7 @@ class Crawler:
         logger.info("doing enter...")
         # TODO: i should ask for next action after typing from LM, NOT just press enter
         await self.page.keyboard.press("Enter", delay=self.input_delay)
+        await self.wait_for_settle()
 
     async def execute_scroll(self, action: NextAction, **kwargs):
         viewport_height = self.page.viewport_size["height"]
@@ -243,3 +502,4 @@ class Crawler:
             await self.page.mouse.wheel(delta_x=0, delta_y=direction(1))
         elif action.action == "scrollup":
             await self.page.mouse.wheel(delta_x=0, delta_y=direction(-1))
+        self.invalidate_page_metrics()
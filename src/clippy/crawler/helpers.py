@@ -7,7 +7,7 @@ from playwright.async_api import Request, Route
 import atexit
 
 from clippy.utils.async_tools import run_async_func, _allow_nested_loop
-from clippy.constants import action_delay
+from clippy.crawler.settle import wait_for_settle
 
 
 async def ainput(string: str) -> str:
@@ -43,7 +43,7 @@ async def pause_crawler(page):
 
 async def all_cmd_input(page):
     user_input = None
-    await asyncio.sleep(action_delay)
+    await wait_for_settle(page)
 
     while user_input != "q":
         # user_input = input("enter command\n")
@@ -0,0 +1,92 @@
+// INFO: tracks what changed on the page since python last asked so DOMSnapshotParser (incremental=true) can skip
+// re-snapshotting/re-parsing a page that has not changed and only re-parse the regions that did.
+// the rects are computed when python asks rather than in the observer callback so we dont force layout on every
+// mutation
+;(() => {
+  if (window.__clippyTakeDirty) {
+    return
+  }
+
+  // past this many mutated elements its cheaper to just reparse the whole page
+  const MAX_TARGETS = 500
+
+  let dirty = {
+    mutated: false,
+    resized: false,
+    scrolled: false,
+    overflow: false,
+    targets: new Set(),
+  }
+
+  function _reset() {
+    dirty = { mutated: false, resized: false, scrolled: false, overflow: false, targets: new Set() }
+  }
+
+  function _markTarget(node) {
+    dirty.mutated = true
+    if (dirty.overflow) {
+      return
+    }
+
+    const el = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement
+    if (!el) {
+      dirty.overflow = true
+      return
+    }
+
+    dirty.targets.add(el)
+    if (dirty.targets.size > MAX_TARGETS) {
+      dirty.overflow = true
+      dirty.targets.clear()
+    }
+  }
+
+  function _rectDocument(el) {
+    const rect = el.getBoundingClientRect()
+    return {
+      x: rect.left + window.scrollX,
+      y: rect.top + window.scrollY,
+      width: rect.width,
+      height: rect.height,
+    }
+  }
+
+  const observer = new MutationObserver((mutations) => {
+    for (const mutation of mutations) {
+      _markTarget(mutation.target)
+    }
+  })
+  observer.observe(document, { subtree: true, childList: true, attributes: true, characterData: true })
+
+  window.addEventListener("resize", () => {
+    dirty.resized = true
+  })
+  window.addEventListener(
+    "scroll",
+    () => {
+      dirty.scrolled = true
+    },
+    { capture: true, passive: true }
+  )
+
+  // called from python, returns what changed and resets the state
+  window.__clippyTakeDirty = () => {
+    const rects = []
+    for (const el of dirty.targets) {
+      // removed elements have no box, the mutation on their parent covers them
+      if (el.isConnected) {
+        rects.push(_rectDocument(el))
+      }
+    }
+
+    const out = {
+      mutated: dirty.mutated,
+      resized: dirty.resized,
+      scrolled: dirty.scrolled,
+      overflow: dirty.overflow,
+      rects: rects,
+    }
+    _reset()
+    return out
+  }
+})()
@@ -0,0 +1,157 @@
+// INFO: stops the page from moving on its own so it is stable right after an action and snapshots/screenshots are
+// the same every time.  css transitions/animations finish instantly, smooth scrolling is instant and web animations
+// jump to their end.  with window.__clippyFreezeOptions.time (set before this script) animation loops and repeating
+// timers (carousels, tickers) are also held on a virtual clock that only moves when python calls
+// window.__clippyAdvanceTime(ms), one-off timers/frames still run so the page can render and react to input
+;(() => {
+  if (window.__clippyAdvanceTime) {
+    return
+  }
+
+  const options = window.__clippyFreezeOptions || {}
+
+  const css = `
+    *, *::before, *::after {
+      transition-duration: 0s !important;
+      transition-delay: 0s !important;
+      animation-duration: 0s !important;
+      animation-delay: 0s !important;
+      animation-iteration-count: 1 !important;
+      scroll-behavior: auto !important;
+      caret-color: transparent !important;
+    }
+  `
+
+  function _addStyle() {
+    const style = document.createElement("style")
+    style.id = "__clippy-freeze"
+    style.textContent = css
+    // there is no head yet when init scripts run
+    ;(document.head || document.documentElement).appendChild(style)
+  }
+
+  if (document.documentElement) {
+    _addStyle()
+  } else {
+    document.addEventListener("DOMContentLoaded", _addStyle, { once: true })
+  }
+
+  // smooth scrolling from js ignores scroll-behavior, force it to be instant
+  function _instant(fn) {
+    return function (arg, ...rest) {
+      if (arg && typeof arg === "object" && arg.behavior === "smooth") {
+        arg = { ...arg, behavior: "instant" }
+      }
+      return fn.call(this, arg, ...rest)
+    }
+  }
+
+  for (const target of [window, Element.prototype]) {
+    for (const name of ["scroll", "scrollTo", "scrollBy"]) {
+      if (target[name]) {
+        target[name] = _instant(target[name])
+      }
+    }
+  }
+  Element.prototype.scrollIntoView = _instant(Element.prototype.scrollIntoView)
+
+  const _animate = Element.prototype.animate
+  Element.prototype.animate = function (...args) {
+    const animation = _animate.apply(this, args)
+    try {
+      animation.finish()
+    } catch (e) {
+      // infinite animations cannot finish, stop them where they are
+      animation.pause()
+    }
+    return animation
+  }
+
+  // virtual clock for animation loops and repeating timers
+  let now = 0
+  let nextId = 1
+  // "timer" or "frame" while a callback of that kind runs, to tell loops/chains from one-offs
+  let running = null
+  // id -> {due, fn, args, interval}, interval is null for frames/timeouts and args is null for frames
+  const held = new Map()
+  // ids the page got back for held timers/frames are not real ids, so they have to be told apart when cleared
+  const HELD_ID_BASE = 1e9
+
+  function _hold(fn, args, delay, interval) {
+    const id = HELD_ID_BASE + nextId++
+    held.set(id, { due: now + Math.max(0, delay), fn, args, interval })
+    return id
+  }
+
+  function _run(kind, fn, args) {
+    const was = running
+    running = kind
+    try {
+      typeof fn === "function" ? fn(...args) : new Function(fn)()
+    } finally {
+      running = was
+    }
+  }
+
+  if (options.time) {
+    const _setTimeout = window.setTimeout.bind(window)
+    const _clearTimeout = window.clearTimeout.bind(window)
+    const _clearInterval = window.clearInterval.bind(window)
+    const _requestAnimationFrame = window.requestAnimationFrame.bind(window)
+    const _cancelAnimationFrame = window.cancelAnimationFrame.bind(window)
+
+    window.setTimeout = (fn, delay = 0, ...args) => {
+      // a timeout set from a callback is a timer chain (e.g. a carousel), short ones are usually the page yielding
+      if (running === "timer" && delay >= (options.minHeldDelay ?? 50)) {
+        return _hold(fn, args, delay, null)
+      }
+      return _setTimeout((...a) => _run("timer", fn, a), delay, ...args)
+    }
+    window.setInterval = (fn, delay = 0, ...args) => _hold(fn, args, delay, Math.max(1, delay))
+    window.clearTimeout = (id) => (held.delete(id) ? undefined : _clearTimeout(id))
+    window.clearInterval = (id) => (held.delete(id) ? undefined : _clearInterval(id))
+
+    window.requestAnimationFrame = (callback) => {
+      // a frame requested from a frame is an animation loop, it gets one frame per 16ms of virtual time
+      if (running === "frame") {
+        return _hold(callback, null, 16, null)
+      }
+      return _requestAnimationFrame((time) => _run("frame", callback, [time]))
+    }
+    window.cancelAnimationFrame = (id) => (held.delete(id) ? undefined : _cancelAnimationFrame(id))
+  }
+
+  // called from python, runs everything held that is due within ms and returns how many callbacks ran
+  window.__clippyAdvanceTime = (ms) => {
+    const until = now + ms
+    let ran = 0
+    while (true) {
+      let dueId = null
+      let next = null
+      for (const [id, timer] of held) {
+        if (timer.due <= until && (next === null || timer.due < next.due)) {
+          dueId = id
+          next = timer
+        }
+      }
+      if (next === null) {
+        break
+      }
+
+      now = next.due
+      if (next.interval === null) {
+        held.delete(dueId)
+      } else {
+        next.due += next.interval
+      }
+      try {
+        next.args === null ? _run("frame", next.fn, [performance.now()]) : _run("timer", next.fn, next.args)
+      } catch (e) {
+        console.error(e)
+      }
+      ran++
+    }
+    now = until
+    return ran
+  }
+})()
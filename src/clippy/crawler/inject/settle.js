@@ -0,0 +1,82 @@
+// INFO: what the page is still doing, so the crawler can wait for it to settle after an action instead of sleeping.
+// network in flight is tracked from python (playwright request events), this is the part only the page knows:
+// when the dom last changed, when the layout last shifted and animation frames that are waiting to run.
+// frames requested from inside a frame callback are an animation loop and would never finish so they dont count.
+// it also tells the crawler when its cached page metrics (scroll/size) are stale, this is injected into every page
+// whereas the dirty tracker is only there for incremental parsing
+;(() => {
+  if (window.__clippySettleState) {
+    return
+  }
+
+  let lastMutation = performance.now()
+  let lastShift = null
+  let inFrame = false
+  const pendingFrames = new Set()
+
+  const observer = new MutationObserver(() => {
+    lastMutation = performance.now()
+  })
+  observer.observe(document, { subtree: true, childList: true, attributes: true, characterData: true })
+
+  try {
+    new PerformanceObserver((list) => {
+      for (const entry of list.getEntries()) {
+        // shifts right after user input are expected (e.g. a dropdown opening)
+        if (!entry.hadRecentInput) {
+          lastShift = performance.now()
+        }
+      }
+    }).observe({ type: "layout-shift", buffered: true })
+  } catch (e) {
+    // layout-shift is chromium only
+  }
+
+  // one __clippyMetricsChanged call in flight at a time
+  let metricsChangedPending = false
+  function _metricsChanged() {
+    if (metricsChangedPending || !window.__clippyMetricsChanged) {
+      return
+    }
+    metricsChangedPending = true
+    window.__clippyMetricsChanged().finally(() => (metricsChangedPending = false))
+  }
+  window.addEventListener("resize", _metricsChanged)
+  window.addEventListener("scroll", _metricsChanged, { capture: true, passive: true })
+
+  const _requestAnimationFrame = window.requestAnimationFrame.bind(window)
+  const _cancelAnimationFrame = window.cancelAnimationFrame.bind(window)
+
+  window.requestAnimationFrame = (callback) => {
+    const looping = inFrame
+    const id = _requestAnimationFrame((time) => {
+      pendingFrames.delete(id)
+      inFrame = true
+      try {
+        callback(time)
+      } finally {
+        inFrame = false
+      }
+    })
+    if (!looping) {
+      pendingFrames.add(id)
+    }
+    return id
+  }
+
+  window.cancelAnimationFrame = (id) => {
+    pendingFrames.delete(id)
+    _cancelAnimationFrame(id)
+  }
+
+  // called from python, times are ms
+  window.__clippySettleState = () => {
+    const now = performance.now()
+    return {
+      readyState: document.readyState,
+      sinceMutation: now - lastMutation,
+      sinceShift: lastShift === null ? now : now - lastShift,
+      pendingFrames: pendingFrames.size,
+    }
+  }
+})()
@@ -0,0 +1,156 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Iterable, List, Tuple
+from urllib.parse import urlparse
+
+from clippy import logger
+from clippy.crawler.crawler import Crawler
+from clippy.crawler.parser.dom_snapshot import DOMSnapshotParser
+from clippy.crawler.parser.parse_executor import ParseExecutor
+
+# NOTE:
+# a Crawler drives one page so going through a lot of urls/tasks meant one process per tab.  the scheduler opens
+# `concurrency` tabs in the crawler's context (each is a Crawler from new_tab, with its own page and cdp session) and
+# every tab takes the next item from one bounded queue.  most of the time a tab is waiting on the network so many tabs
+# on one event loop keep it busy, and with a ParseExecutor the parsing goes to worker processes so it scales with
+# cores.  at most max_per_domain items for the same domain run at once, an item for a domain that is at its cap is
+# skipped over (not waited on) until one of its domain finishes.
+
+Handler = Callable[[Crawler, Any], Awaitable[Any]]
+
+
+def item_domain(item: Any) -> str:
+    """domain of a url, or of the url/start_page of anything else (e.g. a Task)"""
+    url = item if isinstance(item, str) else getattr(item, "url", None) or getattr(item, "start_page", None) or ""
+    return urlparse(url).netloc
+
+
+class PageScheduler:
+    def __init__(
+        self,
+        crawler: Crawler,
+        handler: Handler = None,
+        concurrency: int = 4,
+        max_per_domain: int = 2,
+        max_queue: int = 64,
+        setup_tab: Callable[[Crawler], Awaitable[None] | None] = None,
+        parse_executor: ParseExecutor = None,
+        domain_fn: Callable[[Any], str] = item_domain,
+    ):
+        """
+        handler is called with a tab and an item and its result is kept for the item (parse_page if not given).
+        setup_tab is called once for each tab when it is opened (e.g. to add capture hooks to tab.page)
+        """
+        self.crawler = crawler
+        self.handler = handler or self.parse_page
+        self.concurrency = concurrency
+        self.max_per_domain = max_per_domain
+        self.max_queue = max_queue
+        self.setup_tab = setup_tab
+        self.parse_executor = parse_executor
+        self.domain_fn = domain_fn
+
+        self.tabs: List[Crawler] = []
+        # (index, item) waiting for a tab
+        self._pending: List[Tuple[int, Any]] = []
+        self._active = Counter()
+        self._in_flight = 0
+        self._submitted = 0
+        self._closed = False
+        self._cond = asyncio.Condition()
+        self._workers: List[asyncio.Task] = []
+        self.results = {}
+
+    async def __aenter__(self) -> "PageScheduler":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker(n)) for n in range(self.concurrency)]
+
+    async def put(self, item: Any) -> int:
+        """add an item, waits while the queue is full.  returns the index its result is kept under"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: len(self._pending) < self.max_queue)
+            index = self._submitted
+            self._submitted += 1
+            self._pending.append((index, item))
+            self._cond.notify_all()
+        return index
+
+    async def join(self):
+        """wait until everything that was put is done"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._pending and not self._in_flight)
+
+    async def close(self):
+        """finish what is queued, then close the tabs"""
+        async with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        await asyncio.gather(*self._workers)
+        self._workers = []
+        for tab in self.tabs:
+            await tab.end()
+        self.tabs = []
+
+    async def map(self, items: Iterable[Any]) -> List[Any]:
+        """run every item and return the results (or the exception it raised) in the same order"""
+        await self.start()
+        indexes = [await self.put(item) for item in items]
+        await self.join()
+        return [self.results.pop(index) for index in indexes]
+
+    async def _take(self) -> Tuple[int, Any, str] | None:
+        async with self._cond:
+            while True:
+                for position, (index, item) in enumerate(self._pending):
+                    domain = self.domain_fn(item)
+                    if self._active[domain] < self.max_per_domain:
+                        del self._pending[position]
+                        self._active[domain] += 1
+                        self._in_flight += 1
+                        self._cond.notify_all()
+                        return index, item, domain
+                if self._closed and not self._pending:
+                    return None
+                await self._cond.wait()
+
+    async def _done(self, domain: str):
+        async with self._cond:
+            self._active[domain] -= 1
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    async def _open_tab(self) -> Crawler:
+        tab = await self.crawler.new_tab()
+        if self.setup_tab is not None:
+            if asyncio.iscoroutine(setup := self.setup_tab(tab)):
+                await setup
+        self.tabs.append(tab)
+        return tab
+
+    async def _worker(self, n: int):
+        tab = None
+        while (taken := await self._take()) is not None:
+            index, item, domain = taken
+            try:
+                # opened on the first item so there are never more tabs than there is work for
+                tab = tab or await self._open_tab()
+                self.results[index] = await self.handler(tab, item)
+            except Exception as err:
+                logger.info(f"page scheduler tab {n} failed on {item}: {err!r}")
+                self.results[index] = err
+            finally:
+                await self._done(domain)
+
+    async def parse_page(self, tab: Crawler, url: str) -> List[str]:
+        """default handler, elements_of_interest of the page at url"""
+        await tab.page.goto(url)
+        parser = DOMSnapshotParser(tab, executor=self.parse_executor)
+        await parser.parse()
+        return parser.elements_of_interest
@@ -0,0 +1,213 @@
+import asyncio
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from clippy.crawler.crawler import Crawler
+from clippy.crawler.parser.dom_snapshot import DOMParser, format_element
+from clippy.crawler.parser.element_table import ElementTable
+from clippy.crawler.parser.stable_ids import StableIds, stable_ids_for
+
+# NOTE:
+# second way to get the elements for a page (beside DOMSnapshotParser).  the accessibility tree already has the
+# role/name/value computed and hidden/presentational nodes pruned so there is much less to fetch and parse and the
+# element strings are tighter.  it has no layout so the boxes come from a DOMSnapshot with no computed styles (one
+# request at the same time as the ax tree, a DOM.getContentQuads per node was thousands of round trips on link heavy
+# pages) and the nodes outside the window are dropped right away.  page_element_buffer has the same keys as the
+# snapshot parser so get_loc_helper and the actions work the same, node_index is the AX node id.  element ids come
+# from the same per page table as the snapshot parser (see stable_ids) so they are the same whichever parser is used.
+
+# role -> converted_node_name (what the element strings start with, see element_allowed_fn/get_action_type)
+ROLE_NAMES = {
+    "link": "link",
+    "button": "button",
+    "menuitem": "button",
+    "menuitemcheckbox": "button",
+    "menuitemradio": "button",
+    "tab": "button",
+    "checkbox": "button",
+    "radio": "button",
+    "switch": "button",
+    "treeitem": "button",
+    "option": "button",
+    "textbox": "input",
+    "searchbox": "input",
+    "spinbutton": "input",
+    "slider": "input",
+    "combobox": "select",
+    "listbox": "select",
+    "image": "img",
+    "img": "img",
+    "heading": "text",
+    "StaticText": "text",
+}
+
+# separators that do not add anything, same as the snapshot parser skips
+_SKIP_TEXT = ("|", "•")
+
+
+def _ax_value(node: Dict[str, Any], key: str) -> Any:
+    return (node.get(key) or {}).get("value")
+
+
+def _ax_properties(node: Dict[str, Any]) -> Dict[str, Any]:
+    return {prop["name"]: prop.get("value", {}).get("value") for prop in node.get("properties", [])}
+
+
+def layout_boxes(snapshot: Dict[str, Any]) -> Dict[int, List[float]]:
+    """backendNodeId -> document box (x, y, width, height) for the main document of a DOMSnapshot"""
+    document = snapshot["documents"][0]
+    backend_node_ids, layout = document["nodes"]["backendNodeId"], document["layout"]
+    boxes = {}
+    for node_index, bounds in zip(layout["nodeIndex"], layout["bounds"]):
+        # a node can have more than one layout object (e.g. text split over lines), the first is its box
+        boxes.setdefault(backend_node_ids[node_index], bounds)
+    return boxes
+
+
+class AXTreeParser(DOMParser):
+    """builds elements_of_interest/page_element_buffer from `Accessibility.getFullAXTree`"""
+
+    def __init__(self, crawler: Crawler = None, keep_device_ratio: bool = False, *args, **kwargs):
+        super().__init__()
+        self.keep_device_ratio = keep_device_ratio
+        self.page_element_buffer = ElementTable()
+        self.elements_of_interest, self.ids_of_interest = [], []
+        self.tree = None
+
+        self.crawler = crawler
+        self.page = getattr(crawler, "page", None)
+        self.cdp_client = getattr(crawler, "cdp_client", None)
+        self.stable_ids: StableIds = stable_ids_for(self.page)
+
+    async def get_tree(self):
+        self.tree = await self.cdp_client.send("Accessibility.getFullAXTree", {})
+
+    async def get_layout(self) -> Dict[int, List[float]]:
+        """document boxes of every laid out node, layout only so no styles/rects are computed or sent"""
+        return layout_boxes(await self.cdp_client.send("DOMSnapshot.captureSnapshot", {"computedStyles": []}))
+
+    async def parse(self) -> List[str]:
+        _, layout, page_size = await asyncio.gather(self.get_tree(), self.get_layout(), self.crawler.page_size())
+        pixel_ratio, win_s_x, win_s_y, upper_b, lower_b, win_w, win_h = page_size
+
+        if roots := [node for node in self.tree["nodes"] if "parentId" not in node]:
+            # root is the document, new one means the page navigated
+            self.stable_ids.use_document(roots[0].get("backendDOMNodeId"))
+
+        # same window and pixel ratio as the snapshot parser so the elements are on the same scale for the actions
+        device_pixel_ratio, *window = self.window_bounds(upper_b, win_w, lower_b, win_h, pixel_ratio)
+        nodes = list(self.iter_nodes(self.tree["nodes"]))
+        boxes = [layout.get(node["backendDOMNodeId"]) for node, _ in nodes]
+        boxes = [[v / device_pixel_ratio for v in box] if box else None for box in boxes]
+        self.parse_tree(nodes, boxes, window)
+        return self.elements_of_interest
+
+    async def parse_elements(self, num_elems: int = None, filter_fn: Callable[[str], bool] = None) -> List[str]:
+        elements = await self.parse()
+        elements = list(filter(filter_fn, elements)) if filter_fn else elements
+        return elements[:num_elems] if num_elems else elements
+
+    def iter_nodes(self, ax_nodes: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        (ax node, converted_node_name) for the nodes that become elements, in tree order.  descendants of an element are
+        skipped since the name of a link/button/etc is already computed from them
+        """
+        by_id = {node["nodeId"]: node for node in ax_nodes}
+        roots = [node for node in ax_nodes if node.get("parentId") not in by_id]
+
+        stack = list(reversed(roots))
+        while stack:
+            node = stack.pop()
+            if (converted_node_name := self.converted_name(node)) is not None:
+                yield node, converted_node_name
+                continue
+            stack.extend(by_id[child] for child in reversed(node.get("childIds", [])) if child in by_id)
+
+    def converted_name(self, node: Dict[str, Any]) -> str | None:
+        if node.get("ignored") or ("backendDOMNodeId" not in node):
+            return None
+
+        role = _ax_value(node, "role")
+        if (converted_node_name := ROLE_NAMES.get(role)) is None:
+            return None
+
+        name = (_ax_value(node, "name") or "").strip()
+        if converted_node_name == "text" and (not name or name in _SKIP_TEXT):
+            return None
+        if converted_node_name in ("link", "button") and not (name or _ax_value(node, "description")):
+            # nothing to show for it, look at the children instead
+            return None
+        if converted_node_name == "img" and not name:
+            return None
+        if role == "combobox" and _ax_properties(node).get("editable"):
+            # e.g. search boxes with autocomplete
+            converted_node_name = "input"
+        return converted_node_name
+
+    def parse_tree(
+        self,
+        nodes: List[Tuple[Dict[str, Any], str]],
+        boxes: List[List[float] | None],
+        window: Tuple[float, float, float, float] = (0, 0, 2560, 2160),
+        scroll: Tuple[float, float] = (0, 0),
+    ) -> Tuple[List[str], List[int]]:
+        """
+        nodes from iter_nodes with their boxes (None if not laid out), window is (left, upper, right, lower) in document
+        coords and scroll is added to the boxes if they are viewport relative
+        """
+        win_left, win_upper, win_right, win_lower = window
+        elements = []
+        for (node, converted_node_name), box in zip(nodes, boxes):
+            if box is None:
+                continue
+            x, y, width, height = box[0] + scroll[0], box[1] + scroll[1], box[2], box[3]
+            if not (x < win_right and x + width >= win_left and y < win_lower and y + height >= win_upper):
+                continue
+            elements.append(self.make_element(node, converted_node_name, [x, y, width, height]))
+
+        self.page_element_buffer.clear()
+        elements_of_interest, ids_of_interest = [], []
+        for element in elements:
+            element_id = self.stable_ids[element["backend_node_id"]]
+            self.page_element_buffer[element_id] = element
+            if (element_string := format_element(element, element_id)) is not None:
+                elements_of_interest.append(element_string)
+                ids_of_interest.append(element_id)
+
+        self.elements_of_interest, self.ids_of_interest = elements_of_interest, ids_of_interest
+        return elements_of_interest, ids_of_interest
+
+    def make_element(self, node: Dict[str, Any], converted_node_name: str, bounds: List[float]) -> Dict[str, Any]:
+        """same keys as the DOMSnapshotParser elements"""
+        properties = _ax_properties(node)
+        name = " ".join((_ax_value(node, "name") or "").split())
+        value = _ax_value(node, "value")
+        value = str(value) if value not in (None, "") else None
+
+        node_meta = []
+        if description := _ax_value(node, "description"):
+            node_meta.append(description)
+        if value is not None:
+            node_meta.append(f'value="{value}"')
+        for key in ("checked", "selected", "expanded", "disabled"):
+            if properties.get(key) not in (None, False, "false"):
+                node_meta.append(f"{key}={properties[key]}")
+
+        x, y, width, height = bounds
+        return {
+            "node_index": str(node["nodeId"]),
+            "backend_node_id": node["backendDOMNodeId"],
+            "node_name": _ax_value(node, "role"),
+            "node_value": value,
+            "node_meta": node_meta,
+            "is_clickable": bool(properties.get("focusable")) or converted_node_name in ("link", "button"),
+            "origin_x": int(x),
+            "origin_y": int(y),
+            "center_x": int(x + (width / 2)),
+            "center_y": int(y + (height / 2)),
+            "bounds": bounds,
+            "selectors": {
+                "meta": f" {' '.join(node_meta)}" if node_meta else "",
+                "inner_text": name,
+                "converted_node_name": converted_node_name,
+            },
+        }
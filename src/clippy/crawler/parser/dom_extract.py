@@ -0,0 +1,99 @@
+import base64
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+from playwright.async_api import Page
+
+from clippy.crawler.selectors import ExtractSelector
+
+# NOTE:
+# DOMSnapshot.captureSnapshot sends every node and every string on the page and then parse_tree throws most of it
+# away.  with DOMSnapshotParser(extraction="browser") the first pass is done in the page by ExtractSelector.extract_js
+# and what comes back is just the nodes that can end up as elements (with their a/button/select ancestors) as flat
+# arrays.  extracted_tree puts those back in the captureSnapshot format so SnapshotIndex/the engines/the cache/the
+# executor all work on it unchanged, its just a much smaller snapshot.  the number arrays come over as base64 typed
+# array buffers (see ExtractSelector.extract_js) and unpack_payload turns them back into lists.
+
+# closest ancestor tags the first pass keeps track of (see snapshot_candidates_python)
+ANCESTOR_TAGS = ("a", "button", "select")
+
+# payload keys extract_js sends as Int32Array, bounds is a Float64Array
+INT32_KEYS = (
+    "parentIndex",
+    "nodeName",
+    "nodeValue",
+    "backendNodeId",
+    "attributes",
+    "attributeCounts",
+    "isClickable",
+    "layoutNodeIndex",
+)
+
+
+def _unpack(encoded: str, dtype: str) -> List[int | float]:
+    return np.frombuffer(base64.b64decode(encoded), dtype=dtype).tolist()
+
+
+def unpack_payload(packed: Dict[str, Any]) -> Dict[str, Any]:
+    """result of ExtractSelector.extract_js -> payload with plain lists, see extracted_tree"""
+    payload = dict(packed)
+    for key in INT32_KEYS:
+        payload[key] = _unpack(packed[key], "<i4")
+    payload["inputValue"] = {key: _unpack(value, "<i4") for key, value in packed["inputValue"].items()}
+    payload["bounds"] = _unpack(packed["bounds"], "<f8")
+    return payload
+
+
+def extracted_tree(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """unpacked result of ExtractSelector.extract_js -> single document captureSnapshot like dict"""
+    attributes, flat, start = [], payload["attributes"], 0
+    for count in payload["attributeCounts"]:
+        attributes.append(flat[start : start + count])
+        start += count
+
+    bounds = payload["bounds"]
+    layout_node_index = payload["layoutNodeIndex"]
+
+    return {
+        # token for the document the (made up) backendNodeIds are from, see StableIds.use_document
+        "extractedDocument": payload.get("document"),
+        "strings": payload["strings"],
+        "documents": [
+            {
+                "nodes": {
+                    "parentIndex": payload["parentIndex"],
+                    "nodeName": payload["nodeName"],
+                    "nodeValue": payload["nodeValue"],
+                    "backendNodeId": payload["backendNodeId"],
+                    "attributes": attributes,
+                    "inputValue": payload["inputValue"],
+                    "isClickable": {"index": payload["isClickable"]},
+                },
+                "layout": {
+                    "nodeIndex": layout_node_index,
+                    "bounds": [bounds[i : i + 4] for i in range(0, len(bounds), 4)],
+                    # display none nodes have no box so they are never extracted
+                    "styles": [[] for _ in layout_node_index],
+                },
+            }
+        ],
+    }
+
+
+async def extract_tree(
+    page: Page,
+    device_pixel_ratio: float,
+    window: Sequence[float],
+    black_listed_elements: Iterable[str],
+    attributes: List[str],
+) -> Dict[str, Any]:
+    """run the first pass in the page for the window (same as snapshot_candidates), returns a tree for parse_tree"""
+    options = {
+        "blacklist": sorted(black_listed_elements),
+        "attributes": attributes,
+        "tags": list(ANCESTOR_TAGS),
+        "window": list(window),
+        "devicePixelRatio": device_pixel_ratio,
+    }
+    packed = await page.evaluate(ExtractSelector.extract_js, options)
+    return extracted_tree(unpack_payload(packed))
@@ -3,9 +3,16 @@
 # this is from that but it seems very unlikely you can get that to work bugfree and consistently across all sites
 # use the selectors and grab by pos=x,y instead
 
-from typing import List
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Sequence, Tuple
+from urllib.parse import urlparse
+
 from playwright.sync_api import Page, Locator
 
+from clippy.crawler.parser.snapshot_index import SnapshotIndex
+
 
 def _clean_str_quotes(string: str, empty_ret: str = None) -> str:
     if string == "":
@@ -89,6 +96,21 @@ def _combine_node_meta(node_meta: List[str]):
     return out
 
 
+def _node_meta_from_index(element_buffer: dict, snapshot_index: SnapshotIndex):
+    # node_meta only has the values for the elements own attributes so _combine_node_meta has to guess they are all
+    # class names.  the snapshot index has the actual key/values so use those and only take the key="value" entries
+    # (which are merged in from the children of links/buttons) from node_meta
+    out = {}
+    for key, value in snapshot_index.attributes(int(element_buffer["node_index"])).items():
+        out[key] = value.split(" ") if key == "class" else [value]
+
+    for meta in element_buffer["node_meta"]:
+        if match := re.match(r'^([\w:-]+)="(.*)"$', meta):
+            key, value = match.groups()
+            out.setdefault(key, []).extend(value.split(" ") if key == "class" else [value])
+    return out
+
+
 def _get_role_info(el_meta: str):
     # example... may have multiple roles based on node_meta
     # 'link 20 role="text" role="text" "Soap - Wikipedia
@@ -153,228 +175,273 @@ def _loc_from_status(status: str, loc: Locator, old_loc: Locator | Page):
         return loc
 
 
-def _get_loc_with_buffer(element: str, element_buffer: dict, page: Page):
-    # this is possible the worst code i have ever written.  i have no idea how to parse this from the dom snapshot
-    # to get the locator.  probably to fix it means changing the dom snapshot tree crawl but that might break other
-    # another way to fix this could be using more regex patters but i am not sure if that solves some parts of finding
-    # the actual locator, rather it just makes parts of the code cleaner
-    # TODO: make len(locs.all()) use locs.count() instead
-
-    tags = []
-    text = []
-
-    eb_cpy = element_buffer.copy()
+# NOTE:
+# a strategy is one way of finding an element (by its id, title, aria-label, role+name, text, classes...), it is only
+# used if it matches exactly 1 element.  which one works is very site dependent (some sites have an aria-label on
+# everything, others only have generated class names) so the resolver keeps how often each strategy was the one that
+# worked per (domain, element kind) and tries the best one first on its own.  everything else is counted in the page
+# with a single evaluate instead of a count() round trip per strategy.  the probe only approximates what playwright's
+# text/role engines match so the strategy it picks is confirmed with one count() on the actual locator before it is
+# used (and counted as a win).
+
+# attributes that can be used as a css selector, in the order they are tried without any history
+ATTRIBUTE_STRATEGIES = ("id", "title", "aria-label", "placeholder", "name")
+# roles that get_by_role can find by name
+NAMED_ROLES = ("button", "link")
+
+
+@dataclass(frozen=True)
+class LocatorStrategy:
+    strategy: str
+    css: str = None
+    text: str = None
+    role: str = None
+    has_text: str = None
+
+    def locator(self, page: Page) -> Locator:
+        if self.strategy == "text":
+            return page.get_by_text(self.text, exact=True)
+        if self.strategy == "role":
+            return page.get_by_role(self.role, name=self.text, exact=True)
+        loc = page.locator(self.css)
+        return loc.filter(has_text=self.has_text) if self.has_text else loc
+
+
+def _css_string(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ") + '"'
+
+
+def _css_class(class_name: str) -> bool:
+    # generated/utility class names (md:flex, w-1/2) would need escaping, those are never unique anyways
+    return re.match(r"^-?[_a-zA-Z][\w-]*$", class_name) is not None
+
+
+def locator_strategies(element_buffer: dict, snapshot_index: SnapshotIndex = None) -> List[LocatorStrategy]:
+    """every strategy that could find the element in element_buffer, in the default order"""
+    if snapshot_index is not None:
+        node_meta = _node_meta_from_index(element_buffer, snapshot_index)
+    else:
+        node_meta = _combine_node_meta(element_buffer["node_meta"])
 
-    node_meta = element_buffer["node_meta"]
-    node_name = element_buffer["node_name"]
-    node_value = element_buffer["node_value"]
+    node_name, node_value = element_buffer["node_name"], element_buffer["node_value"]
     inner_text = element_buffer["selectors"]["inner_text"]
-    conv_node_name = element_buffer["selectors"]["converted_node_name"]
+    kind = element_buffer["selectors"]["converted_node_name"]
 
-    try:
-        node_meta = _combine_node_meta(node_meta)
-    except:
-        breakpoint()
+    strategies = []
+    for key in ATTRIBUTE_STRATEGIES:
+        if value := (node_meta.get(key) or [""])[0]:
+            strategies.append(LocatorStrategy(key, css=f"[{key}={_css_string(value)}]"))
 
-    # if element_buffer["node_index"] in ["269", "125"]:
-    #     breakpoint()
-    loc = page
+    if kind in NAMED_ROLES and (name := inner_text or (node_meta.get("aria-label") or [""])[0]):
+        strategies.append(LocatorStrategy("role", role=kind, text=name))
 
-    if "title" in node_meta:
-        try:
-            loc_out = loc.get_by_title(node_meta["title"][0])
-        except:
-            breakpoint()
-        if len(loc_out.all()) == 1:
-            return loc_out.first
-        elif len(loc_out.all()) == 0:
-            print("reverting back to old loc - title")
-            loc_out = loc
-        breakpoint()
-        loc = loc_out
-
-    # search by text ---
-    if node_name == "#text" or node_name == "text":
-        text = _clean_str_quotes(node_value)
-        loc_out = loc.get_by_text(text)
-
-        if len(loc_out.all()) == 1:
-            return loc_out.first
-        elif len(loc_out.all()) == 0:
-            print("reverting back to old loc - #text")
-            loc_out = loc
-        loc = loc_out
-    # --- end search by text
-
-    # search by class ---
-    if "class" in node_meta:
-        class_str = "." + ",.".join(node_meta["class"])
-        loc_out = loc.locator(class_str)
-        if len(loc_out.all()) == 1:
-            return loc_out.first
-        elif len(loc_out.all()) == 0:
-            breakpoint()
-        elif inner_text != "":
-            loc_out = loc_out.filter(has_text=inner_text)
-            if len(loc_out.all()) == 1:
-                return loc_out.first
-            if len(loc_out.all()) == 0:
-                breakpoint()
+    if node_name in ("#text", "text") and node_value:
+        strategies.append(LocatorStrategy("text", text=_clean_str_quotes(node_value)))
+    elif inner_text:
+        strategies.append(LocatorStrategy("text", text=inner_text))
 
-        if len(loc_out.all()) == 0:
-            breakpoint()
-            print("reverting back to old loc - class")
-            loc_out = loc
-        # seems like sometimes class makes it so the actual element is not in the locators so maybe just keep loc = old loc? or move class stuff to the very end
-        # loc = loc_out
-    # --- end search by class
-
-    # search by text if theres no node_meta info ---
-    if (node_meta is None) and (node_value != None) and (node_value != ""):
-        loc_out = loc.get_by_text(node_value)
-        if len(loc_out.all()) == 1:
-            return loc_out.first
-        elif len(loc_out.all()) == 0:
-            print("reverting back to old loc - text")
-            loc_out = loc
-        loc = loc_out
-    # --- end search by text
-
-    # search by title ---
-    if "title" in node_meta:
-        loc_out = loc.get_by_title(node_meta["title"][0])
-        if len(loc_out.all()) == 1:
-            return loc_out.first
-        elif len(loc_out.all()) == 0:
-            print("reverting back to old loc - title")
-            loc_out = loc
-        breakpoint()
-        loc = loc_out
-    # --- end search by title
+    if class_names := [name for name in node_meta.get("class", []) if name and _css_class(name)]:
+        css = "." + ".".join(class_names)
+        strategies.append(LocatorStrategy("class", css=css))
+        if inner_text:
+            strategies.append(LocatorStrategy("class+text", css=css, has_text=inner_text))
+    return strategies
 
-    # search for button ---
-    if conv_node_name == "button":
-        if conv_node_name != node_name:
-            breakpoint()
-        if "aria-label" in node_meta:
-            loc_out = loc.get_by_role("button", name=node_meta["aria-label"][0])
-            if len(loc_out.all()) == 1:
-                return loc_out.first
-            elif len(loc_out.all()) == 0:
-                print("reverting back to old loc - button")
-                loc_out = loc
-            else:
-                # this seems so brittle but sometimes the button search will give you like 3 locs and using the class
-                # locator will give you 50+ locs but they arent the ones with button
-                for l in loc_out.all():
-                    _cls = l.get_attribute("class")
-                    if " " in _cls:
-                        _cls = _cls.split(" ", 1)[0]
 
-                    if _cls != None and _cls in class_str:
-                        return l
+def element_strategies(el_meta: str) -> List[LocatorStrategy]:
+    """strategies from the meta part of an elements_of_interest string, for when there is nothing else"""
+    if _check_if_only_text(el_meta):
+        return [LocatorStrategy("text", text=_clean_str_quotes(el_meta))]
+
+    strategies = []
+    text = _clean_str_quotes(re.sub(r'[\w:-]+="[^"]*"', "", el_meta).strip()) or None
+    for key, value in re.findall(r'([\w:-]+)="([^"]*)"', el_meta):
+        if key == "role" and text:
+            strategies.append(LocatorStrategy("role", role=value, text=text))
+        elif key in ATTRIBUTE_STRATEGIES:
+            strategies.append(LocatorStrategy(key, css=f"[{key}={_css_string(value)}]"))
+    return strategies
+
+
+class LocatorResolver:
+    # counts the matches for each strategy in the page, -1 if the strategy cant be used (bad selector).  the text
+    # and role matching is an approximation of get_by_text/get_by_role with exact=True: the name is aria-labelledby,
+    # aria-label or the text content (img alt included, no css text-transform) and hidden elements are not roles
+    probe_js: str = """(strategies) => {
+        const norm = (s) => (s || "").replace(/\\s+/g, " ").trim()
+        const roles = {
+            button: 'button, [role="button"], input[type="button"], input[type="submit"], input[type="reset"]',
+            link: 'a[href], [role="link"]',
+        }
+        const visible = (el) => (el.checkVisibility ? el.checkVisibility() : el.getClientRects().length > 0)
+        const content = (node) => {
+            if (node.nodeType === Node.TEXT_NODE) return node.nodeValue
+            if (node.nodeType !== Node.ELEMENT_NODE) return ""
+            if (node.nodeName === "IMG") return node.getAttribute("alt") || ""
+            return [...node.childNodes].map(content).join("")
+        }
+        const labelledBy = (el) =>
+            (el.getAttribute("aria-labelledby") || "")
+                .split(/\\s+/)
+                .map((id) => document.getElementById(id))
+                .filter((label) => label)
+                .map(content)
+                .join(" ")
+        const name = (el) =>
+            norm(labelledBy(el) || el.getAttribute("aria-label") || content(el) || el.value || el.getAttribute("title"))
+        let all = null
+        const count = ({ strategy, css, text, role, has_text }) => {
+            try {
+                if (strategy === "text") {
+                    all = all || [...document.querySelectorAll("body *")]
+                    const own = (el) => ![...el.children].some((c) => norm(c.textContent) === text)
+                    return all.filter((el) => norm(el.textContent) === text && own(el)).length
+                }
+                let els = [...document.querySelectorAll(role ? roles[role] || `[role="${role}"]` : css)]
+                if (role) els = els.filter((el) => visible(el) && name(el) === text)
+                if (has_text) {
+                    has_text = has_text.toLowerCase()
+                    els = els.filter((el) => norm(el.textContent).toLowerCase().includes(has_text))
+                }
+                return els.length
+            } catch (e) {
+                return -1
+            }
+        }
+        return strategies.map(count)
+    }"""
+
+    def __init__(self):
+        # (domain, kind) -> strategy -> times it was the one used
+        self.wins: Dict[Tuple[str, str], Counter] = {}
+        self.attempts = Counter()
+        self.hits = Counter()
+        # resolves where the historical best worked on its own
+        self.first_try_hits = 0
+        # probe said 1 but the locator did not match exactly 1 element
+        self.mismatches = Counter()
+        self.evaluations = 0
+        self.resolved = 0
+        self.unresolved = 0
+
+    def order(self, domain: str, kind: str, strategies: Sequence[LocatorStrategy]) -> List[LocatorStrategy]:
+        """strategies with the ones that worked most often for domain/kind first, otherwise in the order given"""
+        wins = self.wins.get((domain, kind))
+        if not wins:
+            return list(strategies)
+        return sorted(strategies, key=lambda s: -wins[s.strategy])
+
+    def record(self, domain: str, kind: str, strategy: str):
+        self.wins.setdefault((domain, kind), Counter())[strategy] += 1
+
+    def _probe(self, page: Page, strategies: Sequence[LocatorStrategy]) -> List[int]:
+        self.evaluations += 1
+        specs = [{k: v for k, v in asdict(s).items() if v is not None} for s in strategies]
+        counts = page.evaluate(self.probe_js, specs)
+        for strategy, count in zip(strategies, counts):
+            self.attempts[strategy.strategy] += 1
+            self.hits[strategy.strategy] += count == 1
+        return counts
+
+    def resolve(
+        self,
+        element_buffer: dict,
+        page: Page,
+        snapshot_index: SnapshotIndex = None,
+        strategies: Sequence[LocatorStrategy] = None,
+        kind: str = None,
+    ) -> Locator | None:
+        """locator that matches exactly 1 element for the element, None if no strategy does"""
+        if strategies is None:
+            strategies = locator_strategies(element_buffer, snapshot_index=snapshot_index)
+        strategies = list(dict.fromkeys(strategies))
+        domain = urlparse(page.url).netloc
+        kind = kind or element_buffer["selectors"]["converted_node_name"]
+
+        strategies = self.order(domain, kind, strategies)
+        if not strategies:
+            self.unresolved += 1
+            return None
+
+        # the historical best on its own first, it is usually the one that works so the rest never get probed.  it
+        # is checked with playwright directly (one count) since that is the confirmation the probe would need anyways
+        if self.wins.get((domain, kind)):
+            if locator := self._first_try(strategies[0], page):
+                self.first_try_hits += 1
+                return self._resolved(domain, kind, strategies[0], locator)
+            strategies = strategies[1:]
 
-            breakpoint()
-            loc = loc_out
-    # --- end search for button
-
-    # search by link ---
-    if conv_node_name == "link":
-        if inner_text != "":
-            text = inner_text
-        elif "aria-label" in node_meta:
-            text = node_meta["aria-label"][0]
-        else:
-            breakpoint()
+        for strategy, count in zip(strategies, self._probe(page, strategies) if strategies else []):
+            if (count == 1) and (locator := self._confirm(strategy, page)):
+                return self._resolved(domain, kind, strategy, locator)
 
-        loc_out = loc.get_by_role("link", name=text)
-        if len(loc_out.all()) == 1:
-            return loc_out.first
-        elif len(loc_out.all()) == 0:
-            print("reverting back to old loc - link")
-            loc_out = loc
-        else:
-            for l in loc_out.all():
-                _cls = l.get_attribute("class")
-                if " " in _cls:
-                    _cls = _cls.split(" ", 1)[0]
-
-                if _cls != None and _cls in class_str:
-                    return l
-    if element_buffer["node_index"] == "304":
-        breakpoint()
-    breakpoint()
-    # this is trying to get by class, but class can be a lot of locators so in that case try and use inner_text
-    # class_strings = _combine_class_names(node_meta)
-    # if class_strings != None:
-    #     loc_tmp = loc.locator(class_strings)
-    #     txt = inner_text or node_value
-    #     if len(loc_tmp.all()) > 1:
-    #         loc_tmp = loc_tmp.filter(has_text=txt)
-    #     return loc_tmp.first
-
-    # for meta in node_meta:
-    #     if "title=" in meta:
-    #         loc_out = _get_by_title(meta, loc)
-    #         loc = status(loc_out)
-    #         if status.s == "done":
-    #             loc = loc.all()
-    #             if len(loc) != 1:
-    #                 breakpoint()
-    #             return loc[0]
-    #     if "class=" in meta:
-    #         c_str = _combine_class_names()
-
-    # if node_name == "a":
-    #     loc = page.get_by_role().all()
+        self.unresolved += 1
+        return None
 
+    def _first_try(self, strategy: LocatorStrategy, page: Page) -> Locator | None:
+        """the locator if it matches exactly 1 element, a single count() round trip and no probe"""
+        locator = strategy.locator(page)
+        self.attempts[strategy.strategy] += 1
+        if locator.count() != 1:
+            return None
+        self.hits[strategy.strategy] += 1
+        return locator
 
-def _from_class_name(self, element, element_buffer, page):
-    class_name = _combine_class_names(element_buffer["node_meta"])
-    locator = page.query_selector_all(class_name)
-    return locator
+    def _confirm(self, strategy: LocatorStrategy, page: Page) -> Locator | None:
+        """the locator if playwright also finds exactly 1 element with it"""
+        locator = strategy.locator(page)
+        if locator.count() == 1:
+            return locator
+        self.hits[strategy.strategy] -= 1
+        self.mismatches[strategy.strategy] += 1
+        return None
 
+    def _resolved(self, domain: str, kind: str, strategy: LocatorStrategy, locator: Locator) -> Locator:
+        self.resolved += 1
+        self.record(domain, kind, strategy.strategy)
+        return locator
 
-def element_to_locator(self, element: str, element_buffer: dict, page: Page):
-    node_meta = element_buffer["node_meta"]
-    class_name = _combine_class_names(node_meta)
+    def stats(self) -> Dict[str, object]:
+        return {
+            "resolved": self.resolved,
+            "unresolved": self.unresolved,
+            "first_try_hits": self.first_try_hits,
+            "evaluations": self.evaluations,
+            "strategies": {
+                strategy: {
+                    "attempts": self.attempts[strategy],
+                    "hits": self.hits[strategy],
+                    "hit_rate": self.hits[strategy] / self.attempts[strategy],
+                    "wins": sum(wins[strategy] for wins in self.wins.values()),
+                    "mismatches": self.mismatches[strategy],
+                }
+                for strategy in self.attempts
+            },
+        }
 
-    print("parsing element...", element)
-    el_type, el_id, el_meta = element.split(" ", 2)
-    if _check_if_only_text(el_meta):
-        text = _clean_str_quotes(el_meta)
-        locator = page.get_by_text(text).all()
-        if len(locator) > 1:
-            breakpoint()
 
-        return locator[0]
+# shared so what is learned about a site carries over between elements/steps
+locator_resolver = LocatorResolver()
 
-    # roles, el_meta_rest = _get_role_info(el_meta)
-    tags, el_meta_rest = _get_kw_info(el_meta)
-    el_meta_rest = _clean_str_quotes(el_meta_rest)
 
-    loc = page
-    for tag_name, tag_value in tags:
-        if tag_name == "role":
-            loc = loc.get_by_role(tag_value, name=el_meta_rest)
-            if len(loc.all()) == 1:
-                return loc.all()[0]
+def _get_loc_with_buffer(element: str, element_buffer: dict, page: Page, snapshot_index: SnapshotIndex = None):
+    # this used to try title/text/class/role one after the other with a len(loc.all()) round trip for each (and a lot
+    # of breakpoints for when none of them worked).  the strategies are the same but they are probed all at once and
+    # the one that worked last time for this site/kind of element goes first, see LocatorResolver
+    return locator_resolver.resolve(element_buffer, page, snapshot_index=snapshot_index)
 
-        if tag_name == "title":
-            loc = loc.get_by_title(tag_value, name=el_meta_rest)
-            if len(loc.all()) == 1:
-                return loc.all()[0]
 
-    # if we just have roles
-    # if (len(el_meta_rest) > 0) and _check_if_only_text(el_meta_rest):
-    #     text = _clean_str_quotes(el_meta_rest)
-    #     locator = page.get_by(text).all()
-    #     if len(locator) > 1:
-    #         breakpoint()
+def _from_class_name(self, element, element_buffer, page):
+    class_name = _combine_class_names(element_buffer["node_meta"])
+    locator = page.query_selector_all(class_name)
+    return locator
 
-    #     return locator[0]
 
-    breakpoint()
+def element_to_locator(self, element: str, element_buffer: dict, page: Page):
+    print("parsing element...", element)
+    el_type, el_id, el_meta = element.split(" ", 2)
+    strategies = element_strategies(el_meta) + locator_strategies(element_buffer)
+    return locator_resolver.resolve(element_buffer, page, strategies=strategies, kind=el_type)
 
 
 def eoi_to_locator(self, eoi: str, page: Page) -> Locator:
@@ -1,11 +1,24 @@
+import math
 import sys
 import re
+from collections import deque
+from itertools import chain
 from dataclasses import dataclass
-from typing import Iterator, List, Any, Dict, Tuple
+from typing import AsyncIterator, Callable, Iterator, List, Any, Dict, Literal, Sequence, Set, Tuple
 import asyncio
 from playwright.async_api import CDPSession, Page, Locator
 
 from clippy.crawler.crawler import Crawler
+from clippy.crawler.parser.dom_extract import extract_tree
+from clippy.crawler.parser.dom_snapshot_vectorized import Candidate
+from clippy.crawler.parser.dom_snapshot_vectorized import snapshot_candidates as snapshot_candidates_numpy
+from clippy.crawler.parser.element_table import ElementTable
+from clippy.crawler.parser.occlusion import Occluders, drop_occluded
+from clippy.crawler.parser.parse_cache import ParseCache, parse_cache
+from clippy.crawler.parser.parse_executor import ParseExecutor
+from clippy.crawler.parser.snapshot_index import SnapshotIndex
+from clippy.crawler.parser.spatial_index import SpatialIndex
+from clippy.crawler.parser.stable_ids import StableIds, stable_ids_for
 from clippy.states.actions import Position
 
 
@@ -29,6 +42,23 @@ black_listed_elements = set(
     ]
 )
 
+# attributes the element strings are made from
+element_attribute_keys = [
+    "type",
+    "placeholder",
+    "aria-label",
+    "name",
+    "class",
+    "id",
+    "title",
+    "alt",
+    "role",
+    "value",
+    "aria-labelledby",
+    "aria-description",
+    "aria-describedby",
+]
+
 # NOTE:
 # this code is primarily from weblm but i need to use it
 # i moved out these functions as the original _crawl function is very long and almost incomprehensible what it is doing
@@ -151,6 +181,169 @@ def add_to_hash_tree(
     return value
 
 
+def snapshot_candidates_python(
+    snapshot_index: SnapshotIndex,
+    black_listed_elements: Set[str],
+    device_pixel_ratio: float,
+    win_left_bound: float,
+    win_upper_bound: float,
+    win_right_bound: float,
+    win_lower_bound: float,
+) -> Iterator[Candidate]:
+    """first pass of parse_tree, yields the nodes that are laid out, visible and in the viewport along with their
+    anchor/button/select ancestry.  see dom_snapshot_vectorized.snapshot_candidates for the numpy version"""
+    strings = snapshot_index.strings
+    bounds = snapshot_index.layout["bounds"]
+    styles = snapshot_index.layout["styles"]
+
+    for index in range(len(snapshot_index)):
+        node_name = snapshot_index.node_name(index)
+
+        is_ancestor_of_anchor, anchor_id = snapshot_index.ancestor(index, "a")
+        is_ancestor_of_button, button_id = snapshot_index.ancestor(index, "button")
+        is_ancestor_of_select, select_id = snapshot_index.ancestor(index, "select")
+
+        cursor = snapshot_index.layout_row(select_id) if is_ancestor_of_select else snapshot_index.layout_row(index)
+        if cursor < 0:
+            continue
+
+        if node_name in black_listed_elements:
+            continue
+
+        # display is the first of the computed styles (see cdp_snapshot_kwargs)
+        display = styles[cursor][:1]
+        if display and strings[display[0]] == "none":
+            continue
+
+        [x, y, width, height] = bounds[cursor]
+        x /= device_pixel_ratio
+        y /= device_pixel_ratio
+        width /= device_pixel_ratio
+        height /= device_pixel_ratio
+
+        elem_left_bound = x
+        elem_top_bound = y
+        elem_right_bound = x + width
+        elem_lower_bound = y + height
+
+        # comment this bit out to process the whole thing
+        partially_is_in_viewport = (
+            elem_left_bound < win_right_bound
+            and elem_right_bound >= win_left_bound
+            and elem_top_bound < win_lower_bound
+            and elem_lower_bound >= win_upper_bound
+        )
+
+        if not partially_is_in_viewport:
+            continue
+
+        yield index, node_name, cursor, (
+            is_ancestor_of_anchor,
+            anchor_id,
+            is_ancestor_of_button,
+            button_id,
+            is_ancestor_of_select,
+            select_id,
+        )
+
+
+def candidate_group(candidate: Candidate) -> int:
+    """node whose element the candidate ends up in, its closest a/button/select (if it has one) otherwise itself"""
+    index, _, _, (is_anchor, anchor_id, is_button, button_id, is_select, select_id) = candidate
+    if is_anchor:
+        return anchor_id
+    elif is_button:
+        return button_id
+    elif is_select:
+        return select_id
+    return index
+
+
+def group_candidates(candidates: Iterator[Candidate] | List[Candidate]) -> Dict[int, List[Candidate]]:
+    """candidates split by candidate_group, each group can be parsed on its own and gives at most 1 element"""
+    groups = {}
+    for candidate in candidates:
+        groups.setdefault(candidate_group(candidate), []).append(candidate)
+    return groups
+
+
+def snapshot_frames(
+    tree: Dict[str, Any],
+    device_pixel_ratio: float,
+    window: Sequence[float],
+    snapshot_index: SnapshotIndex = None,
+) -> List[Tuple[SnapshotIndex, Tuple[float, float, float, float]]]:
+    """
+    SnapshotIndex and window for the main document and every frame document under it (main first, then frames in the
+    order they are found).  frame documents are offset by where their iframe is (minus the frame's own scroll) so
+    their bounds are page coords like the main document, and their window is clipped to the iframe box.  frames
+    that are outside the window are skipped along with any frames nested in them.
+    """
+    documents = tree["documents"]
+    if not documents:
+        return []
+
+    frames = [(snapshot_index or SnapshotIndex(tree), tuple(window))]
+    seen = {frames[0][0].document_index}
+    for frame_index, frame_window in frames:
+        for node, document_index in frame_index.content_documents.items():
+            if (row := frame_index.layout_row(node)) < 0 or document_index in seen or document_index >= len(documents):
+                continue
+            seen.add(document_index)
+            x, y, width, height = frame_index.bounds[row].tolist()
+            left, upper, right, lower = frame_window
+            left, upper = max(left, x / device_pixel_ratio), max(upper, y / device_pixel_ratio)
+            right, lower = min(right, (x + width) / device_pixel_ratio), min(lower, (y + height) / device_pixel_ratio)
+            if left >= right or upper >= lower:
+                continue
+
+            document = documents[document_index]
+            offset = (x - document.get("scrollOffsetX", 0), y - document.get("scrollOffsetY", 0))
+            frames.append((SnapshotIndex(tree, document_index, offset=offset), (left, upper, right, lower)))
+    return frames
+
+
+def format_element(element: Dict[str, Any], element_id: int) -> str | None:
+    """the string for an element in elements_of_interest, None if the element is only kept in page_element_buffer"""
+    selectors = element["selectors"]
+    converted_node_name = selectors["converted_node_name"]
+    meta = selectors["meta"]
+    inner_text = selectors["inner_text"]
+
+    if inner_text != "":
+        return f"""{converted_node_name} {element_id}{meta} \"{inner_text}\""""
+    elif converted_node_name in ["input", "button", "textarea"] or "alt" in meta:
+        return f"""{converted_node_name} {element_id}{meta}"""
+    elif converted_node_name == "select" and meta != "":
+        return f"""{converted_node_name} {element_id}{meta}"""
+    # pass so id counter is still incremented
+    return None
+
+
+def _in_rects(bounds: List[float], rects: List[Dict[str, float]]) -> bool:
+    """if the snapshot bounds overlap any of the rects from the dirty tracker (both are document coords)"""
+    x, y, width, height = bounds
+    for rect in rects:
+        if (x <= rect["x"] + rect["width"]) and (rect["x"] <= x + width):
+            if (y <= rect["y"] + rect["height"]) and (rect["y"] <= y + height):
+                return True
+    return False
+
+
+def _move_element(element: Dict[str, Any], node: int, bounds: List[float], device_pixel_ratio: float) -> Dict[str, Any]:
+    """element from a previous snapshot with node_index/position from the current one"""
+    x, y, width, height = (v / device_pixel_ratio for v in bounds)
+    return {
+        **element,
+        "node_index": str(node),
+        "origin_x": int(x),
+        "origin_y": int(y),
+        "center_x": int(x + (width / 2)),
+        "center_y": int(y + (height / 2)),
+        "bounds": bounds,
+    }
+
+
 def _out_of_viewport_element(element_buffer: Dict[str, Any], page_viewport: Dict[str, int]):
     # TODO factor in if scrollX, scrollY are not 0
 
@@ -179,10 +372,27 @@ def _out_of_viewport_element(element_buffer: Dict[str, Any], page_viewport: Dict
 
 
 class DOMParser:
+    # same check as the `pos=x,y` selector does (elementsFromPoint is empty outside the viewport) but for all the
+    # points in one evaluate rather than a loc.count() round trip per element
+    validate_points_js: str = """(points) => points.map(([x, y]) => {
+        x = parseInt(x)
+        y = parseInt(y)
+        if (x < 0 || y < 0 || x >= window.innerWidth || y >= window.innerHeight) {
+            return "out_of_viewport"
+        }
+        return document.elementsFromPoint(x, y).length > 0 ? "hit" : "miss"
+    })"""
+
     async def _get_locators_elements(self, num_elems: int = 150):
         elements, locators = [], {}
-        for el, el_id in zip(self.elements_of_interest, self.ids_of_interest):
-            if not (loc := await self.get_locator(el, el_id)):
+
+        allowed = [
+            (el, el_id) for el, el_id in zip(self.elements_of_interest, self.ids_of_interest) if element_allowed_fn(el)
+        ]
+        statuses = await self.validate_locators([el_id for _, el_id in allowed])
+
+        for el, el_id in allowed:
+            if not (loc := await self.get_locator(el, el_id, status=statuses[el_id])):
                 continue
 
             # if its out of viewport we can stop looking for elems most likely
@@ -197,16 +407,46 @@ class DOMParser:
                 break
         return elements, locators
 
-    def get_loc_helper(self, element_buffer: Dict[str, Any]) -> Locator:
+    def window_bounds(
+        self,
+        win_upper_bound: int = 0,
+        win_width: int = 1280,
+        win_left_bound: int = 0,
+        win_height: int = 1080,
+        device_pixel_ratio: int = 1,
+        platform: str = "darwin",
+    ) -> Tuple[float, float, float, float, float]:
+        """returns the device_pixel_ratio to use and the (left, upper, right, lower) bounds elements must be in"""
+        # TODO: FIX THIS, ITS NOT WORKIGN FOR ME WITH AN EXTERNAL MONITOR
+        if (
+            (getattr(self, platform, sys.platform) == "darwin")
+            and (device_pixel_ratio == 1)
+            and not self.keep_device_ratio
+        ):  # lies
+            device_pixel_ratio = 2
+            # device_pixel_ratio = 1
+
+        win_right_bound = win_left_bound + win_width * 2
+        win_lower_bound = win_upper_bound + win_height * 2
+        self.device_pixel_ratio = device_pixel_ratio
+
+        if getattr(self, "full_page", False):
+            # parse everything, the viewport is only used to filter elements_of_interest (see set_viewport)
+            self.viewport = (win_left_bound, win_upper_bound, win_right_bound, win_lower_bound)
+            return device_pixel_ratio, -math.inf, -math.inf, math.inf, math.inf
+        return device_pixel_ratio, win_left_bound, win_upper_bound, win_right_bound, win_lower_bound
+
+    def _loc_point(self, element_buffer: Dict[str, Any]) -> Tuple[int, int]:
         origin_x, orgin_y, center_x, center_y = (
             element_buffer["origin_x"],
             element_buffer["origin_y"],
             element_buffer["center_x"],
             element_buffer["center_y"],
         )
+        return origin_x + center_x, orgin_y + center_y
 
-        x = origin_x + center_x
-        y = orgin_y + center_y
+    def get_loc_helper(self, element_buffer: Dict[str, Any]) -> Locator:
+        x, y = self._loc_point(element_buffer)
 
         loc = self.page.locator(f"pos={x},{y}")
         loc.position = Position(x, y)
@@ -215,12 +455,30 @@ class DOMParser:
     def element_allowed_fn(self, element: str):
         return element_allowed_fn(element)
 
-    async def get_locator(self, element: str, element_id: int) -> Locator | ElementOutOfViewport:
+    async def validate_locators(self, element_ids: List[int]) -> Dict[int, str]:
+        """`hit`, `miss` or `out_of_viewport` for each element's locator point, in a single round trip"""
+        if not element_ids:
+            return {}
+        points = [self._loc_point(self.page_element_buffer[element_id]) for element_id in element_ids]
+        statuses = await self.page.evaluate(self.validate_points_js, points)
+        return dict(zip(element_ids, statuses))
+
+    async def get_locator(self, element: str, element_id: int, status: str = None) -> Locator | ElementOutOfViewport:
+        """status is from validate_locators, if not given the locator is checked on its own"""
         if not element_allowed_fn(element):
             return None
         element_buffer = self.page_element_buffer[element_id]
+
+        # with a full page parse we already know where everything is
+        if getattr(self, "spatial_index", None) is not None:
+            if out_of_viewport := self.out_of_viewport(element_id, self.page.viewport_size):
+                return out_of_viewport
+
         loc = self.get_loc_helper(element_buffer)
-        if await loc.count() <= 0:
+        if status is None:
+            status = "hit" if await loc.count() > 0 else "miss"
+
+        if status != "hit":
             return _out_of_viewport_element(element_buffer, self.page.viewport_size)
 
         return loc
@@ -228,23 +486,76 @@ class DOMParser:
 
 class DOMSnapshotParser(DOMParser):
     cdp_snapshot_kwargs = {
-        "computedStyles": ["display"],
+        # display has to stay first, the first pass only looks at the first style.  the others are for occlusion
+        "computedStyles": ["display", "background-color", "opacity"],
         "includeDOMRects": True,
         "includePaintOrder": True,
     }
 
-    def __init__(self, crawler: Crawler = None, keep_device_ratio: bool = False, *args, **kwargs):
+    # engine is used for the first pass of parse_tree (ancestry + layout/viewport filtering).
+    # numpy version is much faster on large pages but should give the exact same output
+    engines = ("python", "numpy")
+    # where the tree comes from, the full DOMSnapshot over cdp or just the nodes that pass the first pass from the
+    # page itself (see dom_extract).  the second pass is the same for both
+    extractions = ("snapshot", "browser")
+
+    def __init__(
+        self,
+        crawler: Crawler = None,
+        keep_device_ratio: bool = False,
+        engine: str = "python",
+        incremental: bool = False,
+        cache: ParseCache | None = parse_cache,
+        executor: ParseExecutor = None,
+        full_page: bool = False,
+        extraction: str = "snapshot",
+        occlusion: bool = True,
+        *args,
+        **kwargs,
+    ):
         super().__init__()
+        if engine not in self.engines:
+            raise ValueError(f"engine must be one of {self.engines}, got `{engine}`")
+        if extraction not in self.extractions:
+            raise ValueError(f"extraction must be one of {self.extractions}, got `{extraction}`")
+
         self.keep_device_ratio = keep_device_ratio
-        self.page_element_buffer = {}
+        self.engine = engine
+        self.extraction = extraction
+        # drop elements that are under an overlay (cookie banner/modal/etc) using the snapshot paint order
+        self.occlusion = occlusion
+        self.page_element_buffer = ElementTable()
         self.elements_of_interest = []
 
-        # allow for crawler to be passed for dev purposes
+        # incremental uses the dirty tracker injection (crawler/inject/dirty_tracker.js) to only re-snapshot and
+        # re-parse when the page changed, and then only the changed regions.  parser needs to be reused between steps
+        self.incremental = incremental
+        self.element_ids: List[int] = []  # ids in page_element_buffer from the last parse
+        self.tree = None
+        self.page_size: Sequence[int] = None
+
+        # parsed snapshots are cached by content, pass cache=None to always parse
+        self.cache = cache
+        # if given, large snapshots are parsed in a worker process so parse does not block the event loop
+        self.executor = executor
+
+        # full_page parses every laid out element (not just the viewport) and keeps them in a spatial index, so after
+        # scrolling we only need to query the index.  elements_of_interest/ids_of_interest are still for the viewport
+        self.full_page = full_page
+        self.spatial_index: SpatialIndex = None
+        self.viewport: Tuple[float, float, float, float] = None
+        self.page_elements_of_interest, self.page_ids_of_interest = [], []
+
+        # allow for crawler to be passed for dev purposes, without one only parse_tree works (e.g. stored snapshots)
         self.crawler = crawler
-        self.page = crawler.page
-        self.cdp_client = crawler.cdp_client
+        self.page = getattr(crawler, "page", None)
+        self.cdp_client = getattr(crawler, "cdp_client", None)
         self._current_url = None
 
+        # element ids come from the backendNodeId so they are the same across parses/scrolls (see stable_ids).  the
+        # table is shared by every parser for the page
+        self.stable_ids: StableIds = stable_ids_for(self.page)
+
     def need_crawl(self, page: Page):
         if not isinstance(
             page.url, str
@@ -257,19 +568,120 @@ class DOMSnapshotParser(DOMParser):
 
         return False
 
-    async def get_tree(self):
+    async def get_tree(self, page_size: Sequence[int] = None):
+        if self.extraction == "browser":
+            # the page only sends back what is in the window so it needs the page size
+            page_size = page_size or await self.crawler.page_size()
+            pixel_ratio, win_s_x, win_s_y, upper_b, lower_b, win_w, win_h = page_size
+            device_pixel_ratio, *window = self.window_bounds(upper_b, win_w, lower_b, win_h, pixel_ratio)
+            self.tree = await extract_tree(
+                self.page, device_pixel_ratio, window, black_listed_elements, element_attribute_keys
+            )
+            return
+
         self.tree = await self.crawler.cdp_client.send(
             "DOMSnapshot.captureSnapshot",
             self.cdp_snapshot_kwargs,
         )
 
+    async def get_tree_and_page_size(self, get_tree: bool = True) -> Sequence[int]:
+        """snapshot and page size at the same time, they are independent round trips"""
+        if not get_tree:
+            page_size = await self.crawler.page_size()
+        elif self.extraction == "browser":
+            page_size = await self.crawler.page_size()
+            await self.get_tree(page_size)
+        else:
+            _, page_size = await asyncio.gather(self.get_tree(), self.crawler.page_size())
+        # kept with the tree so the snapshot can be stored and parsed again offline (see dm.reparse)
+        self.page_size = page_size
+        return page_size
+
+    async def take_dirty(self) -> Dict[str, Any] | None:
+        """what changed on the page since the last call, None if the dirty tracker is not injected"""
+        return await self.page.evaluate("() => window.__clippyTakeDirty ? window.__clippyTakeDirty() : null")
+
     async def parse(self) -> List[str]:
-        await self.get_tree()
-        pixel_ratio, win_s_x, win_s_y, upper_b, lower_b, win_w, win_h = await self.crawler.page_size()
-        self.parse_tree(self.tree, upper_b, win_w, lower_b, win_h, pixel_ratio)
+        if self.incremental or self.full_page:
+            url_changed = self.need_crawl(self.page)
+            dirty = await self.take_dirty()
+
+            # full parse if there is nothing to patch or we cant tell what changed
+            if not (url_changed or (dirty is None) or (self.tree is None) or dirty["resized"] or dirty["overflow"]):
+                return await self.parse_dirty(dirty)
+
+        pixel_ratio, win_s_x, win_s_y, upper_b, lower_b, win_w, win_h = await self.get_tree_and_page_size()
+        await self.parse_tree_async(self.tree, upper_b, win_w, lower_b, win_h, pixel_ratio)
 
         return self.elements_of_interest
 
+    async def parse_dirty(self, dirty: Dict[str, Any]) -> List[str]:
+        # nothing happened on the page so the elements we have are still correct
+        if not dirty["mutated"] and not dirty["scrolled"]:
+            return self.elements_of_interest
+
+        # if it only scrolled the snapshot is still correct, just the viewport moved.  unless the tree was extracted
+        # in the page, then it only has what was in the old viewport
+        get_tree = dirty["mutated"] or (self.extraction == "browser" and not self.full_page)
+        page_size = await self.get_tree_and_page_size(get_tree=get_tree)
+        pixel_ratio, win_s_x, win_s_y, upper_b, lower_b, win_w, win_h = page_size
+
+        if self.full_page and not dirty["mutated"]:
+            self.set_viewport(upper_b, win_w, lower_b, win_h, pixel_ratio)
+        elif self.incremental:
+            self.patch_tree(self.tree, dirty["rects"], upper_b, win_w, lower_b, win_h, pixel_ratio)
+        else:
+            await self.parse_tree_async(self.tree, upper_b, win_w, lower_b, win_h, pixel_ratio)
+        return self.elements_of_interest
+
+    def set_viewport(
+        self,
+        win_upper_bound: int = 0,
+        win_width: int = 1280,
+        win_left_bound: int = 0,
+        win_height: int = 1080,
+        device_pixel_ratio: int = 1,
+        platform: str = "darwin",
+    ) -> Tuple[List[str], List[int]]:
+        """for full_page, set elements_of_interest/ids_of_interest to what is in the viewport without parsing again"""
+        self.window_bounds(win_upper_bound, win_width, win_left_bound, win_height, device_pixel_ratio, platform)
+        return self._view_elements()
+
+    def _view_elements(self) -> Tuple[List[str], List[int]]:
+        in_view = set(self.spatial_index.query(*self.viewport))
+        elements_of_interest, ids_of_interest = [], []
+        for element, element_id in zip(self.page_elements_of_interest, self.page_ids_of_interest):
+            if element_id in in_view:
+                elements_of_interest.append(element)
+                ids_of_interest.append(element_id)
+
+        self.elements_of_interest, self.ids_of_interest = elements_of_interest, ids_of_interest
+        return elements_of_interest, ids_of_interest
+
+    def elements_at(self, x: float, y: float) -> List[int]:
+        """for full_page, ids of the elements at the point (document coords), most specific first"""
+        return self.spatial_index.at_point(x, y)
+
+    def out_of_viewport(self, element_id: int, page_viewport: Dict[str, int]) -> ElementOutOfViewport | None:
+        """
+        for full_page, None if the element is in the viewport otherwise how far to scroll so it is (replaces the
+        _out_of_viewport_element loop).  bounds are relative to the viewport after scrolling
+        """
+        el_x, el_y, el_w, el_h = self.spatial_index.box(element_id)
+        left, upper = self.viewport[:2]
+        width, height = page_viewport["width"], page_viewport["height"]
+
+        scroll_x = scroll_y = 0
+        if (el_x < left) or (el_x + el_w > left + width):
+            scroll_x = int(el_x - left)
+        if (el_y < upper) or (el_y + el_h > upper + height):
+            # center it vertically
+            scroll_y = int(el_y + (el_h / 2) - (height / 2) - upper)
+
+        if scroll_x == scroll_y == 0:
+            return None
+        return ElementOutOfViewport((scroll_x, scroll_y), (el_x - left - scroll_x, el_y - upper - scroll_y, el_w, el_h))
+
     def parse_tree(
         self,
         tree: Dict[str, Any],
@@ -286,120 +698,353 @@ class DOMSnapshotParser(DOMParser):
                 ['button 1 hnname', 'link 2 "Hacker News"', 'link 3 "new"', 'text 4 "|"', ... ]
             ids_of_interest: List[ids] - list of ids of elements_of_interest that map to page_element_buffer
         """
-        page_element_buffer = self.page_element_buffer
-
-        page_state_as_text = []
-        # TODO: FIX THIS, ITS NOT WORKIGN FOR ME WITH AN EXTERNAL MONITOR
-        if (
-            (getattr(self, platform, sys.platform) == "darwin")
-            and (device_pixel_ratio == 1)
-            and not self.keep_device_ratio
-        ):  # lies
-            device_pixel_ratio = 2
-            # device_pixel_ratio = 1
-
-        win_right_bound = win_left_bound + win_width * 2
-        win_lower_bound = win_upper_bound + win_height * 2
-
-        percentage_progress_start = 1
-        percentage_progress_end = 2
-
-        page_state_as_text.append(
-            {
-                "x": 0,
-                "y": 0,
-                "text": "[scrollbar {:0.2f}-{:0.2f}%]".format(
-                    round(percentage_progress_start, 2), round(percentage_progress_end)
-                ),
-            }
+        device_pixel_ratio, *window = self.window_bounds(
+            win_upper_bound, win_width, win_left_bound, win_height, device_pixel_ratio, platform
         )
 
-        strings = tree["strings"]
-        document = tree["documents"][0]
-        nodes = document["nodes"]
-        backend_node_id = nodes["backendNodeId"]
-        attributes = nodes["attributes"]
-        node_value = nodes["nodeValue"]
-        parent = nodes["parentIndex"]
-        node_types = nodes["nodeType"]
-        node_names = nodes["nodeName"]
-        is_clickable = set(nodes["isClickable"]["index"])
+        frames = snapshot_frames(tree, device_pixel_ratio, window)
+        self.snapshot_index = frames[0][0]
 
-        text_value = nodes["textValue"]
-        text_value_index = text_value["index"]
-        text_value_values = text_value["value"]
+        elements = []
+        for snapshot_index, frame_window in frames:
+            elements.extend(self._parse_frame(snapshot_index, device_pixel_ratio, frame_window))
 
-        input_value = nodes["inputValue"]
-        input_value_index = input_value["index"]
-        input_value_values = input_value["value"]
+        return self._set_parsed(tree, elements)
 
-        input_checked = nodes["inputChecked"]
-        layout = document["layout"]
-        layout_node_index = layout["nodeIndex"]
-        bounds = layout["bounds"]
-        styles = layout["styles"]
+    def _parse_frame(
+        self, snapshot_index: SnapshotIndex, device_pixel_ratio: float, window: Sequence[float]
+    ) -> List[Dict[str, Any]]:
+        cache_key, elements = self._cached_elements(snapshot_index, device_pixel_ratio, window)
+        if elements is None:
+            candidates = self.snapshot_candidates(snapshot_index, device_pixel_ratio, *window)
+            elements = self.parse_candidates(snapshot_index, candidates, device_pixel_ratio)
+            self._cache_elements(cache_key, elements)
+        return elements
 
-        cursor = 0
-        html_elements_text = []
+    async def parse_tree_async(
+        self,
+        tree: Dict[str, Any],
+        win_upper_bound: int = 0,
+        win_width: int = 1280,
+        win_left_bound: int = 0,
+        win_height: int = 1080,
+        device_pixel_ratio: int = 1,
+        platform: str = "darwin",
+    ):
+        """
+        parse_tree but the frames that are big enough are parsed in the executor (if there is one), all at the same
+        time so with more than 1 worker the main document and the iframes are parsed in parallel
+        """
+        args = (win_upper_bound, win_width, win_left_bound, win_height, device_pixel_ratio, platform)
+        if self.executor is None:
+            return self.parse_tree(tree, *args)
+
+        device_pixel_ratio, *window = self.window_bounds(*args)
+        frames = snapshot_frames(tree, device_pixel_ratio, window)
+        self.snapshot_index = frames[0][0]
+
+        async def _parse_frame(snapshot_index: SnapshotIndex, frame_window: Sequence[float]) -> List[Dict[str, Any]]:
+            if not self.executor.use_for(len(snapshot_index)):
+                return self._parse_frame(snapshot_index, device_pixel_ratio, frame_window)
+
+            cache_key, elements = self._cached_elements(snapshot_index, device_pixel_ratio, frame_window)
+            if elements is None:
+                elements = await self.executor.parse(
+                    tree,
+                    self.engine,
+                    device_pixel_ratio,
+                    frame_window,
+                    document_index=snapshot_index.document_index,
+                    offset=snapshot_index.offset,
+                    occlusion=self.occlusion,
+                )
+                self._cache_elements(cache_key, elements)
+            return elements
+
+        frame_elements = await asyncio.gather(*[_parse_frame(*frame) for frame in frames])
+        return self._set_parsed(tree, list(chain.from_iterable(frame_elements)))
+
+    def iter_tree(
+        self,
+        tree: Dict[str, Any],
+        win_upper_bound: int = 0,
+        win_width: int = 1280,
+        win_left_bound: int = 0,
+        win_height: int = 1080,
+        device_pixel_ratio: int = 1,
+        platform: str = "darwin",
+        order: Literal["document", "visual"] = "document",
+    ) -> Iterator[Tuple[str, int, Dict[str, Any]]]:
+        """
+        lazy version of parse_tree, yields (element_string, element_id, buffer_entry) for the elements_of_interest.
+        elements are only parsed when asked for so stopping early skips the rest of the page.  in document order the
+        ids/strings are the same as parse_tree, visual order is top to bottom then left to right.  the parser state
+        (page_element_buffer/elements_of_interest/ids_of_interest) has whatever was yielded so far.
+        """
+        device_pixel_ratio, *window = self.window_bounds(
+            win_upper_bound, win_width, win_left_bound, win_height, device_pixel_ratio, platform
+        )
 
-        child_nodes = {}
-        elements_in_view_port = []
-
-        anchor_ancestry = {"-1": (False, None)}
-        button_ancestry = {"-1": (False, None)}
-        select_ancestry = {"-1": (False, None)}
-
-        for index, node_name_index in enumerate(node_names):
-            node_parent = parent[index]
-            node_name = strings[node_name_index].lower()
-
-            is_ancestor_of_anchor, anchor_id = add_to_hash_tree(
-                hash_tree=anchor_ancestry,
-                tag=["a"],
-                node_id=index,
-                node_name=node_name,
-                parent_id=node_parent,
-                strings=strings,
-                node_names=node_names,
-                parent=parent,
-                attributes=attributes,
+        if self.full_page:
+            # streaming is for getting the first few elements so only look at the viewport
+            window, self.spatial_index = self.viewport, None
+
+        frames = snapshot_frames(tree, device_pixel_ratio, window)
+        self.snapshot_index = frames[0][0]
+        self.tree = tree
+
+        if order == "visual":
+            # each group gives its elements independently so parse them a group at a time, top to bottom.  bounds of
+            # the frames are page coords so groups from the iframes are sorted in with the main document
+            groups = [
+                (snapshot_index, group)
+                for snapshot_index, frame_window in frames
+                for group in group_candidates(
+                    self.snapshot_candidates(snapshot_index, device_pixel_ratio, *frame_window)
+                ).values()
+            ]
+            groups.sort(key=lambda frame_group: tuple(frame_group[0].bounds[frame_group[1][0][2], [1, 0]]))
+            occluders = {id(snapshot_index): self.occluders(snapshot_index) for snapshot_index, _ in frames}
+            elements = chain.from_iterable(
+                self.iter_visible(
+                    occluders[id(snapshot_index)], self.iter_candidates(snapshot_index, group, device_pixel_ratio)
+                )
+                for snapshot_index, group in groups
             )
-
-            is_ancestor_of_button, button_id = add_to_hash_tree(
-                button_ancestry,
-                ["button"],
-                index,
-                node_name,
-                node_parent,
-                strings=strings,
-                node_names=node_names,
-                parent=parent,
-                attributes=attributes,
+        else:
+            elements = chain.from_iterable(
+                self.iter_visible(
+                    self.occluders(snapshot_index),
+                    self.iter_candidates(
+                        snapshot_index,
+                        self.snapshot_candidates(snapshot_index, device_pixel_ratio, *frame_window),
+                        device_pixel_ratio,
+                        lazy=snapshot_index.in_document_order,
+                    ),
+                )
+                for snapshot_index, frame_window in frames
             )
 
-            is_ancestor_of_select, select_id = add_to_hash_tree(
-                select_ancestry,
-                ["select"],
-                index,
-                node_name,
-                node_parent,
-                strings=strings,
-                node_names=node_names,
-                parent=parent,
-                attributes=attributes,
+        if self.incremental:
+            self.page_element_buffer.clear()
+        self.element_ids, self.elements_of_interest, self.ids_of_interest = [], [], []
+        self.use_document(tree)
+
+        for element in elements:
+            element_id = self.stable_ids[element["backend_node_id"]]
+            self.page_element_buffer[element_id] = element
+            self.element_ids.append(element_id)
+
+            if (element_string := format_element(element, element_id)) is not None:
+                self.elements_of_interest.append(element_string)
+                self.ids_of_interest.append(element_id)
+                yield element_string, element_id, element
+
+    async def iter_parse(
+        self, order: Literal["document", "visual"] = "document"
+    ) -> AsyncIterator[Tuple[str, int, Dict[str, Any]]]:
+        pixel_ratio, win_s_x, win_s_y, upper_b, lower_b, win_w, win_h = await self.get_tree_and_page_size()
+        for parsed in self.iter_tree(self.tree, upper_b, win_w, lower_b, win_h, pixel_ratio, order=order):
+            yield parsed
+
+    async def parse_elements(self, num_elems: int = None, filter_fn: Callable[[str], bool] = None) -> List[str]:
+        """the first num_elems elements_of_interest (that pass filter_fn), stops parsing once it has them"""
+        if self.incremental or self.full_page:
+            # both need the whole page parsed to patch/query against
+            elements = await self.parse()
+            elements = list(filter(filter_fn, elements)) if filter_fn else elements
+            return elements[:num_elems] if num_elems else elements
+
+        elements = []
+        async for element, _, _ in self.iter_parse():
+            if filter_fn and not filter_fn(element):
+                continue
+            elements.append(element)
+            if num_elems and len(elements) >= num_elems:
+                break
+        return elements
+
+    def _cached_elements(
+        self, snapshot_index: SnapshotIndex, device_pixel_ratio: float, window: List[float]
+    ) -> Tuple[str | None, List[Dict[str, Any]] | None]:
+        if self.cache is None:
+            return None, None
+        cache_key = self.cache.key(snapshot_index, device_pixel_ratio, *window, self.occlusion)
+        return cache_key, self.cache.get(cache_key)
+
+    def _cache_elements(self, cache_key: str | None, elements: List[Dict[str, Any]]):
+        if cache_key is not None:
+            self.cache.put(cache_key, elements)
+
+    def _set_parsed(self, tree: Dict[str, Any], elements: List[Dict[str, Any]]) -> Tuple[List[str], List[int]]:
+        self.tree = tree
+        if self.incremental:
+            # only keep what is on the page now, ids are stable so anything still there gets the same id back
+            self.page_element_buffer.clear()
+        self.use_document(tree)
+        return self.set_elements(elements, self.stable_ids.ids(element["backend_node_id"] for element in elements))
+
+    def use_document(self, tree: Dict[str, Any]):
+        """start the id table over if the snapshot is of a new document (e.g. after navigating)"""
+        if self.extraction == "browser":
+            # the extracted ids are only unique within the document the token is for
+            document, namespace = tree.get("extractedDocument"), "extract"
+        else:
+            backend_node_ids = tree["documents"][0]["nodes"]["backendNodeId"]
+            document, namespace = (backend_node_ids[0] if backend_node_ids else None), "cdp"
+        if self.stable_ids.use_document(document, namespace=namespace):
+            # the ids in the buffer were for the old document
+            self.page_element_buffer.clear()
+
+    def patch_tree(
+        self,
+        tree: Dict[str, Any],
+        dirty_rects: List[Dict[str, float]],
+        win_upper_bound: int = 0,
+        win_width: int = 1280,
+        win_left_bound: int = 0,
+        win_height: int = 1080,
+        device_pixel_ratio: int = 1,
+        platform: str = "darwin",
+    ):
+        """
+        same as parse_tree but reuses the elements from the last parse that are not in dirty_rects (matched on
+        backend_node_id which is stable between snapshots).  those only get their position updated, everything else is
+        parsed like normal.  ids come from the backend_node_id either way.  dirty_rects are in document coords.
+        """
+        if len(tree["documents"]) > 1:
+            # elements are matched on the main document only, with frames just parse everything again
+            return self.parse_tree(
+                tree, win_upper_bound, win_width, win_left_bound, win_height, device_pixel_ratio, platform
             )
 
-            try:
-                cursor = layout_node_index.index(select_id) if is_ancestor_of_select else layout_node_index.index(index)
-            except:
-                continue
+        device_pixel_ratio, *window = self.window_bounds(
+            win_upper_bound, win_width, win_left_bound, win_height, device_pixel_ratio, platform
+        )
 
-            if node_name in black_listed_elements:
+        if tree is self.tree and getattr(self, "snapshot_index", None) is not None:
+            snapshot_index = self.snapshot_index
+        else:
+            snapshot_index = SnapshotIndex(tree)
+        candidates = list(self.snapshot_candidates(snapshot_index, device_pixel_ratio, *window))
+        layout_cursor = {index: cursor for index, _, cursor, _ in candidates}
+        bounds = snapshot_index.layout["bounds"]
+
+        reused = {}
+        for element_id in self.element_ids:
+            element = self.page_element_buffer[element_id]
+            node = snapshot_index.backend_node_index.get(element["backend_node_id"])
+            # element is gone, out of the viewport now or something in/around it changed
+            if (node is None) or (node not in layout_cursor) or _in_rects(element["bounds"], dirty_rects):
                 continue
+            reused[node] = _move_element(element, node, bounds[layout_cursor[node]], device_pixel_ratio)
 
-            style = map(lambda x: strings[x], styles[cursor])
-            if "none" in style:
-                continue
+        dirty_candidates = [candidate for candidate in candidates if candidate_group(candidate) not in reused]
+        parsed = {
+            int(element["node_index"]): element
+            for element in self.parse_candidates(snapshot_index, dirty_candidates, device_pixel_ratio)
+        }
+
+        elements = [reused[node] if node in reused else parsed[node] for node in sorted(reused.keys() | parsed.keys())]
+        self.use_document(tree)
+        element_ids = self.stable_ids.ids(element["backend_node_id"] for element in elements)
+
+        for element_id in set(self.element_ids) - set(element_ids):
+            self.page_element_buffer.pop(element_id, None)
+
+        self.tree, self.snapshot_index = tree, snapshot_index
+        return self.set_elements(elements, element_ids)
+
+    def snapshot_candidates(
+        self,
+        snapshot_index: SnapshotIndex,
+        device_pixel_ratio: float,
+        win_left_bound: float,
+        win_upper_bound: float,
+        win_right_bound: float,
+        win_lower_bound: float,
+    ) -> Iterator[Candidate] | List[Candidate]:
+        candidates_fn = {
+            "python": snapshot_candidates_python,
+            "numpy": snapshot_candidates_numpy,
+        }[self.engine]
+
+        return candidates_fn(
+            snapshot_index=snapshot_index,
+            black_listed_elements=black_listed_elements,
+            device_pixel_ratio=device_pixel_ratio,
+            win_left_bound=win_left_bound,
+            win_upper_bound=win_upper_bound,
+            win_right_bound=win_right_bound,
+            win_lower_bound=win_lower_bound,
+        )
+
+    def parse_candidates(
+        self,
+        snapshot_index: SnapshotIndex,
+        candidates: Iterator[Candidate] | List[Candidate],
+        device_pixel_ratio: float,
+    ) -> List[Dict[str, Any]]:
+        """turn the candidates from the first pass into the element dicts for page_element_buffer (without ids)"""
+        elements = list(self.iter_candidates(snapshot_index, candidates, device_pixel_ratio))
+        if (occluders := self.occluders(snapshot_index)) is not None:
+            # all the elements at once, coverage is computed in bulk
+            elements = drop_occluded(occluders, elements)
+        return elements
+
+    def occluders(self, snapshot_index: SnapshotIndex) -> Occluders | None:
+        """what can cover elements in the snapshot, None if occlusion is off"""
+        if not self.occlusion:
+            return None
+        return Occluders(snapshot_index, self.cdp_snapshot_kwargs["computedStyles"])
+
+    def iter_visible(
+        self, occluders: Occluders | None, elements: Iterator[Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        """drop_occluded for a stream of elements (one at a time rather than in bulk)"""
+        if occluders is None or not len(occluders):
+            yield from elements
+            return
+        for element in elements:
+            yield from drop_occluded(occluders, [element])
+
+    def iter_candidates(
+        self,
+        snapshot_index: SnapshotIndex,
+        candidates: Iterator[Candidate] | List[Candidate],
+        device_pixel_ratio: float,
+        lazy: bool = False,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        generator version of parse_candidates.  an element is only done once every node in its subtree has been seen
+        (children add their text/attributes to it), with lazy=True each element is yielded as soon as the candidates
+        go past its subtree rather than at the end.  lazy needs the candidates in document order.
+        """
+        strings = snapshot_index.strings
+        nodes = snapshot_index.nodes
+        backend_node_id = nodes["backendNodeId"]
+        node_value = nodes["nodeValue"]
+        bounds = snapshot_index.layout["bounds"]
+
+        child_nodes = {}
+        elements_in_view_port = deque()
+
+        # subtree end for each node, only used for lazy
+        subtree_end = snapshot_index.euler[1] if lazy else None
+
+        for index, node_name, cursor, ancestry in candidates:
+            while lazy and elements_in_view_port and (subtree_end[int(elements_in_view_port[0]["node_index"])] < index):
+                if (element := self._finish_element(elements_in_view_port.popleft(), child_nodes)) is not None:
+                    yield element
+
+            (
+                is_ancestor_of_anchor,
+                anchor_id,
+                is_ancestor_of_button,
+                button_id,
+                is_ancestor_of_select,
+                select_id,
+            ) = ancestry
 
             [x, y, width, height] = bounds[cursor]
             x /= device_pixel_ratio
@@ -407,44 +1052,10 @@ class DOMSnapshotParser(DOMParser):
             width /= device_pixel_ratio
             height /= device_pixel_ratio
 
-            elem_left_bound = x
-            elem_top_bound = y
-            elem_right_bound = x + width
-            elem_lower_bound = y + height
-
-            # comment this bit out to process the whole thing
-            partially_is_in_viewport = (
-                elem_left_bound < win_right_bound
-                and elem_right_bound >= win_left_bound
-                and elem_top_bound < win_lower_bound
-                and elem_lower_bound >= win_upper_bound
-            )
-
-            if not partially_is_in_viewport:
-                continue
-
             meta_data = []
 
             # inefficient to grab the same set of keys for kinds of objects but its fine for now
-            element_attributes = find_attributes(
-                attributes=attributes[index],
-                keys=[
-                    "type",
-                    "placeholder",
-                    "aria-label",
-                    "name",
-                    "class",
-                    "id",
-                    "title",
-                    "alt",
-                    "role",
-                    "value",
-                    "aria-labelledby",
-                    "aria-description",
-                    "aria-describedby",
-                ],
-                strings=strings,
-            )
+            element_attributes = snapshot_index.find_attributes(index, keys=element_attribute_keys)
 
             ancestor_exception = is_ancestor_of_anchor or is_ancestor_of_button or is_ancestor_of_select
             ancestor_node_key = None
@@ -497,11 +1108,8 @@ class DOMSnapshotParser(DOMParser):
                 # commonly used as a seperator, does not add much context - lets save ourselves some token space
                 if element_node_value == "|":
                     continue
-            elif node_name == "input" and index in input_value_index and element_node_value is None:
-                node_input_text_index = input_value_index.index(index)
-                text_index = input_value_values[node_input_text_index]
-                if node_input_text_index >= 0 and text_index >= 0:
-                    element_node_value = strings[text_index]
+            elif node_name == "input" and element_node_value is None:
+                element_node_value = snapshot_index.input_value(index)
 
             # remove redudant elements
             if ancestor_exception and (node_name not in ["a", "button", "select"]):
@@ -514,7 +1122,7 @@ class DOMSnapshotParser(DOMParser):
                     "node_name": node_name,
                     "node_value": element_node_value,
                     "node_meta": meta_data,
-                    "is_clickable": index in is_clickable,
+                    "is_clickable": snapshot_index.is_clickable(index),
                     "origin_x": int(x),
                     "origin_y": int(y),
                     "center_x": int(x + (width / 2)),
@@ -523,88 +1131,92 @@ class DOMSnapshotParser(DOMParser):
                 }
             )
 
-        # lets filter further to remove anything that does not hold any text nor has click handlers + merge text from leaf#text nodes with the parent
-        elements_of_interest = []
-        ids_of_interest = []
-        elements_locator = {}
-        id_counter = 0
-        flagg = False
-        for e_idx, element in enumerate(elements_in_view_port):
-            node_index = element.get("node_index")
-            node_name = element.get("node_name")
-            node_value = element.get("node_value")
-            is_clickable = element.get("is_clickable")
-            origin_x = element.get("origin_x")
-            origin_y = element.get("origin_y")
-            center_x = element.get("center_x")
-            center_y = element.get("center_y")
-            meta_data = element.get("node_meta")
-            bounds = element.get("bounds")
-
-            inner_text = f"{node_value} " if node_value else ""
-            meta = ""
-
-            if node_index in child_nodes:
-                for child in child_nodes.get(node_index):
-                    entry_type = child.get("type")
-                    entry_value = child.get("value")
-
-                    if entry_type == "attribute":
-                        entry_key = child.get("key")
-                        _append_str = f'{entry_key}="{entry_value}"'
-                        meta_data.append(_append_str)
-                    else:
-                        inner_text += f"{entry_value} "
-
-            if len(meta_data) > 2 or inner_text != "":
-                meta_data = list(filter(lambda x: not re.match('(class|id)=".+"', x), meta_data))
-
-            if meta_data:
-                meta_string = " ".join(meta_data)
-                meta = f" {meta_string}"
+        while elements_in_view_port:
+            if (element := self._finish_element(elements_in_view_port.popleft(), child_nodes)) is not None:
+                yield element
 
-            if inner_text != "":
-                inner_text = f"{inner_text.strip()}"
-
-            converted_node_name = convert_name(node_name, is_clickable)
+    def _finish_element(
+        self, element: Dict[str, Any], child_nodes: Dict[str, List[Dict[str, str]]]
+    ) -> Dict[str, Any] | None:
+        # lets filter further to remove anything that does not hold any text nor has click handlers + merge text from leaf#text nodes with the parent
+        node_index = element.get("node_index")
+        node_name = element.get("node_name")
+        node_value = element.get("node_value")
+        is_clickable = element.get("is_clickable")
+        origin_x = element.get("origin_x")
+        origin_y = element.get("origin_y")
+        center_x = element.get("center_x")
+        center_y = element.get("center_y")
+        meta_data = element.get("node_meta")
+        bounds = element.get("bounds")
+
+        inner_text = f"{node_value} " if node_value else ""
+        meta = ""
+
+        if node_index in child_nodes:
+            for child in child_nodes.get(node_index):
+                entry_type = child.get("type")
+                entry_value = child.get("value")
+
+                if entry_type == "attribute":
+                    entry_key = child.get("key")
+                    _append_str = f'{entry_key}="{entry_value}"'
+                    meta_data.append(_append_str)
+                else:
+                    inner_text += f"{entry_value} "
+
+        if len(meta_data) > 2 or inner_text != "":
+            meta_data = list(filter(lambda x: not re.match('(class|id)=".+"', x), meta_data))
+
+        if meta_data:
+            meta_string = " ".join(meta_data)
+            meta = f" {meta_string}"
+
+        if inner_text != "":
+            inner_text = f"{inner_text.strip()}"
+
+        converted_node_name = convert_name(node_name, is_clickable)
+
+        # not very elegant, more like a placeholder
+        if (
+            converted_node_name not in ["button", "link", "input", "img", "textarea", "select"]
+            and inner_text.strip() == ""
+        ):
+            return None
+        elif converted_node_name == "button" and meta == "" and inner_text.strip() == "":
+            return None
 
-            # not very elegant, more like a placeholder
-            if (
-                converted_node_name not in ["button", "link", "input", "img", "textarea", "select"]
-                and inner_text.strip() == ""
-            ):
-                continue
-            elif converted_node_name == "button" and meta == "" and inner_text.strip() == "":
-                continue
+        meta = re.sub("\s+", " ", meta)
+        inner_text = re.sub("\s+", " ", inner_text)
 
-            page_element_buffer[id_counter] = element
+        element["selectors"] = {
+            "meta": meta,
+            "inner_text": inner_text,
+            "converted_node_name": converted_node_name,
+        }
+        return element
 
-            meta = re.sub("\s+", " ", meta)
-            inner_text = re.sub("\s+", " ", inner_text)
+    def set_elements(
+        self, elements: List[Dict[str, Any]], element_ids: List[int] = None
+    ) -> Tuple[List[str], List[int]]:
+        """give the elements ids (in order unless element_ids are passed) and make elements_of_interest from them"""
+        elements_of_interest = []
+        ids_of_interest = []
 
-            element["selectors"] = {
-                "meta": meta,
-                "inner_text": inner_text,
-                "converted_node_name": converted_node_name,
-            }
+        element_ids = element_ids if element_ids is not None else range(len(elements))
+        for element_id, element in zip(element_ids, elements):
+            self.page_element_buffer[element_id] = element
 
-            if inner_text != "":
-                to_append = f"""{converted_node_name} {id_counter}{meta} \"{inner_text}\""""
-                elements_of_interest.append(to_append)
-                ids_of_interest.append(id_counter)
-            elif converted_node_name in ["input", "button", "textarea"] or "alt" in meta:
-                to_append = f"""{converted_node_name} {id_counter}{meta}"""
-                elements_of_interest.append(to_append)
-                ids_of_interest.append(id_counter)
-            elif converted_node_name == "select" and meta != "":
-                to_append = f"""{converted_node_name} {id_counter}{meta}"""
+            if (to_append := format_element(element, element_id)) is not None:
                 elements_of_interest.append(to_append)
-                ids_of_interest.append(id_counter)
-            else:
-                # print(f"""{converted_node_name} {id_counter}{meta}""")
-                pass  # pass so id counter is still incremented
-                # continue
-            id_counter += 1
+                ids_of_interest.append(element_id)
 
+        self.element_ids = list(element_ids)
         self.elements_of_interest, self.ids_of_interest = elements_of_interest, ids_of_interest
+
+        if self.full_page:
+            self.page_elements_of_interest, self.page_ids_of_interest = elements_of_interest, ids_of_interest
+            boxes = [[v / self.device_pixel_ratio for v in element["bounds"]] for element in elements]
+            self.spatial_index = SpatialIndex(self.element_ids, boxes)
+            return self._view_elements()
         return elements_of_interest, ids_of_interest
@@ -0,0 +1,84 @@
+from typing import List, Set, Tuple
+
+import numpy as np
+
+from clippy.crawler.parser.snapshot_index import SnapshotIndex
+
+# NOTE:
+# this is the numpy version of the first pass in DOMSnapshotParser.parse_tree.  the python version walks every node
+# and checks the ancestry/layout/styles one node at a time which is where most of the time goes on big pages.
+# here we do the filtering as array ops over the SnapshotIndex so that only the nodes that survive
+# (i.e. visible + laid out + not blacklisted) are handed back to the per element python code.
+
+Ancestry = Tuple[bool, int | None, bool, int | None, bool, int | None]
+Candidate = Tuple[int, str, int, Ancestry]
+
+
+def snapshot_candidates(
+    snapshot_index: SnapshotIndex,
+    black_listed_elements: Set[str],
+    device_pixel_ratio: float,
+    win_left_bound: float,
+    win_upper_bound: float,
+    win_right_bound: float,
+    win_lower_bound: float,
+) -> List[Candidate]:
+    """
+    returns the nodes that pass the layout/blacklist/display/viewport checks, in document order, as
+        (node_index, node_name, layout_cursor, (is_anchor, anchor_id, is_button, button_id, is_select, select_id))
+    which is exactly what the python loop in DOMSnapshotParser.parse_tree would have kept
+    """
+    n = snapshot_index.n_nodes
+    if n == 0:
+        return []
+
+    anchor = snapshot_index.tagged_ancestors("a")
+    button = snapshot_index.tagged_ancestors("button")
+    select = snapshot_index.tagged_ancestors("select")
+
+    # options etc. inside a select use the layout of the select
+    cursor = snapshot_index.layout_rows[np.where(select >= 0, select, np.arange(n, dtype=np.int64))]
+
+    keep = cursor >= 0
+    keep &= ~snapshot_index.name_mask(*black_listed_elements)
+
+    if not keep.any():
+        return []
+
+    bounds = snapshot_index.bounds
+    x = bounds[:, 0] / device_pixel_ratio
+    y = bounds[:, 1] / device_pixel_ratio
+    width = bounds[:, 2] / device_pixel_ratio
+    height = bounds[:, 3] / device_pixel_ratio
+    row_in_viewport = (
+        (x < win_right_bound)
+        & ((x + width) >= win_left_bound)
+        & (y < win_lower_bound)
+        & ((y + height) >= win_upper_bound)
+    )
+
+    safe_cursor = np.where(keep, cursor, 0)
+    keep &= ~snapshot_index.row_display_none[safe_cursor] & row_in_viewport[safe_cursor]
+
+    nodes = np.flatnonzero(keep)
+    names = snapshot_index.names
+
+    candidates = []
+    for node, name_idx, row, a_id, b_id, s_id in zip(
+        nodes.tolist(),
+        snapshot_index.name_inverse[nodes].tolist(),
+        cursor[nodes].tolist(),
+        anchor[nodes].tolist(),
+        button[nodes].tolist(),
+        select[nodes].tolist(),
+    ):
+        ancestry = (
+            a_id >= 0,
+            a_id if a_id >= 0 else None,
+            b_id >= 0,
+            b_id if b_id >= 0 else None,
+            s_id >= 0,
+            s_id if s_id >= 0 else None,
+        )
+        candidates.append((node, names[name_idx], row, ancestry))
+    return candidates
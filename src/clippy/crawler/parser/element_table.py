@@ -0,0 +1,233 @@
+import sys
+from collections.abc import Mapping, MutableMapping
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+
+# NOTE:
+# page_element_buffer used to be a dict of dicts (11 keys + a nested selectors dict per element) which on big pages
+# and long sessions is most of the memory the parser uses.  ElementTable keeps the same data as columns (int32
+# coords/ids, interned strings, a bitset for is_clickable) and hands out ElementRow views that have the same keys as
+# the old dicts so get_loc_helper/dom_parser_text/etc dont need to change.  setting an id with a dict still works,
+# it is just packed into the columns.
+
+_INT_COLUMNS = ("node_index", "origin_x", "origin_y", "center_x", "center_y")
+_STRING_COLUMNS = ("node_name", "node_value", "meta", "inner_text", "converted_node_name")
+
+ELEMENT_KEYS = (
+    "node_index",
+    "backend_node_id",
+    "node_name",
+    "node_value",
+    "node_meta",
+    "is_clickable",
+    "origin_x",
+    "origin_y",
+    "center_x",
+    "center_y",
+    "bounds",
+    "selectors",
+    "occluded",
+)
+
+
+class ElementRow(Mapping):
+    """read only view of one element in an ElementTable, behaves like the element dict"""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: "ElementTable", row: int):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        return self._table._get(self._row, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in ELEMENT_KEYS if self._table._has(self._row, key))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"ElementRow({dict(self)})"
+
+
+class ElementTable(MutableMapping):
+    """element id -> element, stored as typed columns"""
+
+    def __init__(self, capacity: int = 64):
+        self._rows: Dict[int, int] = {}  # element id -> row
+        self._n = 0
+
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+
+        self._ints = {column: np.zeros(capacity, dtype=np.int32) for column in _INT_COLUMNS}
+        self._backend_node_id = np.zeros(capacity, dtype=np.int64)
+        self._str = {column: np.full(capacity, -1, dtype=np.int32) for column in _STRING_COLUMNS}
+        self._bounds = np.zeros((capacity, 4), dtype=np.float64)
+        # fraction covered by an overlay (see occlusion), nan for elements that are not covered
+        self._occluded = np.full(capacity, np.nan, dtype=np.float32)
+        self._clickable = np.zeros((capacity + 63) // 64, dtype=np.uint64)
+        self._has_selectors = np.zeros((capacity + 63) // 64, dtype=np.uint64)
+
+        # node_meta is ragged so it goes in one flat array of string ids
+        self._meta_start = np.zeros(capacity, dtype=np.int32)
+        self._meta_len = np.zeros(capacity, dtype=np.int32)
+        self._meta_flat = np.zeros(capacity * 2, dtype=np.int32)
+        self._meta_n = 0
+
+    # --- mapping
+
+    def __getitem__(self, element_id: int) -> ElementRow:
+        return ElementRow(self, self._rows[element_id])
+
+    def __setitem__(self, element_id: int, element: Mapping[str, Any]):
+        self._rows[element_id] = self._append(element)
+        # rows are not reused so if most of them are overwritten/deleted ones pack the table again
+        if (self._n > 1024) and (self._n > 2 * len(self._rows)):
+            self._compact()
+
+    def __delitem__(self, element_id: int):
+        del self._rows[element_id]
+
+    def _compact(self):
+        elements = [(element_id, dict(self[element_id])) for element_id in self._rows]
+        self.clear()
+        for element_id, element in elements:
+            self._rows[element_id] = self._append(element)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __repr__(self) -> str:
+        return f"ElementTable(n={len(self)}, rows={self._n}, strings={len(self._strings)})"
+
+    def clear(self):
+        self._rows.clear()
+        self._strings.clear()
+        self._string_ids.clear()
+        self._n = 0
+        self._meta_n = 0
+        self._clickable[:] = 0
+        self._has_selectors[:] = 0
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [*self._ints.values(), *self._str.values(), self._backend_node_id, self._bounds, self._occluded]
+        arrays += [self._clickable]
+        arrays += [self._has_selectors, self._meta_start, self._meta_len, self._meta_flat]
+        return sum(arr.nbytes for arr in arrays) + sum(sys.getsizeof(s) for s in self._strings)
+
+    # --- strings
+
+    def _intern(self, value: str | None) -> int:
+        if value is None:
+            return -1
+        if (string_id := self._string_ids.get(value)) is None:
+            string_id = self._string_ids[value] = len(self._strings)
+            self._strings.append(sys.intern(value))
+        return string_id
+
+    def _string(self, string_id: int) -> str | None:
+        return self._strings[string_id] if string_id >= 0 else None
+
+    # --- bitsets
+
+    @staticmethod
+    def _set_bit(bits: np.ndarray, row: int, value: bool):
+        word, bit = row >> 6, np.uint64(1 << (row & 63))
+        bits[word] = (bits[word] | bit) if value else (bits[word] & ~bit)
+
+    @staticmethod
+    def _get_bit(bits: np.ndarray, row: int) -> bool:
+        return bool((int(bits[row >> 6]) >> (row & 63)) & 1)
+
+    # --- storage
+
+    def _grow(self, needed: int):
+        capacity = len(self._backend_node_id)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+
+        def _resize(arr: np.ndarray, size: int, fill: Any = 0) -> np.ndarray:
+            out = np.full((size, *arr.shape[1:]), fill, dtype=arr.dtype)
+            out[: len(arr)] = arr
+            return out
+
+        self._ints = {column: _resize(arr, new_capacity) for column, arr in self._ints.items()}
+        self._str = {column: _resize(arr, new_capacity) for column, arr in self._str.items()}
+        self._backend_node_id = _resize(self._backend_node_id, new_capacity)
+        self._bounds = _resize(self._bounds, new_capacity)
+        self._occluded = _resize(self._occluded, new_capacity, np.nan)
+        self._meta_start = _resize(self._meta_start, new_capacity)
+        self._meta_len = _resize(self._meta_len, new_capacity)
+        self._clickable = _resize(self._clickable, (new_capacity + 63) // 64)
+        self._has_selectors = _resize(self._has_selectors, (new_capacity + 63) // 64)
+
+    def _append(self, element: Mapping[str, Any]) -> int:
+        row = self._n
+        self._grow(row + 1)
+        self._n += 1
+
+        self._ints["node_index"][row] = int(element["node_index"])
+        for column in _INT_COLUMNS[1:]:
+            self._ints[column][row] = element[column]
+        self._backend_node_id[row] = element["backend_node_id"]
+        self._bounds[row] = element["bounds"]
+        self._occluded[row] = element.get("occluded", np.nan)
+        self._set_bit(self._clickable, row, bool(element["is_clickable"]))
+
+        self._str["node_name"][row] = self._intern(element["node_name"])
+        self._str["node_value"][row] = self._intern(element["node_value"])
+
+        selectors = element.get("selectors")
+        self._set_bit(self._has_selectors, row, selectors is not None)
+        for column in ("meta", "inner_text", "converted_node_name"):
+            self._str[column][row] = self._intern(selectors[column]) if selectors is not None else -1
+
+        node_meta = [self._intern(meta) for meta in element["node_meta"]]
+        if self._meta_n + len(node_meta) > len(self._meta_flat):
+            self._meta_flat = np.concatenate(
+                [self._meta_flat, np.zeros(max(len(self._meta_flat), len(node_meta)), dtype=np.int32)]
+            )
+        self._meta_start[row], self._meta_len[row] = self._meta_n, len(node_meta)
+        self._meta_flat[self._meta_n : self._meta_n + len(node_meta)] = node_meta
+        self._meta_n += len(node_meta)
+        return row
+
+    def _has(self, row: int, key: str) -> bool:
+        match key:
+            case "selectors":
+                return self._get_bit(self._has_selectors, row)
+            case "occluded":
+                return not np.isnan(self._occluded[row])
+        return True
+
+    def _get(self, row: int, key: str) -> Any:
+        match key:
+            case "node_index":
+                return str(self._ints["node_index"][row])
+            case "origin_x" | "origin_y" | "center_x" | "center_y":
+                return int(self._ints[key][row])
+            case "backend_node_id":
+                return int(self._backend_node_id[row])
+            case "node_name" | "node_value":
+                return self._string(self._str[key][row])
+            case "node_meta":
+                start = self._meta_start[row]
+                return [self._strings[i] for i in self._meta_flat[start : start + self._meta_len[row]].tolist()]
+            case "is_clickable":
+                return self._get_bit(self._clickable, row)
+            case "bounds":
+                return self._bounds[row].tolist()
+            case "occluded" if self._has(row, key):
+                return round(float(self._occluded[row]), 2)
+            case "selectors" if self._has(row, key):
+                return {column: self._string(self._str[column][row]) for column in _STRING_COLUMNS[2:]}
+        raise KeyError(key)
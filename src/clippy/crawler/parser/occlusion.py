@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from clippy.crawler.parser.snapshot_index import SnapshotIndex
+
+# NOTE:
+# cookie banners/modals/sticky headers are laid out on top of the page but the elements under them still have boxes in
+# the viewport so they end up in elements_of_interest and the model picks things it cannot click.  the snapshot has
+# the paint order for every layout row (higher is painted later, i.e. on top) so an element is covered by anything
+# opaque-ish that is painted after it and overlaps its box.  only boxes with a background (or replaced elements like
+# img/video) count as covering since most layout boxes are transparent wrappers.  this is per document, an iframe
+# over the main document does not hide anything in it.
+
+# elements with content even without a background
+REPLACED_ELEMENTS = ("img", "video", "canvas", "iframe", "svg", "embed", "object")
+TRANSPARENT = ("rgba(0, 0, 0, 0)", "transparent")
+
+# element with at least this much of its box under a single occluder is dropped
+OCCLUDED_DROP = 0.99
+
+# max element x occluder pairs per chunk when computing coverage
+_CHUNK = 1 << 20
+
+
+class Occluders:
+    """layout rows of a snapshot that can cover other elements, computed once per snapshot"""
+
+    def __init__(self, snapshot_index: SnapshotIndex, style_names: Sequence[str]):
+        self.snapshot_index = snapshot_index
+        paint_orders = snapshot_index.paint_orders
+        self.enabled = paint_orders is not None and "background-color" in style_names
+        if not self.enabled:
+            return
+
+        si = snapshot_index
+        nodes = si.layout_node_index
+        is_element = ~si.name_mask("#text", "#document", "#comment", "#document-fragment")[nodes]
+
+        background = si.row_styles(list(style_names).index("background-color"))
+        painted = ~np.isin(background, si.string_ids(*TRANSPARENT)) & (background >= 0)
+        painted |= si.name_mask(*REPLACED_ELEMENTS)[nodes]
+
+        visible = ~si.row_display_none
+        if "opacity" in style_names:
+            visible &= ~np.isin(si.row_styles(list(style_names).index("opacity")), si.string_ids("0"))
+
+        bounds = si.bounds
+        keep = np.flatnonzero(is_element & painted & visible & (bounds[:, 2] > 0) & (bounds[:, 3] > 0))
+
+        tin, tout = si.euler
+        self.nodes = nodes[keep]
+        self.paint_order = paint_orders[keep]
+        self.tin, self.tout = tin[self.nodes], tout[self.nodes]
+        # x0, y0, x1, y1
+        self.boxes = np.column_stack([bounds[keep, :2], bounds[keep, :2] + bounds[keep, 2:]])
+
+    def __len__(self) -> int:
+        return len(self.nodes) if self.enabled else 0
+
+    def coverage(self, nodes: np.ndarray, bounds: np.ndarray) -> np.ndarray:
+        """
+        fraction of each element box (nodes/bounds are the snapshot node and its x, y, width, height) covered by the
+        largest single occluder painted on top of it.  occluders that are an ancestor or descendant of the element do
+        not count (a button with a background does not cover itself, a link is not covered by its own icon)
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+        covered = np.zeros(len(nodes), dtype=np.float64)
+        if not len(self) or not len(nodes):
+            return covered
+
+        si = self.snapshot_index
+        tin, tout = si.euler
+        paint_order = si.paint_orders[si.layout_rows[nodes]]
+        area = bounds[:, 2] * bounds[:, 3]
+        x0, y0 = bounds[:, 0], bounds[:, 1]
+        x1, y1 = x0 + bounds[:, 2], y0 + bounds[:, 3]
+
+        step = max(1, _CHUNK // len(self))
+        for start in range(0, len(nodes), step):
+            chunk = slice(start, start + step)
+            e_tin, e_tout = tin[nodes[chunk]][:, None], tout[nodes[chunk]][:, None]
+            related = ((self.tin <= e_tin) & (e_tin <= self.tout)) | ((e_tin <= self.tin) & (self.tin <= e_tout))
+            above = (self.paint_order > paint_order[chunk][:, None]) & ~related
+
+            width = np.minimum(x1[chunk, None], self.boxes[:, 2]) - np.maximum(x0[chunk, None], self.boxes[:, 0])
+            height = np.minimum(y1[chunk, None], self.boxes[:, 3]) - np.maximum(y0[chunk, None], self.boxes[:, 1])
+            overlap = np.where(above, np.clip(width, 0, None) * np.clip(height, 0, None), 0.0)
+            covered[chunk] = overlap.max(axis=1)
+
+        return np.divide(covered, area, out=np.zeros_like(covered), where=area > 0)
+
+
+def drop_occluded(occluders: Occluders, elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """elements without the ones under an occluder, partly covered ones get `occluded` (the covered fraction)"""
+    if not len(occluders) or not elements:
+        return elements
+
+    nodes = [int(element["node_index"]) for element in elements]
+    covered = occluders.coverage(nodes, [element["bounds"] for element in elements])
+
+    visible = []
+    for element, fraction in zip(elements, covered.tolist()):
+        if fraction >= OCCLUDED_DROP:
+            continue
+        if fraction > 0:
+            element["occluded"] = round(fraction, 2)
+        visible.append(element)
+    return visible
@@ -0,0 +1,110 @@
+import hashlib
+import pickle
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import numpy as np
+
+from clippy.crawler.parser.snapshot_index import SnapshotIndex, flatten
+
+# NOTE:
+# retries, get_elements + suggest_action on the same step and revisiting pages all end up parsing a snapshot that is
+# byte identical to one we already parsed.  the cache is keyed on a hash of the snapshot (string table + node/layout
+# arrays incl. paint orders) and the viewport params so a hit gives exactly what parse_tree would have.  the cache is
+# shared between parsers (Clippy makes a new DOMSnapshotParser each time) so it is bounded by number of entries and by
+# memory.
+
+
+class ParseCache:
+    def __init__(self, max_entries: int = 32, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self.n_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    @staticmethod
+    def key(snapshot_index: SnapshotIndex, *params: Any) -> str:
+        """hash of the snapshot and the params used to parse it (viewport/pixel ratio)"""
+        nodes, layout = snapshot_index.nodes, snapshot_index.layout
+        hasher = hashlib.blake2b(digest_size=16)
+
+        def _update(*arrays: np.ndarray):
+            for arr in arrays:
+                # include the length so [1, 2] + [3] and [1] + [2, 3] are different
+                hasher.update(np.int64(arr.size).tobytes())
+                hasher.update(np.ascontiguousarray(arr).tobytes())
+
+        hasher.update("\x00".join(snapshot_index.strings).encode("utf-8", "surrogatepass"))
+        hasher.update(repr(params).encode())
+        _update(
+            snapshot_index.parent,
+            snapshot_index.node_name_ids,
+            np.asarray(nodes["nodeValue"], dtype=np.int64),
+            np.asarray(nodes["backendNodeId"], dtype=np.int64),
+            *flatten(nodes["attributes"]),
+            np.asarray(nodes["inputValue"]["index"], dtype=np.int64),
+            np.asarray(nodes["inputValue"]["value"], dtype=np.int64),
+            np.asarray(nodes["isClickable"]["index"], dtype=np.int64),
+            snapshot_index.layout_node_index,
+            snapshot_index.bounds,
+            *flatten(layout["styles"]),
+        )
+        if snapshot_index.paint_orders is not None:
+            # occlusion depends on the stacking order, the same boxes painted in another order are another parse
+            _update(snapshot_index.paint_orders)
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> List[Dict[str, Any]] | None:
+        """the parsed elements for key (a new copy each time since the parser hands them out), None if missing"""
+        if (value := self._entries.get(key)) is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return pickle.loads(value)
+
+    def put(self, key: str, elements: List[Dict[str, Any]]):
+        # stored pickled, gives us the size for free and the cached elements cant be mutated from outside
+        value = pickle.dumps(elements, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(value) > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self.n_bytes -= len(self._entries.pop(key))
+
+        self._entries[key] = value
+        self.n_bytes += len(value)
+
+        while (len(self._entries) > self.max_entries) or (self.n_bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self.n_bytes -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.n_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.n_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# shared by all the DOMSnapshotParser's unless they are given their own
+parse_cache = ParseCache()
@@ -0,0 +1,162 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from clippy.crawler.parser.snapshot_index import flatten
+
+# NOTE:
+# parse_tree is cpu bound and when it runs on the event loop the capture hooks (console/dom) and playwright's own
+# message handling are blocked, so captured events can come in late/out of order.  ParseExecutor ships the snapshot to
+# a warm worker process and the loop just awaits the result.  the snapshot is sent as flat numpy arrays (only the
+# fields the parser uses) since pickling the nested lists from CDP is slow and big.  for small snapshots the IPC costs
+# more than it saves so those are parsed in the loop like before.
+
+# fields the parser reads from nodes/layout.  ragged are the list of lists (per node/per layout row) fields
+_NODE_FIELDS = ("parentIndex", "nodeName", "nodeValue", "backendNodeId")
+_NODE_RAGGED = ("attributes",)
+_LAYOUT_FIELDS = ("nodeIndex",)
+_LAYOUT_RAGGED = ("styles",)
+# only in snapshots taken with includePaintOrder (used for occlusion)
+_LAYOUT_OPTIONAL = ("paintOrders",)
+
+
+def _encode_ragged(ragged: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    values, rows = flatten(ragged)
+    return values.astype(np.int32), np.bincount(rows, minlength=len(ragged)).astype(np.int32)
+
+
+def _decode_ragged(values: np.ndarray, lengths: np.ndarray) -> List[List[int]]:
+    values = values.tolist()
+    offsets = np.concatenate(([0], np.cumsum(lengths))).tolist()
+    return [values[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def encode_snapshot(tree: Dict[str, Any], document_index: int = 0) -> Dict[str, Any]:
+    """compact version of a captureSnapshot result with just what DOMSnapshotParser needs, see decode_snapshot"""
+    document = tree["documents"][document_index]
+    nodes, layout = document["nodes"], document["layout"]
+
+    return {
+        "strings": tree["strings"],
+        "nodes": {
+            **{field: np.asarray(nodes[field], dtype=np.int32) for field in _NODE_FIELDS},
+            **{field: _encode_ragged(nodes[field]) for field in _NODE_RAGGED},
+            "inputValue": {key: np.asarray(nodes["inputValue"][key], dtype=np.int32) for key in ("index", "value")},
+            "isClickable": {"index": np.asarray(nodes["isClickable"]["index"], dtype=np.int32)},
+        },
+        "layout": {
+            **{field: np.asarray(layout[field], dtype=np.int32) for field in _LAYOUT_FIELDS},
+            **{field: _encode_ragged(layout[field]) for field in _LAYOUT_RAGGED},
+            **{field: np.asarray(layout[field], dtype=np.int32) for field in _LAYOUT_OPTIONAL if field in layout},
+            "bounds": np.asarray(layout["bounds"], dtype=np.float64).reshape(-1, 4),
+        },
+    }
+
+
+def decode_snapshot(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """back to the captureSnapshot format (single document) so it can go through parse_tree"""
+    nodes, layout = payload["nodes"], payload["layout"]
+    return {
+        "strings": payload["strings"],
+        "documents": [
+            {
+                "nodes": {
+                    **{field: nodes[field].tolist() for field in _NODE_FIELDS},
+                    **{field: _decode_ragged(*nodes[field]) for field in _NODE_RAGGED},
+                    "inputValue": {key: arr.tolist() for key, arr in nodes["inputValue"].items()},
+                    "isClickable": {"index": nodes["isClickable"]["index"].tolist()},
+                },
+                "layout": {
+                    **{field: layout[field].tolist() for field in _LAYOUT_FIELDS},
+                    **{field: _decode_ragged(*layout[field]) for field in _LAYOUT_RAGGED},
+                    **{field: layout[field].tolist() for field in _LAYOUT_OPTIONAL if field in layout},
+                    "bounds": layout["bounds"].tolist(),
+                },
+            }
+        ],
+    }
+
+
+def _warm_worker() -> bool:
+    # import in the worker so the first real parse does not pay for it
+    import clippy.crawler.parser.dom_snapshot  # noqa: F401
+
+    return True
+
+
+def _parse_in_worker(
+    payload: Dict[str, Any],
+    engine: str,
+    device_pixel_ratio: float,
+    window: Tuple[float, float, float, float],
+    offset: Tuple[float, float] = (0.0, 0.0),
+    occlusion: bool = True,
+) -> List[Dict[str, Any]]:
+    from clippy.crawler.parser.dom_snapshot import DOMSnapshotParser
+    from clippy.crawler.parser.snapshot_index import SnapshotIndex
+
+    # window/pixel ratio/frame offset were already resolved by the parser in the main process
+    parser = DOMSnapshotParser(engine=engine, cache=None, occlusion=occlusion)
+    snapshot_index = SnapshotIndex(decode_snapshot(payload), offset=offset)
+    candidates = parser.snapshot_candidates(snapshot_index, device_pixel_ratio, *window)
+    return parser.parse_candidates(snapshot_index, candidates, device_pixel_ratio)
+
+
+class ParseExecutor:
+    """process pool for DOMSnapshotParser, pass to the parser with `DOMSnapshotParser(crawler, executor=...)`"""
+
+    def __init__(self, max_workers: int = 1, min_nodes: int = 5_000, mp_context: str = "spawn"):
+        # spawn rather than fork since the parent has playwright/asyncio threads running
+        self.max_workers = max_workers
+        self.min_nodes = min_nodes
+        self.mp_context = mp_context
+        self._pool: ProcessPoolExecutor = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.mp_context),
+            )
+        return self._pool
+
+    def use_for(self, n_nodes: int) -> bool:
+        return n_nodes >= self.min_nodes
+
+    async def warm(self):
+        """start the workers so the first parse does not wait on process startup + imports"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, _warm_worker) for _ in range(self.max_workers)])
+
+    async def parse(
+        self,
+        tree: Dict[str, Any],
+        engine: str,
+        device_pixel_ratio: float,
+        window: Tuple[float, float, float, float],
+        document_index: int = 0,
+        offset: Tuple[float, float] = (0.0, 0.0),
+        occlusion: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """parse one document of the snapshot, offset is where the document is in the page (for iframes)"""
+        loop = asyncio.get_running_loop()
+        payload = encode_snapshot(tree, document_index)
+        return await loop.run_in_executor(
+            self.pool,
+            _parse_in_worker,
+            payload,
+            engine,
+            device_pixel_ratio,
+            tuple(window),
+            tuple(offset),
+            occlusion,
+        )
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
@@ -0,0 +1,345 @@
+import sys
+from functools import cached_property
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# NOTE:
+# the DOMSnapshot result is columnar (one list per property, indexed by node or by layout row) and every consumer was
+# re-deriving what it needed from it.  e.g. parse_tree was doing layout_node_index.index(node) for every node (O(n^2)),
+# find_attributes was rescanning the flat [key, value, key, value, ...] lists and the ancestry was recursive.
+# SnapshotIndex is built once per snapshot and everything is computed lazily and cached so you only pay for what you
+# use.  the parsers and the locator helpers should query this rather than the raw tree.
+
+
+def flatten(ragged: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """flatten a list of lists to (values, row each value came from)"""
+    lengths = np.fromiter((len(r) for r in ragged), dtype=np.int64, count=len(ragged))
+    values = np.fromiter(chain.from_iterable(ragged), dtype=np.int64, count=int(lengths.sum()))
+    rows = np.repeat(np.arange(len(ragged), dtype=np.int64), lengths)
+    return values, rows
+
+
+def first_occurrence(values: np.ndarray, size: int) -> np.ndarray:
+    """inverse map of values -> position of first occurrence, -1 if value is missing (same as list.index)"""
+    out = np.full(size, -1, dtype=np.int64)
+    uniq, first = np.unique(values, return_index=True)
+    keep = (uniq >= 0) & (uniq < size)
+    out[uniq[keep]] = first[keep]
+    return out
+
+
+def nearest_tagged_ancestor(parent: np.ndarray, is_tag: np.ndarray) -> np.ndarray:
+    """for each node the closest node (including itself) where is_tag is True, -1 if there is none
+
+    done with pointer jumping so its log(depth) array ops and cant hit the recursion limit on deep pages
+    """
+    n = len(parent)
+    sentinel = n
+    jump = np.where(is_tag, np.arange(n, dtype=np.int64), parent)
+    jump = np.append(np.where(jump < 0, sentinel, jump), sentinel)
+
+    while True:
+        nxt = jump[jump]
+        if np.array_equal(nxt, jump):
+            break
+        jump = nxt
+
+    ancestor = jump[:n]
+    return np.where(ancestor == sentinel, -1, ancestor)
+
+
+class SnapshotIndex:
+    """indexed view over one document of a `DOMSnapshot.captureSnapshot` result"""
+
+    def __init__(self, tree: Dict[str, Any], document_index: int = 0, offset: Tuple[float, float] = (0.0, 0.0)):
+        """offset is added to the layout bounds, for iframe documents it is where the frame is in the page"""
+        self.tree = tree
+        self.strings: List[str] = tree["strings"]
+        self.document_index = document_index
+        self.document: Dict[str, Any] = tree["documents"][document_index]
+        self.nodes: Dict[str, Any] = self.document["nodes"]
+        self.layout: Dict[str, Any] = self.document["layout"]
+
+        self.offset = offset
+        if offset[0] or offset[1]:
+            dx, dy = offset
+            bounds = [[x + dx, y + dy, width, height] for x, y, width, height in self.layout["bounds"]]
+            self.layout = {**self.layout, "bounds": bounds}
+
+        self.parent = np.asarray(self.nodes["parentIndex"], dtype=np.int64)
+        self.node_name_ids = np.asarray(self.nodes["nodeName"], dtype=np.int64)
+        self.layout_node_index = np.asarray(self.layout["nodeIndex"], dtype=np.int64)
+
+        self.n_nodes = len(self.parent)
+        self.n_layout = len(self.layout_node_index)
+
+        self._interned: Dict[int, str] = {}
+        self._attributes: Dict[int, Dict[str, str]] = {}
+        self._string_ids: Dict[Tuple[str, ...], np.ndarray] = {}
+        self._tagged_ancestors: Dict[str, np.ndarray] = {}
+        self._row_styles: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.n_nodes
+
+    # --- strings
+
+    def string(self, string_index: int) -> str | None:
+        """interned string from the string table, None for the -1 (missing) index"""
+        if string_index < 0:
+            return None
+        if (value := self._interned.get(string_index)) is None:
+            value = self._interned[string_index] = sys.intern(self.strings[string_index])
+        return value
+
+    def string_ids(self, *values: str) -> np.ndarray:
+        """indices of every entry in the string table equal to one of values"""
+        if (ids := self._string_ids.get(values)) is None:
+            wanted = set(values)
+            ids = np.array([i for i, s in enumerate(self.strings) if s in wanted], dtype=np.int64)
+            self._string_ids[values] = ids
+        return ids
+
+    # --- node names/roles
+
+    @cached_property
+    def _names(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        # node names are a small set of strings so lower them once and broadcast back to the nodes
+        name_ids, name_inverse = np.unique(self.node_name_ids, return_inverse=True)
+        names = [sys.intern(self.strings[i].lower()) for i in name_ids.tolist()]
+        return names, np.array(names, dtype=object), name_inverse.reshape(-1)
+
+    @property
+    def names(self) -> List[str]:
+        """unique lowercase node names, see name_inverse"""
+        return self._names[0]
+
+    @property
+    def name_inverse(self) -> np.ndarray:
+        """position in names for each node"""
+        return self._names[2]
+
+    def node_name(self, node: int) -> str:
+        return self._names[0][self._names[2][node]]
+
+    def name_mask(self, *names: str) -> np.ndarray:
+        """boolean mask over nodes whose lowercase name is one of names"""
+        return np.isin(self._names[1], names)[self._names[2]]
+
+    @cached_property
+    def node_role(self) -> np.ndarray:
+        """string index of the first (non-empty) role attribute for each node, -1 if it has none"""
+        flat, owners = flatten(self.nodes["attributes"])
+        keys, values, owners = flat[0::2], flat[1::2], owners[0::2]
+
+        is_role = np.isin(keys, self.string_ids("role")) & (values >= 0)
+        out = np.full(self.n_nodes, -1, dtype=np.int64)
+        nodes, first = np.unique(owners[is_role], return_index=True)
+        out[nodes] = values[is_role][first]
+        return out
+
+    def role_mask(self, *roles: str) -> np.ndarray:
+        return np.isin(self.node_role, self.string_ids(*roles))
+
+    # --- ancestry
+
+    def tagged_ancestors(self, tag: str) -> np.ndarray:
+        """closest ancestor (or self) for each node whose name or role is `tag`, -1 if there is none"""
+        if (ancestors := self._tagged_ancestors.get(tag)) is None:
+            is_tag = self.name_mask(tag) | self.role_mask(tag)
+            ancestors = self._tagged_ancestors[tag] = nearest_tagged_ancestor(self.parent, is_tag)
+        return ancestors
+
+    def ancestor(self, node: int, tag: str) -> Tuple[bool, int | None]:
+        """same (is_descendant, ancestor_id) tuple that add_to_hash_tree gives"""
+        ancestor = int(self.tagged_ancestors(tag)[node])
+        return (True, ancestor) if ancestor >= 0 else (False, None)
+
+    # --- children/subtrees
+
+    @cached_property
+    def _csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        non_root = np.flatnonzero(self.parent >= 0)
+        order = np.argsort(self.parent[non_root], kind="stable")
+        counts = np.bincount(self.parent[non_root], minlength=self.n_nodes)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return offsets, non_root[order]
+
+    @property
+    def child_offsets(self) -> np.ndarray:
+        return self._csr[0]
+
+    @property
+    def child_nodes(self) -> np.ndarray:
+        return self._csr[1]
+
+    def children(self, node: int) -> np.ndarray:
+        offsets, child_nodes = self._csr
+        return child_nodes[offsets[node] : offsets[node + 1]]
+
+    @cached_property
+    def euler(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(tin, tout) so the subtree of node is every node with tin[node] <= tin[other] <= tout[node]"""
+        if (euler := self._euler_document_order()) is not None:
+            return euler
+        return self._euler_dfs()
+
+    def _euler_document_order(self) -> Tuple[np.ndarray, np.ndarray] | None:
+        # snapshots come in document order (parents before children, subtrees contiguous) so tin is just the index
+        # and tout is the last index in the subtree.  if the order does not hold we return None and do a dfs
+        n, parent = self.n_nodes, self.parent
+        index = np.arange(n, dtype=np.int64)
+        if np.any(parent >= index):
+            return None
+
+        depth = self.depth
+        last = index.copy()
+        for level in range(int(depth.max(initial=0)), 0, -1):
+            level_nodes = np.flatnonzero(depth == level)
+            np.maximum.at(last, parent[level_nodes], last[level_nodes])
+
+        # every interval must be exactly 1 + its children otherwise subtrees are not contiguous
+        size = last - index + 1
+        non_root = parent >= 0
+        children_size = np.bincount(parent[non_root], weights=size[non_root], minlength=n)
+        if not np.array_equal(size, 1 + children_size.astype(np.int64)):
+            return None
+
+        return index, last
+
+    def _euler_dfs(self) -> Tuple[np.ndarray, np.ndarray]:
+        offsets, child_nodes = (a.tolist() for a in self._csr)
+        tin = [0] * self.n_nodes
+        tout = [0] * self.n_nodes
+        timer = 0
+        for root in np.flatnonzero(self.parent < 0).tolist():
+            stack = [(root, False)]
+            while stack:
+                node, done = stack.pop()
+                if done:
+                    tout[node] = timer - 1
+                    continue
+                tin[node] = timer
+                timer += 1
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(child_nodes[offsets[node] : offsets[node + 1]]))
+        return np.asarray(tin, dtype=np.int64), np.asarray(tout, dtype=np.int64)
+
+    @cached_property
+    def depth(self) -> np.ndarray:
+        # pointer jumping, dist is the distance to jump (or to the root once jump is -1)
+        dist = (self.parent >= 0).astype(np.int64)
+        jump = self.parent.copy()
+        while np.any(has_jump := jump >= 0):
+            target = np.where(has_jump, jump, 0)
+            dist = np.where(has_jump, dist + dist[target], dist)
+            jump = np.where(has_jump, jump[target], -1)
+        return dist
+
+    @cached_property
+    def in_document_order(self) -> bool:
+        """node index is the position in the document (parents before children, subtrees contiguous)"""
+        return bool(np.array_equal(self.euler[0], np.arange(self.n_nodes)))
+
+    def is_descendant(self, node: int, ancestor: int) -> bool:
+        """True if node is in the subtree of ancestor (including ancestor itself)"""
+        tin, tout = self.euler
+        return bool(tin[ancestor] <= tin[node] <= tout[ancestor])
+
+    def subtree_range(self, node: int) -> Tuple[int, int]:
+        tin, tout = self.euler
+        return int(tin[node]), int(tout[node])
+
+    # --- attributes/values
+
+    def attributes(self, node: int) -> Dict[str, str]:
+        """decoded attributes for node in the order they appear, first non-empty value wins for repeated keys"""
+        if (attrs := self._attributes.get(node)) is None:
+            attrs = {}
+            flat = self.nodes["attributes"][node]
+            for key_index, value_index in zip(flat[0::2], flat[1::2]):
+                if value_index < 0:
+                    continue
+                key = self.string(key_index)
+                if key not in attrs:
+                    attrs[key] = self.string(value_index)
+            self._attributes[node] = attrs
+        return attrs
+
+    def find_attributes(self, node: int, keys: Iterable[str]) -> Dict[str, str]:
+        """same as find_attributes in dom_snapshot but from the cached attributes. returns a new dict"""
+        keys = set(keys)
+        return {key: value for key, value in self.attributes(node).items() if key in keys}
+
+    @cached_property
+    def clickable(self) -> set:
+        return set(self.nodes["isClickable"]["index"])
+
+    def is_clickable(self, node: int) -> bool:
+        return node in self.clickable
+
+    @cached_property
+    def _input_values(self) -> Dict[int, int]:
+        input_value = self.nodes["inputValue"]
+        values = {}
+        for node, value in zip(input_value["index"], input_value["value"]):
+            values.setdefault(node, value)
+        return values
+
+    def input_value(self, node: int) -> str | None:
+        return self.string(self._input_values.get(node, -1))
+
+    def node_value(self, node: int) -> str | None:
+        return self.string(self.nodes["nodeValue"][node])
+
+    def backend_node_id(self, node: int) -> int:
+        return self.nodes["backendNodeId"][node]
+
+    @cached_property
+    def content_documents(self) -> Dict[int, int]:
+        """iframe/frame node -> index (in tree["documents"]) of the document loaded in it"""
+        content_document = self.nodes.get("contentDocumentIndex", {"index": [], "value": []})
+        return dict(zip(content_document["index"], content_document["value"]))
+
+    @cached_property
+    def backend_node_index(self) -> Dict[int, int]:
+        """backendNodeId -> node index, backendNodeId is stable across snapshots of the same page"""
+        return {backend_id: node for node, backend_id in enumerate(self.nodes["backendNodeId"])}
+
+    # --- layout
+
+    @cached_property
+    def layout_rows(self) -> np.ndarray:
+        """first layout row for each node, -1 if node is not laid out"""
+        return first_occurrence(self.layout_node_index, self.n_nodes)
+
+    def layout_row(self, node: int) -> int:
+        return int(self.layout_rows[node])
+
+    @cached_property
+    def bounds(self) -> np.ndarray:
+        return np.asarray(self.layout["bounds"], dtype=np.float64).reshape(-1, 4)
+
+    def row_styles(self, position: int) -> np.ndarray:
+        """string index of the computed style at position (in the order requested) for each layout row, -1 if missing"""
+        if (styles := self._row_styles.get(position)) is None:
+            style_values, style_rows = flatten(self.layout["styles"])
+            starts = np.concatenate(([0], np.cumsum(np.bincount(style_rows, minlength=self.n_layout))))
+            at = starts[style_rows] + position == np.arange(len(style_rows))
+            styles = self._row_styles[position] = np.full(self.n_layout, -1, dtype=np.int64)
+            styles[style_rows[at]] = style_values[at]
+        return styles
+
+    @cached_property
+    def row_display_none(self) -> np.ndarray:
+        """layout rows where display (the first computed style) is `none`"""
+        return np.isin(self.row_styles(0), self.string_ids("none"))
+
+    @cached_property
+    def paint_orders(self) -> np.ndarray | None:
+        """paint order for each layout row (higher paints on top), None if the snapshot was taken without it"""
+        if not self.layout.get("paintOrders"):
+            return None
+        return np.asarray(self.layout["paintOrders"], dtype=np.int64)
@@ -0,0 +1,88 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# NOTE:
+# uniform grid over the element boxes so the full page parse (DOMSnapshotParser(full_page=True)) can answer what is
+# in the viewport after a scroll (or what is at a point) without re-snapshotting and re-parsing the page.
+# each box is put in every cell it overlaps, a query looks at the cells it overlaps and then does the exact check on
+# just those boxes.  pages are mostly tall and narrow and the elements are small so a grid works fine vs an r-tree.
+
+
+class SpatialIndex:
+    def __init__(
+        self,
+        ids: Sequence[int],
+        boxes: np.ndarray | List[Tuple[float, float, float, float]],
+        cell_size: float = 256.0,
+    ):
+        """ids for each box, boxes are (x, y, width, height)"""
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.cell_size = cell_size
+
+        x0, y0 = self.boxes[:, 0], self.boxes[:, 1]
+        x1, y1 = x0 + self.boxes[:, 2], y0 + self.boxes[:, 3]
+        self._x0, self._y0, self._x1, self._y1 = x0, y0, x1, y1
+        self._position = {element_id: pos for pos, element_id in enumerate(self.ids.tolist())}
+
+        if len(self.ids) == 0:
+            self._origin, self._shape = (0.0, 0.0), (1, 1)
+            self._offsets, self._entries = np.zeros(2, dtype=np.int64), np.zeros(0, dtype=np.int64)
+            return
+
+        self._origin = (float(x0.min()), float(y0.min()))
+        cx0, cy0 = self._cell(x0, y0)
+        cx1, cy1 = self._cell(x1, y1)
+        self._shape = (int(cx1.max()) + 1, int(cy1.max()) + 1)
+
+        # expand each box to the cells it covers.  first over rows of cells then over columns
+        n_cols, n_rows = cx1 - cx0 + 1, cy1 - cy0 + 1
+        box = np.repeat(np.arange(len(self.ids)), n_cols * n_rows)
+        within = np.arange(len(box)) - np.repeat(np.cumsum(n_cols * n_rows) - n_cols * n_rows, n_cols * n_rows)
+        cell_x = cx0[box] + within % n_cols[box]
+        cell_y = cy0[box] + within // n_cols[box]
+        cell = cell_y * self._shape[0] + cell_x
+
+        order = np.argsort(cell, kind="stable")
+        self._entries = box[order]
+        self._offsets = np.searchsorted(cell[order], np.arange(self._shape[0] * self._shape[1] + 1))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, element_id: int) -> bool:
+        return element_id in self._position
+
+    def _cell(self, x: np.ndarray, y: np.ndarray, clip: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        cx = np.floor((x - self._origin[0]) / self.cell_size)
+        cy = np.floor((y - self._origin[1]) / self.cell_size)
+        if clip:
+            # so queries that are off the grid (or infinite) just use the cells at the edge
+            cx, cy = np.clip(cx, 0, self._shape[0] - 1), np.clip(cy, 0, self._shape[1] - 1)
+        return cx.astype(np.int64), cy.astype(np.int64)
+
+    def _candidates(self, left: float, top: float, right: float, bottom: float) -> np.ndarray:
+        cx, cy = self._cell(np.array([left, right]), np.array([top, bottom]), clip=True)
+        (cx0, cx1), (cy0, cy1) = cx.tolist(), cy.tolist()
+        cells = (np.arange(cy0, cy1 + 1)[:, None] * self._shape[0] + np.arange(cx0, cx1 + 1)[None, :]).ravel()
+        starts, ends = self._offsets[cells], self._offsets[cells + 1]
+        if (ends - starts).sum() == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate([self._entries[s:e] for s, e in zip(starts.tolist(), ends.tolist())]))
+
+    def query(self, left: float, top: float, right: float, bottom: float) -> List[int]:
+        """ids of boxes in the window (same check parse_tree does for the viewport), in the order they were given"""
+        pos = self._candidates(left, top, right, bottom)
+        keep = (self._x0[pos] < right) & (self._x1[pos] >= left) & (self._y0[pos] < bottom) & (self._y1[pos] >= top)
+        return self.ids[pos[keep]].tolist()
+
+    def at_point(self, x: float, y: float) -> List[int]:
+        """ids of boxes that contain the point, smallest first (i.e. most specific element first)"""
+        pos = self._candidates(x, y, x, y)
+        pos = pos[(self._x0[pos] <= x) & (x <= self._x1[pos]) & (self._y0[pos] <= y) & (y <= self._y1[pos])]
+        area = self.boxes[pos, 2] * self.boxes[pos, 3]
+        return self.ids[pos[np.argsort(area, kind="stable")]].tolist()
+
+    def box(self, element_id: int) -> Tuple[float, float, float, float]:
+        return tuple(self.boxes[self._position[element_id]].tolist())
@@ -0,0 +1,76 @@
+import weakref
+from typing import Any, Dict, Iterable, List
+
+# NOTE:
+# element ids used to be the position in the last parse so they changed on every parse/scroll and nothing decided
+# about an element (filtering, the model picking it, the locator) could be reused a step later.  backendNodeId is
+# stable for a node for as long as the document lives, so each page gets a table of backendNodeId -> small int that
+# is shared by every parser made for that page.  ids are handed out in the order elements are first seen so a fresh
+# page still starts at 0.  a new document (navigation) starts a new table since its backendNodeIds are all new.
+# the in page extraction (dom_extract) makes up its own ids (negative, so they cant collide with real ones) and
+# identifies the document with a token rather than a backendNodeId, so the document is kept per namespace.
+
+
+class StableIds:
+    """backendNodeId -> element id for one page"""
+
+    def __init__(self):
+        self._ids: Dict[int, int] = {}
+        self._backend_node_ids: List[int] = []
+        # namespace -> what identifies the document the ids of that namespace are from
+        self.documents: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, backend_node_id: int) -> bool:
+        return backend_node_id in self._ids
+
+    def __getitem__(self, backend_node_id: int) -> int:
+        """id for the node, a new one if it has not been seen before"""
+        if (element_id := self._ids.get(backend_node_id)) is None:
+            element_id = self._ids[backend_node_id] = len(self._backend_node_ids)
+            self._backend_node_ids.append(backend_node_id)
+        return element_id
+
+    def ids(self, backend_node_ids: Iterable[int]) -> List[int]:
+        return [self[int(backend_node_id)] for backend_node_id in backend_node_ids]
+
+    def backend_node_id(self, element_id: int) -> int:
+        return self._backend_node_ids[element_id]
+
+    def seed(self, backend_node_ids: Iterable[int]):
+        """start from a table that was saved (backend_node_ids in element id order), e.g. with a stored snapshot"""
+        self.clear()
+        self.ids(backend_node_ids)
+
+    def clear(self):
+        self._ids.clear()
+        self._backend_node_ids.clear()
+
+    def use_document(self, document: Any, namespace: str = "cdp") -> bool:
+        """
+        document is anything that identifies the main document (its backendNodeId for "cdp" ids, the token for
+        "extract" ids), when it changes the table starts over.  returns True if it did
+        """
+        if document is None or document == (current := self.documents.get(namespace)):
+            return False
+        reset = current is not None
+        if reset:
+            self.clear()
+            # the other namespaces were for the old document, whatever they see next is the new one
+            self.documents.clear()
+        self.documents[namespace] = document
+        return reset
+
+
+_page_ids: "weakref.WeakKeyDictionary[Any, StableIds]" = weakref.WeakKeyDictionary()
+
+
+def stable_ids_for(page: Any = None) -> StableIds:
+    """the table for page (kept as long as the page object is), without a page the caller gets its own"""
+    if page is None:
+        return StableIds()
+    if (stable_ids := _page_ids.get(page)) is None:
+        stable_ids = _page_ids[page] = StableIds()
+    return stable_ids
@@ -1,7 +1,13 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List
+from typing import AsyncIterator, Dict, Iterator, List
 
 import bs4
+import lxml.etree
+import lxml.html
 from readability import Document
 
 # from clippy.stubs.tasks_stubs import summary_stub
@@ -30,6 +36,16 @@ class TasksInterface:
     qa = QuestionAnsweringTask()
 
 
+# NOTE:
+# readability + BeautifulSoup on a large page takes hundreds of ms and the same html gets processed again every time
+# the page is looked at, so Parser.process/process_async keep the text by a hash of the html (LRU).  process_async
+# runs the extraction in a worker pool so it does not block the event loop.  fast=True parses the readability summary
+# with lxml instead of a second BeautifulSoup pass, and stream_async gives the visible text of the whole page (no
+# readability, that needs the whole document) in chunks as the html is parsed for documents that are too big for that.
+
+_invisible_tags = ("style", "script", "head", "title", "meta", "noscript", "template")
+
+
 def extract_text_using_library(content: str) -> str:
     # https://stackoverflow.com/questions/1936466/how-to-scrape-only-visible-webpage-text-with-beautifulsoup
 
@@ -44,12 +60,168 @@ def extract_text_using_library(content: str) -> str:
     return " ".join(t.strip() for t in visible_texts)
 
 
+def extract_text_fast(content: str) -> str:
+    """same as extract_text_using_library but the readability summary is parsed with lxml"""
+    summary = Document(content).summary()
+    if not summary.strip():
+        return ""
+    tree = lxml.html.fromstring(summary)
+    skip = " or ".join(f"ancestor::{tag}" for tag in _invisible_tags)
+    return " ".join(t.strip() for t in tree.xpath(f"//text()[not({skip})]"))
+
+
+class _VisibleText:
+    # target for lxml's parser, keeps the text that is not in an invisible tag
+    def __init__(self):
+        self.texts: List[str] = []
+        self._skip = 0
+
+    def start(self, tag, attrib):
+        self._skip += tag in _invisible_tags
+
+    def end(self, tag):
+        self._skip -= tag in _invisible_tags
+
+    def data(self, data):
+        if not self._skip and (data := data.strip()):
+            self.texts.append(data)
+
+    def close(self):
+        pass
+
+
+def iter_visible_text(content: str, chunk_size: int = 16384, feed_size: int = 65536) -> Iterator[str]:
+    """visible text of the page in chunks of about chunk_size characters, feed_size is how much html to parse at once"""
+    target = _VisibleText()
+    parser = lxml.etree.HTMLParser(target=target)
+    buffer, size = [], 0
+
+    def _pieces(final: bool = False) -> Iterator[str]:
+        nonlocal buffer, size
+        for text in target.texts:
+            buffer.append(text)
+            size += len(text) + 1
+            if size >= chunk_size:
+                yield " ".join(buffer)
+                buffer, size = [], 0
+        target.texts.clear()
+        if final and buffer:
+            yield " ".join(buffer)
+
+    for start in range(0, len(content), feed_size):
+        parser.feed(content[start : start + feed_size])
+        yield from _pieces()
+    if content:
+        parser.close()
+    yield from _pieces(final=True)
+
+
+class TextCache:
+    """extracted text by a hash of the html, least recently used is dropped once there are max_entries"""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(content: str, *params) -> str:
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(content.encode("utf-8", "surrogatepass"))
+        hasher.update(repr(params).encode())
+        return hasher.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        if (value := self._entries.get(key)) is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+# shared by all the Parser's unless they are given their own
+text_cache = TextCache()
+_text_executor: Executor = None
+
+
+def _default_executor() -> Executor:
+    global _text_executor
+    if _text_executor is None:
+        _text_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="page_parser")
+    return _text_executor
+
+
 class Parser:
-    def __init__(self, content: str):
+    def __init__(
+        self,
+        content: str,
+        fast: bool = False,
+        cache: TextCache | None = text_cache,
+        executor: Executor = None,
+    ):
         self.content = content
+        # lxml instead of BeautifulSoup for the readability summary
+        self.fast = fast
+        # pass cache=None to always extract
+        self.cache = cache
+        # any concurrent.futures executor (a process pool works too), a shared thread pool if not given
+        self.executor = executor
+
+    @property
+    def _extract(self):
+        return extract_text_fast if self.fast else extract_text_using_library
+
+    def _cache_key(self) -> str:
+        return TextCache.key(self.content, self.fast)
 
     def process(self) -> str:
-        return extract_text_using_library(self.content)
+        if self.cache is None:
+            return self._extract(self.content)
+
+        key = self._cache_key()
+        if (text := self.cache.get(key)) is None:
+            text = self._extract(self.content)
+            self.cache.put(key, text)
+        return text
+
+    async def process_async(self) -> str:
+        key = self._cache_key() if self.cache is not None else None
+        if key and (text := self.cache.get(key)) is not None:
+            return text
+
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(self.executor or _default_executor(), self._extract, self.content)
+        if key:
+            self.cache.put(key, text)
+        return text
+
+    async def stream_async(self, chunk_size: int = 16384) -> AsyncIterator[str]:
+        """visible text (of the whole page, not the readability summary) in chunks, each parsed in the worker pool"""
+        loop = asyncio.get_running_loop()
+        chunks = iter_visible_text(self.content, chunk_size=chunk_size)
+        # the generator cant go to another process so this is always in a thread
+        executor = self.executor if isinstance(self.executor, ThreadPoolExecutor) else _default_executor()
+        while (chunk := await loop.run_in_executor(executor, next, chunks, None)) is not None:
+            yield chunk
 
     def extract_text_using_lm(self, content: str):
         raise NotImplementedError("extract_text_using_lm not implemented yet")
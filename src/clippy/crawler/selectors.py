@@ -10,6 +10,7 @@ class Selector:
         selectors = [
             pw.selectors.register(**TagSelector.todict()),
             pw.selectors.register(**PosSelector.todict()),
+            pw.selectors.register(**ExtractSelector.todict()),
         ]
         return selectors
 
@@ -77,3 +78,259 @@ class GeneratedLocatorSelector(Selector):
     }
 }
 """
+
+
+# NOTE:
+# walks the live DOM and does the first pass of DOMSnapshotParser.parse_tree in the page (laid out, not blacklisted,
+# in the window) so only those nodes (plus their a/button/select ancestors, the second pass needs them) come back,
+# as flat arrays + a string table rather than the whole DOMSnapshot.  dom_extract.extracted_tree turns the result back
+# into the captureSnapshot format so the rest of the parser is the same.  the differences vs the snapshot:
+#   - isClickable cant see listeners added with addEventListener, it uses what the element is (links/form controls/
+#     contenteditable) and on* handlers instead
+#   - node indexes are positions in the extracted nodes and backendNodeId is an id we keep on the node (stable
+#     across calls like the real one).  they are negative so they never collide with real backendNodeIds and they
+#     only mean something within one document, `document` in the result is a random token for the document they
+#     belong to (see StableIds.use_document)
+#   - iframes are not walked into
+# extract_js packs the number arrays into Int32Array/Float64Array (bounds) buffers sent as base64, a json array of
+# numbers is a lot bigger and slower to (de)serialize on both ends.  see dom_extract.unpack_payload
+_EXTRACT_FN = """function extract(root, options) {
+    const blacklist = new Set(options.blacklist)
+    const attributeKeys = new Set(options.attributes)
+    const tags = options.tags
+    const [left, upper, right, lower] = options.window
+    const pixelRatio = options.devicePixelRatio
+
+    // kept on the document so a navigation starts over with a new token
+    const doc = root.ownerDocument || root
+    const nodeIds =
+        doc.__clippyNodeIds ||
+        (doc.__clippyNodeIds = {
+            ids: new WeakMap(),
+            next: -1,
+            document: `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`,
+        })
+    const strings = []
+    const stringIds = new Map()
+    // like the snapshot, empty strings are -1
+    const intern = (value) => {
+        if (value === null || value === undefined || value === "") {
+            return -1
+        }
+        let id = stringIds.get(value)
+        if (id === undefined) {
+            id = strings.length
+            strings.push(value)
+            stringIds.set(value, id)
+        }
+        return id
+    }
+
+    const out = {
+        document: nodeIds.document,
+        strings: strings,
+        parentIndex: [],
+        nodeName: [],
+        nodeValue: [],
+        backendNodeId: [],
+        attributes: [],
+        attributeCounts: [],
+        inputValue: { index: [], value: [] },
+        isClickable: [],
+        layoutNodeIndex: [],
+        bounds: [],
+    }
+    const elements = []
+
+    const rectOf = (node) => {
+        let rects, rect
+        if (node.nodeType === Node.TEXT_NODE) {
+            const range = document.createRange()
+            range.selectNodeContents(node)
+            rects = range.getClientRects()
+            rect = range.getBoundingClientRect()
+        } else {
+            rects = node.getClientRects()
+            rect = node.getBoundingClientRect()
+        }
+        if (rects.length === 0) {
+            return null
+        }
+        return [rect.left + window.scrollX, rect.top + window.scrollY, rect.width, rect.height]
+    }
+
+    const inWindow = (rect) => {
+        const [x, y, width, height] = rect.map((v) => v / pixelRatio)
+        return x < right && x + width >= left && y < lower && y + height >= upper
+    }
+
+    const isClickable = (node) => {
+        if (node.nodeType !== Node.ELEMENT_NODE) {
+            return false
+        }
+        if (node.onclick || node.onmousedown || node.onmouseup || node.isContentEditable) {
+            return true
+        }
+        switch (node.nodeName) {
+            case "A":
+            case "AREA":
+                return node.hasAttribute("href")
+            case "BUTTON":
+            case "INPUT":
+            case "SELECT":
+            case "TEXTAREA":
+            case "OPTION":
+            case "SUMMARY":
+            case "LABEL":
+                return !node.disabled
+        }
+        return false
+    }
+
+    const add = (node, parent, rect) => {
+        const index = out.nodeName.length
+        out.parentIndex.push(parent)
+        out.nodeName.push(intern(node.nodeName))
+        out.nodeValue.push(node.nodeType === Node.TEXT_NODE ? intern(node.nodeValue) : -1)
+
+        if (!nodeIds.ids.has(node)) {
+            nodeIds.ids.set(node, nodeIds.next--)
+        }
+        out.backendNodeId.push(nodeIds.ids.get(node))
+
+        let count = 0
+        if (node.nodeType === Node.ELEMENT_NODE) {
+            for (const attr of node.attributes) {
+                if (attributeKeys.has(attr.name)) {
+                    out.attributes.push(intern(attr.name), intern(attr.value))
+                    count += 2
+                }
+            }
+            if (node.nodeName === "INPUT" || node.nodeName === "TEXTAREA") {
+                out.inputValue.index.push(index)
+                out.inputValue.value.push(intern(node.value))
+            }
+            elements.push(node)
+        }
+        out.attributeCounts.push(count)
+
+        if (isClickable(node)) {
+            out.isClickable.push(index)
+        }
+        if (rect) {
+            out.layoutNodeIndex.push(index)
+            out.bounds.push(...rect)
+        }
+        return index
+    }
+
+    // [node, closest a/button/select (or role) ancestor-or-self for each tag, index of the closest added ancestor]
+    const stack = [[root, tags.map(() => null), -1]]
+    while (stack.length > 0) {
+        const [node, ancestors, parent] = stack.pop()
+        let index = parent
+        let nodeAncestors = ancestors
+
+        if (node.nodeType === Node.ELEMENT_NODE || node.nodeType === Node.TEXT_NODE) {
+            const name = node.nodeName.toLowerCase()
+            const role = node.nodeType === Node.ELEMENT_NODE ? node.getAttribute("role") : null
+            const tagged = tags.map((tag) => name === tag || role === tag)
+            nodeAncestors = ancestors.map((ancestor, i) => (tagged[i] ? node : ancestor))
+
+            if (tagged.some((t) => t)) {
+                // always kept so the second pass sees the same ancestry, python filters it like any other node
+                index = add(node, parent, rectOf(node))
+            } else if (!blacklist.has(name)) {
+                const select = nodeAncestors[tags.indexOf("select")]
+                const rect = select ? rectOf(select) : rectOf(node)
+                if (rect && inWindow(rect)) {
+                    // inside a select the layout of the select is used, no need for the node's own
+                    index = add(node, parent, select ? null : rect)
+                }
+            }
+        }
+
+        if (node.nodeName === "IFRAME") {
+            continue
+        }
+        const children = [...(node.shadowRoot ? node.shadowRoot.childNodes : []), ...node.childNodes]
+        for (let i = children.length - 1; i >= 0; i--) {
+            stack.push([children[i], nodeAncestors, index])
+        }
+    }
+
+    return { payload: out, elements: elements }
+}"""
+
+# array of numbers -> base64 of the typed array's bytes (little endian like every platform chromium runs on)
+_PACK_FN = """function pack(values, TypedArray) {
+    const bytes = new Uint8Array(TypedArray.from(values).buffer)
+    let binary = ""
+    // in chunks, fromCharCode with too many arguments overflows the stack
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000))
+    }
+    return btoa(binary)
+}"""
+
+
+class ExtractSelector(Selector):
+    """
+    in page version of the DOMSnapshot first pass.  `extract_js` is for page.evaluate (see dom_extract.extract_tree)
+    and the selector engine gives the same elements, e.g. `page.locator("extract=")` for what is in the viewport
+    """
+
+    name = "extract"
+    script = (
+        """
+{
+    extract: """
+        + _EXTRACT_FN
+        + """,
+
+    query(root, selector) {
+        return this.queryAll(root, selector)[0] || null;
+    },
+
+    queryAll(root, selector) {
+        const [x, y] = [window.scrollX, window.scrollY];
+        const options = {
+            blacklist: [],
+            attributes: [],
+            tags: ["a", "button", "select"],
+            window: [x, y, x + window.innerWidth, y + window.innerHeight],
+            devicePixelRatio: 1,
+        };
+        return this.extract(root, options).elements;
+    }
+}"""
+    )
+
+    extract_js = (
+        """(options) => {
+    const extract = """
+        + _EXTRACT_FN
+        + """
+    const pack = """
+        + _PACK_FN
+        + """
+    const payload = extract(document, options).payload
+    return {
+        document: payload.document,
+        strings: payload.strings,
+        parentIndex: pack(payload.parentIndex, Int32Array),
+        nodeName: pack(payload.nodeName, Int32Array),
+        nodeValue: pack(payload.nodeValue, Int32Array),
+        backendNodeId: pack(payload.backendNodeId, Int32Array),
+        attributes: pack(payload.attributes, Int32Array),
+        attributeCounts: pack(payload.attributeCounts, Int32Array),
+        inputValue: {
+            index: pack(payload.inputValue.index, Int32Array),
+            value: pack(payload.inputValue.value, Int32Array),
+        },
+        isClickable: pack(payload.isClickable, Int32Array),
+        layoutNodeIndex: pack(payload.layoutNodeIndex, Int32Array),
+        bounds: pack(payload.bounds, Float64Array),
+    }
+}"""
+    )
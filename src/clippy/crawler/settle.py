@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from playwright.async_api import Page
+
+from clippy.constants import settle_quiet, settle_timeout
+
+# NOTE:
+# after an action the page is either navigating, fetching, re-rendering or done and a fixed sleep/wait_for_load_state
+# is too long for SPAs (nothing navigates so load state is already reached, the sleep is paid anyways) and too short
+# for slow pages.  settled is: the document is not loading, nothing in flight on the network, and no dom mutation,
+# layout shift or (non-looping) animation frame for `quiet` seconds, counted from when we started waiting too since
+# the page may not have reacted to the action yet.  the page side is crawler/inject/settle.js.
+
+settle_state_js: str = """
+() => window.__clippySettleState ? window.__clippySettleState() : { readyState: document.readyState }
+"""
+
+
+@dataclass
+class SettleResult:
+    settled: bool
+    elapsed: float
+    # what was still going on when the timeout hit, empty if settled
+    busy: List[str]
+
+
+def busy_reasons(state: Dict | None, in_flight: int, quiet: float, elapsed: float) -> List[str]:
+    """what is keeping the page from being settled, state is from settle_state_js (None if it could not be read)"""
+    if state is None:
+        # mid navigation, the execution context is gone
+        return ["navigating"]
+
+    busy = []
+    quiet_ms = quiet * 1000
+    if state["readyState"] == "loading":
+        busy.append("loading")
+    if in_flight:
+        busy.append("network")
+    if elapsed < quiet:
+        busy.append("waiting")
+    if state.get("sinceMutation", quiet_ms) < quiet_ms:
+        busy.append("mutations")
+    if state.get("sinceShift", quiet_ms) < quiet_ms:
+        busy.append("layout-shift")
+    if state.get("pendingFrames", 0):
+        busy.append("animation-frames")
+    return busy
+
+
+async def wait_for_settle(
+    page: Page,
+    in_flight: Callable[[], int] = None,
+    quiet: float = settle_quiet,
+    timeout: float = settle_timeout,
+    poll: float = 0.05,
+) -> SettleResult:
+    """wait until the page is settled (or timeout seconds), in_flight gives the number of network requests pending"""
+    start = time.monotonic()
+    while True:
+        try:
+            state = await page.evaluate(settle_state_js)
+        except Exception:
+            state = None
+
+        elapsed = time.monotonic() - start
+        busy = busy_reasons(state, in_flight() if in_flight else 0, quiet, elapsed)
+        if not busy:
+            return SettleResult(True, elapsed, [])
+        if elapsed >= timeout:
+            return SettleResult(False, elapsed, busy)
+        await asyncio.sleep(poll)
+
+
+class SettleTimes:
+    """measured settle times per domain, to see which sites are slow and how often the timeout is hit"""
+
+    def __init__(self):
+        self.times: Dict[str, List[float]] = {}
+        self.timeouts = Counter()
+
+    def record(self, domain: str, result: SettleResult):
+        self.times.setdefault(domain, []).append(result.elapsed)
+        if not result.settled:
+            self.timeouts[domain] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            domain: {
+                "count": len(times),
+                "mean": sum(times) / len(times),
+                "max": max(times),
+                "timeouts": self.timeouts[domain],
+            }
+            for domain, times in self.times.items()
+        }
@@ -8,6 +8,7 @@ from clippy import logger
 from clippy.constants import MIGRATION_DIR
 from clippy.dm.data_manager_utils import confirm_override
 from clippy.dm.db_utils import Database
+from clippy.dm.reparse import reparse_snapshots, write_snapshot
 from clippy.states import Task
 
 
@@ -30,6 +31,7 @@ class DataManager:
     """RUN COMMANDS:
     --- TASKS FOLDER
     - migrate: move all data to migrate folder
+    - reparse: parse the stored snapshots of every step again (after changing the parser)
 
     --- DB JSON
     - drop_table: drops table from db
@@ -39,6 +41,7 @@ class DataManager:
     async def run(self, subcmd: str, **kwargs) -> None:
         func = {
             "migrate": self.migrate_data,
+            "reparse": self.reparse,
             # db related
             "drop_last": self.drop_last,
             "drop_table": self.drop_table,
@@ -82,6 +85,28 @@ class DataManager:
             shutil.rmtree(self.curr_task_output)
         os.makedirs(self.curr_task_output, exist_ok=True)
 
+    def save_snapshot(self, step_id: str, tree: dict, page_size: list, backend_node_ids: list = ()) -> None:
+        """dom snapshot for the step (and the page's element id table), saved with the task so it can be reparsed"""
+        write_snapshot(f"{self.curr_task_output}/{step_id}.snapshot.json.gz", tree, page_size, backend_node_ids)
+
+    def reparse(
+        self,
+        workers: int = None,
+        chunk_size: int = 16,
+        max_worker_memory: int = None,
+        override: bool = False,
+        **kwargs,
+    ) -> dict:
+        summary = reparse_snapshots(
+            self.task_data_dir,
+            workers=workers,
+            chunk_size=chunk_size,
+            max_worker_memory=max_worker_memory,
+            override=override,
+        )
+        logger.info(f"reparsed {summary['parsed']} snapshots, {len(summary['errors'])} failed")
+        return summary
+
     def page_path(self, str):
         pass
 
@@ -0,0 +1,151 @@
+import gzip
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from clippy import logger
+
+# NOTE:
+# when the parser rules change every captured step needs its elements_of_interest derived again.  each step that had its
+# page parsed has `<step id>.snapshot.json` in the task folder (the captureSnapshot and the page_size it was taken at
+# and the element id table of the page, see DataManager.save_snapshot) so instead of crawling again we run parse_tree
+# over those.  it is cpu bound so the snapshots are split in chunks over a process pool.  results go next to the
+# snapshot as `<step id>.elements.json` and a snapshot that already has a newer result is skipped, so stopping and
+# running again picks up where it was.
+
+SNAPSHOT_SUFFIXES = (".snapshot.json", ".snapshot.json.gz")
+ELEMENTS_SUFFIX = ".elements.json"
+
+
+def _open(path: Path, mode: str = "rt"):
+    return gzip.open(path, mode) if path.suffix == ".gz" else open(path, mode)
+
+
+def write_snapshot(
+    path: Path | str, tree: Dict[str, Any], page_size: Sequence[float], backend_node_ids: Sequence[int] = ()
+):
+    """
+    store a snapshot so it can be reparsed, page_size is what crawler.page_size() gave when it was taken and
+    backend_node_ids the page's StableIds table so the reparsed elements get the ids the step's actions used
+    """
+    path = Path(path)
+    with _open(path, "wt") as f:
+        json.dump({"page_size": list(page_size), "backend_node_ids": list(backend_node_ids), "snapshot": tree}, f)
+
+
+def read_snapshot(path: Path | str) -> Tuple[Dict[str, Any], List[float], List[int]]:
+    with _open(Path(path)) as f:
+        data = json.load(f)
+    return data["snapshot"], data["page_size"], data.get("backend_node_ids", [])
+
+
+def elements_path(snapshot_path: Path) -> Path:
+    for suffix in SNAPSHOT_SUFFIXES:
+        if snapshot_path.name.endswith(suffix):
+            return snapshot_path.with_name(snapshot_path.name[: -len(suffix)] + ELEMENTS_SUFFIX)
+    raise ValueError(f"not a snapshot: {snapshot_path}")
+
+
+def find_snapshots(task_data_dir: Path | str) -> Iterator[Path]:
+    """snapshots of every step in every task folder, sorted so chunks are the same between runs"""
+    paths = (path for suffix in SNAPSHOT_SUFFIXES for path in Path(task_data_dir).glob(f"*/*{suffix}"))
+    return iter(sorted(paths))
+
+
+def needs_reparse(snapshot_path: Path, override: bool = False) -> bool:
+    output = elements_path(snapshot_path)
+    return override or not output.exists() or (output.stat().st_mtime < snapshot_path.stat().st_mtime)
+
+
+def _limit_memory(max_worker_memory: int | None):
+    # pool initializer.  address space limit so one huge snapshot fails its chunk rather than taking the machine down
+    if not max_worker_memory:
+        return
+    import resource
+
+    limit = max_worker_memory * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def reparse_snapshot(snapshot_path: Path, engine: str = "numpy") -> Dict[str, Any]:
+    from clippy.crawler.parser.dom_snapshot import DOMSnapshotParser
+
+    tree, page_size, backend_node_ids = read_snapshot(snapshot_path)
+    pixel_ratio, win_s_x, win_s_y, upper_b, lower_b, win_w, win_h = page_size
+
+    # offline so no crawler, and every snapshot is different so the cache would just use memory
+    parser = DOMSnapshotParser(engine=engine, cache=None)
+    # same ids as when the step was captured, new elements get ids after the ones the page had handed out
+    parser.stable_ids.seed(backend_node_ids)
+    parser.parse_tree(tree, upper_b, win_w, lower_b, win_h, pixel_ratio)
+    return {
+        "elements_of_interest": parser.elements_of_interest,
+        "ids_of_interest": parser.ids_of_interest,
+        "elements": {element_id: dict(parser.page_element_buffer[element_id]) for element_id in parser.element_ids},
+    }
+
+
+def _write_elements(snapshot_path: Path, result: Dict[str, Any]):
+    # write then rename so a killed worker never leaves a partial file that looks done
+    output = elements_path(snapshot_path)
+    tmp = output.with_name(f".{output.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(result, f, default=str)
+    os.replace(tmp, output)
+
+
+def reparse_chunk(snapshot_paths: List[Path], engine: str = "numpy") -> Tuple[int, List[Tuple[str, str]]]:
+    """runs in the worker, returns how many were parsed and (path, error) for the ones that failed"""
+    parsed, errors = 0, []
+    for snapshot_path in snapshot_paths:
+        try:
+            _write_elements(snapshot_path, reparse_snapshot(snapshot_path, engine=engine))
+            parsed += 1
+        except MemoryError:
+            errors.append((str(snapshot_path), "out of memory (max_worker_memory)"))
+        except Exception as err:
+            errors.append((str(snapshot_path), repr(err)))
+    return parsed, errors
+
+
+def reparse_snapshots(
+    task_data_dir: Path | str,
+    workers: int = None,
+    chunk_size: int = 16,
+    max_worker_memory: int = None,
+    engine: str = "numpy",
+    override: bool = False,
+    mp_context: str = "spawn",
+) -> Dict[str, Any]:
+    """
+    parse every stored snapshot under task_data_dir again.  workers defaults to the cpu count, max_worker_memory is
+    in MB per worker (unlimited if not set), override parses snapshots that already have results
+    """
+    snapshot_paths = [path for path in find_snapshots(task_data_dir) if needs_reparse(path, override)]
+    chunks = [snapshot_paths[i : i + chunk_size] for i in range(0, len(snapshot_paths), chunk_size)]
+    logger.info(f"reparsing {len(snapshot_paths)} snapshots in {len(chunks)} chunks")
+
+    summary = {"parsed": 0, "errors": []}
+    if not chunks:
+        return summary
+
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(mp_context),
+        initializer=_limit_memory,
+        initargs=(max_worker_memory,),
+    ) as pool:
+        futures = [pool.submit(reparse_chunk, chunk, engine) for chunk in chunks]
+        for done, future in enumerate(as_completed(futures), start=1):
+            parsed, errors = future.result()
+            summary["parsed"] += parsed
+            summary["errors"].extend(errors)
+            for path, error in errors:
+                logger.info(f"failed to reparse {path}: {error}")
+            logger.info(f"reparse: {done}/{len(chunks)} chunks, {summary['parsed']}/{len(snapshot_paths)} snapshots")
+
+    return summary
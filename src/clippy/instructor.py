@@ -8,6 +8,7 @@ from clippy import logger
 from clippy.controllers import Controller, Responses, Generations
 from clippy.crawler.parser.dom_snapshot import get_action_type
 from clippy.states import Actions, NextAction
+from clippy.stubs.compact import CompactElements, compact_elements
 from clippy.stubs.stubs import StubTemplates
 
 action_str_list = Actions.actions_for_templates()
@@ -21,9 +22,11 @@ def match_generated_output(text: str, elements: List[str]) -> Optional[int]:
 class Instructor:
     """the instructor is the LLM that is used to score page elements and guess next action"""
 
-    def __init__(self, use_async: bool = True, use_llm: bool = True, *args, **kwargs):
+    def __init__(self, use_async: bool = True, use_llm: bool = True, compact: bool = False, *args, **kwargs):
         self.use_async = use_async
         self.use_llm = use_llm
+        # write the elements in the prompts with stubs.compact rather than one full string per element
+        self.compact = compact
 
         self.lm_controller = Controller.Clients.Cohere()
 
@@ -40,6 +43,15 @@ class Instructor:
         except Exception as err:
             logger.error(f"Error ending language model controller: {err}")
 
+    def browser_content(self, elements: List[str]) -> tuple[dict, CompactElements | None]:
+        """template kwargs for the elements and the CompactElements if compact is on"""
+        if not self.compact or not elements:
+            return {"browser_content": elements}, None
+
+        compact = compact_elements(elements)
+        logger.info(f"compact elements: ~{compact.tokens_saved} of {compact.tokens_before} tokens saved")
+        return {"browser_content": compact.lines, "element_legend": compact.legend}, compact
+
     async def generate_next_action(
         self,
         elements: List[str],
@@ -54,11 +66,12 @@ class Instructor:
         temperature: float = 0.25,
     ) -> Responses.Generations:
         """Given the page state, generate the next action. This is more ideal than scoring all actions."""
+        browser_content, _ = self.browser_content(elements)
         prompt = StubTemplates.prompt.render(
             objective=objective,
             title=title,
             url=url,
-            browser_content=elements,
+            **browser_content,
             previous_commands=previous_commands,
             action_str_list=action_str_list,
         )
@@ -92,12 +105,13 @@ class Instructor:
             if len(filtered_elements) <= max_elements:
                 break
 
+            browser_content, compact = self.browser_content(filtered_elements)
             prompt: str = StubTemplates.prompt.render(
                 header_prompt=StubTemplates.header_filter_elements.render(max_elements=max_elements),
                 objective=objective,
                 title=title,
                 url=url,
-                browser_content=filtered_elements,
+                **browser_content,
                 previous_commands=previous_commands,
                 skip_available_actions=True,
                 element_prefix="- ",
@@ -119,6 +133,10 @@ class Instructor:
                 raise ValueError("response has more than one generation")
             # try to remove the left space and empty lines
             filtered_elements = [f.lstrip() for f in response[0].text.split("\n") if f]
+            if compact is not None:
+                # lines come back compact (maybe grouped), go back to the elements by their ids
+                filtered_elements = [el for line in filtered_elements for el in compact.original(line)]
+                filtered_elements = list(dict.fromkeys(filtered_elements))
 
         # we should probably match with original elements at this point
         return filtered_elements
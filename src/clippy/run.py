@@ -7,6 +7,8 @@ from simple_parsing import ArgumentParser, choice, subparsers
 
 from clippy.clippy_helper import Clippy
 from clippy.constants import default_objective, default_start_page
+from clippy.crawler.block_profiles import BLOCK_PROFILES
+from clippy.crawler.crawler import FREEZE_MODES, NETWORK_MODES
 
 
 def _check_startup() -> None:
@@ -53,6 +55,11 @@ class DataManager:
     table: Optional[str] = None
     droplast: bool = False
 
+    # reparse
+    workers: Optional[int] = None  # defaults to the cpu count
+    chunk_size: int = 16  # snapshots per task sent to a worker
+    max_worker_memory: Optional[int] = None  # MB per worker
+
 
 @dataclass
 class ClippyArgs:
@@ -78,6 +85,12 @@ class ClippyArgs:
 
     key_exit: bool = True  # should exit on key press
     confirm_actions: bool = False
+    page_parser: str = choice("dom", "ax", default="dom")  # page elements from the dom snapshot or accessibility tree
+    compact_prompt: bool = False  # shorter element list in the prompts (repeated attributes/list items folded)
+    store_snapshots: bool = False  # keep each step's dom snapshot with the task so it can be reparsed later
+    block_profile: str = choice(*BLOCK_PROFILES, default="none")  # requests to block (images/fonts/trackers)
+    network_mode: str = choice(*NETWORK_MODES, default="live")  # record the network of a task or replay it offline
+    freeze_mode: str = choice(*FREEZE_MODES, default="off")  # stop animations/transitions (and timers with "time")
     task_id: int | str = None
 
     def __post_init__(self):
@@ -59,6 +59,7 @@ class Action:
     prev: "Action" = None  # Previous action
     data: Any = None  # Data associated with the action
     allow_merge: bool = False  # Flag to allow merging of actions
+    element_id: int = None  # Id of the element if the action came from a NextAction (not a field so it is not saved)
 
     def __post_init__(self):
         """
@@ -0,0 +1,160 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+# NOTE:
+# the element strings (see format_element) repeat the same class=/aria-* metadata on every sibling, which is most of
+# the prompt on list heavy pages (search results, HN, etc).  compact_elements writes the same elements with:
+#   - attributes used more than once replaced by a short ref (@1) that is given once in a legend
+#   - shorter names for the element kinds (link -> a, button -> btn, ...)
+#   - runs of the same kind of element with the same metadata (list items) on one line
+#   - a cap on the length of the text/attribute values
+# the element ids stay as they are so the model's answer (click 12) means the same thing either way.
+
+KIND_ABBREVIATIONS = {
+    "link": "a",
+    "button": "btn",
+    "input": "in",
+    "select": "sel",
+    "textarea": "ta",
+    "text": "t",
+    "img": "img",
+}
+
+# kind id meta "inner text", meta starts with a space (see format_element).  suffix is a word added after the text
+# (see suggest_action)
+_ELEMENT_RE = re.compile(r'^(?P<kind>\S+) (?P<id>\d+)(?P<meta>.*?)(?: "(?P<text>.*)"(?P<suffix>(?: \w+)?))?$')
+_ATTRIBUTE_RE = re.compile(r'\S+="[^"]*"')
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# element ids in a compact line are the numbers outside of the quoted text that are not attribute refs
+_QUOTED_RE = re.compile(r'"[^"]*"')
+_ID_RE = re.compile(r"(?<![@\w])\d+\b")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    rough token count (punctuation and ~4 characters of a word per token), good enough to compare two ways of writing
+    the same thing without a tokenizer
+    """
+    return sum(-(-len(piece) // 4) for piece in _TOKEN_RE.findall(text))
+
+
+def _cap(value: str, max_len: int) -> str:
+    return value if len(value) <= max_len else value[: max_len - 1] + "…"
+
+
+@dataclass
+class CompactElement:
+    kind: str
+    element_id: int
+    meta: str
+    text: str | None
+    suffix: str = ""
+
+
+@dataclass
+class CompactElements:
+    """what goes in the prompt: browser_content=lines, element_legend=legend"""
+
+    lines: List[str]
+    legend: List[str]
+    # element id -> the original element string, to map what the model gives back
+    elements: Dict[int, str] = field(default_factory=dict, repr=False)
+    tokens_before: int = 0
+    tokens: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens
+
+    def original(self, line: str) -> List[str]:
+        """original element strings for the ids in a line the model wrote back (e.g. from filter_actions)"""
+        ids = _ID_RE.findall(_QUOTED_RE.sub("", line))
+        return [self.elements[int(i)] for i in ids if int(i) in self.elements]
+
+
+def parse_element(element: str) -> CompactElement | None:
+    if (match := _ELEMENT_RE.match(element)) is None:
+        return None
+    return CompactElement(match["kind"], int(match["id"]), match["meta"].strip(), match["text"], match["suffix"] or "")
+
+
+def compact_elements(
+    elements: Sequence[str],
+    min_repeats: int = 2,
+    min_attribute_len: int = 8,
+    min_group: int = 3,
+    max_text_len: int = 80,
+    max_value_len: int = 40,
+) -> CompactElements:
+    """
+    elements are the strings from elements_of_interest.  attributes seen at least min_repeats times (and longer than
+    min_attribute_len) go in the legend, runs of at least min_group elements are put on one line
+    """
+    parsed: List[Tuple[str, CompactElement | None]] = [(element, parse_element(element)) for element in elements]
+
+    def _cap_attribute(attribute: str) -> str:
+        key, value = attribute.split("=", 1)
+        return f'{key}="{_cap(value[1:-1], max_value_len)}"'
+
+    # dict.fromkeys so ties in most_common are in the order they are first seen
+    counts = Counter(
+        attribute for _, el in parsed if el is not None for attribute in dict.fromkeys(_ATTRIBUTE_RE.findall(el.meta))
+    )
+    refs = {}
+    legend = []
+    for attribute, count in counts.most_common():
+        if count < min_repeats or len(attribute) < min_attribute_len:
+            continue
+        # only if the legend line costs less than writing it out every time
+        ref_tokens, attribute_tokens = estimate_tokens(f"@{len(refs) + 1}"), estimate_tokens(attribute)
+        if count * attribute_tokens <= count * ref_tokens + attribute_tokens + ref_tokens + 1:
+            continue
+        refs[attribute] = f"@{len(refs) + 1}"
+        legend.append(f"{refs[attribute]} = {_cap_attribute(attribute)}")
+
+    def _meta(meta: str) -> str:
+        meta = _ATTRIBUTE_RE.sub(lambda m: refs.get(m[0]) or _cap_attribute(m[0]), meta)
+        return _cap(meta, max_text_len)
+
+    def _text(el: CompactElement) -> str:
+        return f' "{_cap(el.text, max_text_len)}"{el.suffix}' if el.text is not None else ""
+
+    lines, kinds_used = [], set()
+    run: List[CompactElement] = []
+
+    def _flush():
+        if not run:
+            return
+        kind, meta = KIND_ABBREVIATIONS.get(run[0].kind, run[0].kind), _meta(run[0].meta)
+        kinds_used.add(run[0].kind)
+        meta = f" {meta}" if meta else ""
+        if len(run) >= min_group:
+            lines.append(f"{kind}{meta}: " + "; ".join(f"{el.element_id}{_text(el)}" for el in run))
+        else:
+            lines.extend(f"{kind} {el.element_id}{meta}{_text(el)}" for el in run)
+        run.clear()
+
+    for element, el in parsed:
+        if el is None:
+            # not something format_element made, keep it as is
+            _flush()
+            lines.append(element)
+            continue
+        if run and (el.kind != run[0].kind or _meta(el.meta) != _meta(run[0].meta)):
+            _flush()
+        run.append(el)
+    _flush()
+
+    abbreviated = [f"{KIND_ABBREVIATIONS[kind]}={kind}" for kind in KIND_ABBREVIATIONS if kind in kinds_used]
+    if abbreviated:
+        legend.insert(0, " ".join(abbreviated))
+
+    return CompactElements(
+        lines=lines,
+        legend=legend,
+        elements={el.element_id: element for element, el in parsed if el is not None},
+        tokens_before=estimate_tokens("\n".join(elements)),
+        tokens=estimate_tokens("\n".join(legend + lines)),
+    )
@@ -0,0 +1,135 @@
+import unittest
+
+from clippy.crawler.parser.ax_tree import AXTreeParser
+from clippy.crawler.parser.dom_snapshot import element_allowed_fn
+
+
+def _ax(node_id: int, role: str, name: str = "", children: list[int] = (), parent: int = None, **kwargs) -> dict:
+    node = {
+        "nodeId": str(node_id),
+        "ignored": kwargs.pop("ignored", False),
+        "role": {"type": "role", "value": role},
+        "name": {"type": "computedString", "value": name},
+        "childIds": [str(c) for c in children],
+        "backendDOMNodeId": 100 + node_id,
+        **kwargs,
+    }
+    if parent is not None:
+        node["parentId"] = str(parent)
+    return node
+
+
+AX_TREE = {
+    "nodes": [
+        _ax(1, "RootWebArea", "Hacker News", children=[2, 3, 5, 6, 8, 9, 10]),
+        _ax(2, "link", "Hacker News", children=[4], parent=1),
+        _ax(3, "button", "Search", parent=1),
+        _ax(4, "StaticText", "Hacker News", parent=2),
+        _ax(
+            5,
+            "combobox",
+            "search",
+            parent=1,
+            value={"type": "string", "value": "cats"},
+            properties=[{"name": "editable", "value": {"type": "token", "value": "plaintext"}}],
+        ),
+        _ax(6, "generic", "", children=[7], parent=1, ignored=True),
+        _ax(7, "StaticText", "some text", parent=6),
+        _ax(8, "StaticText", "|", parent=1),
+        _ax(9, "link", "far away link", parent=1),
+        _ax(10, "button", "", parent=1),
+    ]
+}
+
+# document boxes (x, y, width, height) by backend node id
+BOXES = {
+    102: (10, 10, 80, 20),
+    103: (100, 10, 60, 20),
+    105: (200, 10, 200, 20),
+    107: (0, 100, 100, 20),
+    108: (0, 130, 10, 20),
+    109: (10, 9000, 80, 20),
+}
+
+
+class _FakeCDPClient:
+    def __init__(self):
+        self.calls = []
+
+    async def send(self, method: str, params: dict = None):
+        self.calls.append(method)
+        if method == "Accessibility.getFullAXTree":
+            return AX_TREE
+        if method == "DOMSnapshot.captureSnapshot":
+            # layout only, nodes without a box have no layout entry and a node can have more than one (the first counts)
+            backend_node_ids = [101, *BOXES, 102]
+            layout_nodes = [index for index, backend_node_id in enumerate(backend_node_ids) if backend_node_id in BOXES]
+            return {
+                "documents": [
+                    {
+                        "nodes": {"backendNodeId": backend_node_ids},
+                        "layout": {
+                            "nodeIndex": layout_nodes,
+                            "bounds": [list(BOXES[backend_node_ids[index]]) for index in layout_nodes[:-1]]
+                            + [[0, 0, 1, 1]],
+                        },
+                    }
+                ]
+            }
+        raise ValueError(method)
+
+
+class _FakeCrawler:
+    page = None
+
+    def __init__(self, scroll_y: int = 0, pixel_ratio: float = 1):
+        self.cdp_client = _FakeCDPClient()
+        self.scroll_y = scroll_y
+        self.pixel_ratio = pixel_ratio
+
+    async def page_size(self):
+        return self.pixel_ratio, 0, self.scroll_y, self.scroll_y, 0, 1280, 1080
+
+
+class TestAXTreeParser(unittest.IsolatedAsyncioTestCase):
+    async def test_parse(self):
+        crawler = _FakeCrawler()
+        parser = AXTreeParser(crawler)
+        elements = await parser.parse()
+
+        self.assertEqual(
+            elements,
+            [
+                'link 0 "Hacker News"',
+                'button 1 "Search"',
+                'input 2 value="cats" "search"',
+                'text 3 "some text"',
+            ],
+        )
+        self.assertEqual(list(filter(element_allowed_fn, elements)), elements[:3])
+
+        # same coordinate fields as the snapshot parser so get_loc_helper works
+        button = parser.page_element_buffer[1]
+        self.assertEqual((button["origin_x"], button["origin_y"]), (100, 10))
+        self.assertEqual((button["center_x"], button["center_y"]), (130, 20))
+        self.assertEqual(button["backend_node_id"], 103)
+
+        # one request for all the boxes no matter how many nodes
+        self.assertEqual(
+            sorted(crawler.cdp_client.calls), ["Accessibility.getFullAXTree", "DOMSnapshot.captureSnapshot"]
+        )
+
+    async def test_scrolled(self):
+        parser = AXTreeParser(_FakeCrawler(scroll_y=8500))
+        elements = await parser.parse()
+
+        # buffer is in document coords like the snapshot
+        self.assertEqual(elements, ['link 0 "far away link"'])
+        self.assertEqual(parser.page_element_buffer[0]["origin_y"], 9000)
+
+    async def test_pixel_ratio(self):
+        # boxes are scaled by the pixel ratio before the window check, same as the snapshot parser
+        parser = AXTreeParser(_FakeCrawler(scroll_y=4300, pixel_ratio=2))
+        self.assertEqual(await parser.parse(), ['link 0 "far away link"'])
+        element = parser.page_element_buffer[0]
+        self.assertEqual((element["origin_x"], element["origin_y"], element["bounds"]), (5, 4500, [5, 4500, 40, 10]))
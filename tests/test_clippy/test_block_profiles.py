@@ -0,0 +1,102 @@
+import unittest
+
+from clippy.crawler.block_profiles import BLOCK_PROFILES, BLOCKED_ERROR, RequestStats, get_block_profile
+from clippy.crawler.crawler import Crawler
+from tests.test_clippy.test_browser_pool import _pool
+
+
+class _Frame:
+    parent_frame = None
+
+
+class _Request:
+    def __init__(self, url, resource_type="script", navigation=False, failure=None):
+        self.url = url
+        self.resource_type = resource_type
+        self.navigation = navigation
+        self.failure = failure
+        self.frame = _Frame()
+
+    def is_navigation_request(self):
+        return self.navigation
+
+
+class _Popup:
+    async def opener(self):
+        return object()
+
+
+class TestBlockProfiles(unittest.IsolatedAsyncioTestCase):
+    def test_profiles(self):
+        lean = get_block_profile("lean")
+        self.assertFalse(get_block_profile(None).enabled)
+        self.assertIn("*.png?*", lean.url_patterns())
+        self.assertIn("*.doubleclick.net/*", lean.url_patterns())
+        with self.assertRaises(ValueError):
+            get_block_profile("everything")
+
+        exact = BLOCK_PROFILES["lean-exact"]
+        self.assertTrue(exact.blocks(_Request("https://example.com/logo", resource_type="image")))
+        self.assertTrue(exact.blocks(_Request("https://stats.g.doubleclick.net/collect")))
+        self.assertFalse(exact.blocks(_Request("https://notdoubleclick.net/app.js")))
+
+    def test_request_stats(self):
+        stats = RequestStats()
+        first, second = "https://example.com/", "https://example.com/next"
+        image = _Request(f"{first}logo.png", resource_type="image")
+        for request in (_Request(first, navigation=True), _Request(f"{first}app.js"), image):
+            stats.on_request(request)
+        stats.on_request(_Request(second, navigation=True))
+        # blocked after the next page started still counts for the page it was requested on
+        image.failure = BLOCKED_ERROR
+        stats.on_request_failed(image)
+        self.assertEqual(stats.report(), {first: {"allowed": 2, "blocked": 1}, second: {"allowed": 1, "blocked": 0}})
+
+    async def test_crawler(self):
+        pool = _pool()
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        # nothing is routed through python by default
+        self.assertEqual(crawler.ctx.routes, [])
+        self.assertEqual(crawler.cdp_client.sent, [])
+        await crawler.end()
+
+        crawler = Crawler(pool=pool, block_profile="lean")
+        await crawler.start()
+        self.assertEqual(crawler.ctx.routes, [])
+        method, params = crawler.cdp_client.sent[-1]
+        self.assertEqual((method, params["urls"]), ("Network.setBlockedURLs", BLOCK_PROFILES["lean"].url_patterns()))
+        await crawler.end()
+
+        crawler = Crawler(pool=pool, block_profile="lean-exact")
+        await crawler.start()
+        ctx = crawler.ctx
+        self.assertEqual(len(ctx.routes), 1)
+        await crawler.end()
+        # the route goes with the lease
+        self.assertEqual(ctx.routes, [])
+        await pool.close()
+
+    async def test_opened_pages(self):
+        pool = _pool(reuse_contexts=True)
+        crawler = Crawler(pool=pool, block_profile="lean")
+        await crawler.start()
+        ctx = crawler.ctx
+        # the crawler's own page (and tabs) are not set up twice
+        tab = await crawler.new_tab()
+        self.assertEqual(len(ctx.cdp_sessions), 2)
+
+        # a popup the site opens gets the blocking on its own cdp session and its requests are counted
+        popup, watched = _Popup(), []
+        crawler.request_stats.watch = watched.append
+        for listener in ctx.listeners["page"]:
+            await listener(popup)
+        method, params = ctx.cdp_sessions[-1].sent[-1]
+        self.assertEqual((method, params["urls"]), ("Network.setBlockedURLs", BLOCK_PROFILES["lean"].url_patterns()))
+        self.assertEqual(watched, [popup])
+
+        await tab.end()
+        await crawler.end()
+        # the context goes back to the pool without the listener
+        self.assertEqual(ctx.listeners["page"], [])
+        await pool.close()
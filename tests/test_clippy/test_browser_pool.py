@@ -0,0 +1,280 @@
+import asyncio
+import unittest
+
+from clippy.crawler.browser_pool import BrowserPool
+from clippy.crawler.crawler import Crawler
+
+# just enough of playwright for the pool/crawler to start and end, without a browser
+
+
+class _CDPSession:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, method, params=None):
+        self.sent.append((method, params))
+
+    async def detach(self):
+        pass
+
+
+class _Request:
+    def __init__(self, url, resource_type):
+        self.url = url
+        self.resource_type = resource_type
+
+
+class _Page:
+    def __init__(self, context):
+        self.context = context
+        self.closed = False
+        self.media = {}
+        self.init_scripts = []
+
+    def on(self, event, fn):
+        pass
+
+    async def opener(self):
+        return None
+
+    async def set_viewport_size(self, size):
+        pass
+
+    async def emulate_media(self, **kwargs):
+        self.media.update(kwargs)
+
+    async def add_init_script(self, script=None, path=None):
+        self.init_scripts.append(script or path)
+
+    async def close(self):
+        self.closed = True
+        self.context.pages.remove(self)
+
+
+class _Context:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = []
+        self.exposed = {}
+        self.routes = []
+        self.listeners = {}
+        self.cdp_sessions = []
+        self.init_scripts = []
+        self.har = None
+        self.cookies_cleared = False
+        self.closed = False
+
+    def on(self, event, fn):
+        self.listeners.setdefault(event, []).append(fn)
+
+    def remove_listener(self, event, fn):
+        self.listeners[event].remove(fn)
+
+    async def route(self, url, handler):
+        self.routes.append((url, handler))
+
+    async def unroute(self, url, handler):
+        self.routes.remove((url, handler))
+
+    async def route_from_har(self, har, **kwargs):
+        self.har = (har, kwargs)
+
+    async def expose_function(self, name, fn):
+        self.exposed[name] = fn
+
+    async def add_init_script(self, path=None):
+        self.init_scripts.append(path)
+
+    async def new_page(self):
+        self.pages.append(page := _Page(self))
+        # like playwright, the page event comes before new_page returns
+        for listener in self.listeners.get("page", []):
+            await listener(page)
+        return page
+
+    async def new_cdp_session(self, page):
+        self.cdp_sessions.append(session := _CDPSession())
+        return session
+
+    async def clear_cookies(self):
+        self.cookies_cleared = True
+
+    async def clear_permissions(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+class _Browser:
+    def __init__(self):
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        self.contexts.append(ctx := _Context(self))
+        return ctx
+
+    async def close(self):
+        self.connected = False
+
+
+class _Chromium:
+    def __init__(self):
+        self.launched = []
+
+    async def launch(self, **kwargs):
+        self.launched.append(browser := _Browser())
+        return browser
+
+
+class _Playwright:
+    def __init__(self):
+        self.chromium = _Chromium()
+
+    async def stop(self):
+        pass
+
+
+def _pool(**kwargs) -> BrowserPool:
+    pool = BrowserPool(idle_timeout=None, **kwargs)
+    pool.pw, pool.selectors = _Playwright(), []
+    return pool
+
+
+class TestBrowserPool(unittest.IsolatedAsyncioTestCase):
+    async def test_lease(self):
+        pool = _pool(size=2)
+        await pool.start(n_browsers=1)
+        self.assertEqual(pool.stats()["warm"], 1)
+        warm_ctx = pool.browsers[0].warm[0].ctx
+
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        self.assertIs(crawler.ctx, warm_ctx)
+        self.assertIs(crawler.pw, pool.pw)
+
+        # metrics changed from the page goes to the crawler that has the context
+        crawler._page_metrics = {"scrollY": 0}
+        warm_ctx.exposed["__clippyMetricsChanged"]()
+        self.assertIsNone(crawler._page_metrics)
+
+        # a second task at the same time gets a new browser since there is room
+        other = Crawler(pool=pool)
+        await other.start()
+        self.assertIsNot(other.browser, crawler.browser)
+        self.assertEqual(len(pool.pw.chromium.launched), 2)
+
+        await crawler.end()
+        await other.end()
+        await pool.close()
+        # the used context is not handed out again, the browser stays until the pool is closed
+        self.assertTrue(warm_ctx.closed)
+        self.assertEqual(pool.stats()["leased"], 0)
+        self.assertEqual(pool.warm_hits, 1)
+
+    async def test_reuse_contexts(self):
+        pool = _pool(size=1, reuse_contexts=True)
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        ctx = crawler.ctx
+        for url, resource_type in [
+            ("https://example.com/page", "document"),
+            ("https://ads.example.net/frame", "document"),
+            ("https://cdn.example.com/app.js", "script"),
+        ]:
+            for listener in ctx.listeners["request"]:
+                listener(_Request(url, resource_type))
+        await crawler.end()
+        self.assertFalse(ctx.closed)
+        self.assertTrue(ctx.cookies_cleared)
+        self.assertEqual(ctx.pages, [])
+        # storage of every origin a document was loaded from is cleared, not just cookies
+        self.assertEqual(
+            ctx.cdp_sessions[-1].sent,
+            [
+                ("Network.clearBrowserCache", None),
+                ("Storage.clearDataForOrigin", {"origin": "https://ads.example.net", "storageTypes": "all"}),
+                ("Storage.clearDataForOrigin", {"origin": "https://example.com", "storageTypes": "all"}),
+            ],
+        )
+
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        self.assertIs(crawler.ctx, ctx)
+        await crawler.end()
+        await pool.close()
+
+    async def test_max_uses_and_health(self):
+        pool = _pool(size=1, max_uses_per_browser=2)
+        for _ in range(2):
+            crawler = Crawler(pool=pool)
+            await crawler.start()
+            await crawler.end()
+        # retired after 2 uses and closed once it was given back
+        first = pool.pw.chromium.launched[0]
+        self.assertFalse(first.connected)
+        self.assertEqual(pool.browsers, [])
+
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        second = crawler.browser
+        self.assertIsNot(second, first)
+        await crawler.end()
+
+        # a browser that crashed is replaced
+        second.connected = False
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        self.assertEqual(len(pool.pw.chromium.launched), 3)
+        await crawler.end()
+        await pool.close()
+
+    async def test_failed_warm(self):
+        pool = _pool(size=2)
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        await crawler.end()
+        pooled = pool.browsers[0]
+
+        async def crash(**kwargs):
+            raise RuntimeError("browser crashed")
+
+        # the next background warm up fails, the browser is retired and closed instead of the error being lost
+        pooled.browser.new_context = crash
+        pooled.warm.clear()
+        pool._in_background(pool._warm(pooled), pooled)
+        # the failed warm up, then the close it schedules
+        for _ in range(2):
+            await asyncio.gather(*pool._background, return_exceptions=True)
+        self.assertTrue(pooled.retired)
+        self.assertNotIn(pooled, pool.browsers)
+        await pool.close()
+
+    async def test_track_dirty(self):
+        # the dirty tracker observes every mutation, only contexts for incremental parsing get it
+        for track_dirty in (False, True):
+            pool = _pool(size=1, track_dirty=track_dirty)
+            crawler = Crawler(pool=pool, track_dirty=track_dirty)
+            await crawler.start()
+            self.assertIn(Crawler.settle_injection_script, crawler.ctx.init_scripts)
+            self.assertEqual(Crawler.dirty_tracker_injection_script in crawler.ctx.init_scripts, track_dirty)
+            await crawler.end()
+            await pool.close()
+
+    async def test_evict_idle(self):
+        pool = _pool(size=2)
+        pool.idle_timeout = 10
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        await crawler.end()
+        browser = pool.browsers[0]
+
+        await pool.evict_idle(now=browser.last_used + 5)
+        self.assertEqual(len(pool.browsers), 1)
+        await pool.evict_idle(now=browser.last_used + 11)
+        self.assertEqual((len(pool.browsers), pool.evicted), (0, 1))
+        await pool.close()
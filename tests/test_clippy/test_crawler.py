@@ -41,6 +41,21 @@ class TestCrawler(unittest.IsolatedAsyncioTestCase):
             await crawler.page.goto(f"{site.url}/index.html")
             await asyncio.sleep(3)
 
+    async def test_page_metrics(self):
+        crawler = self.crawler
+        await crawler.start()
+        await crawler.page.goto("data:text/html,<div style='height: 5000px'>tall page</div>")
+
+        metrics = await crawler.page_metrics()
+        self.assertEqual(metrics["scrollY"], 0)
+        # cached until something changes
+        self.assertIs(await crawler.page_metrics(), metrics)
+
+        await crawler.page.evaluate("window.scrollTo(0, 1000)")
+        await asyncio.sleep(0.5)
+        page_size = await crawler.page_size()
+        self.assertEqual(page_size[2], 1000)
+
     async def test_using_page_api(self):
         crawler = self.crawler
         await crawler.start()
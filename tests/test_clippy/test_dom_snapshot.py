@@ -0,0 +1,704 @@
+import base64
+import copy
+import json
+import math
+import shutil
+import subprocess
+import unittest
+
+import numpy as np
+
+from clippy.crawler.parser.dom_extract import INT32_KEYS, extracted_tree, unpack_payload
+from clippy.crawler.parser.dom_snapshot import DOMSnapshotParser
+from clippy.crawler.parser.element_table import ElementTable
+from clippy.crawler.parser.parse_cache import ParseCache
+from clippy.crawler.parser.parse_executor import ParseExecutor, decode_snapshot, encode_snapshot
+from clippy.crawler.parser.snapshot_index import SnapshotIndex
+from clippy.crawler.parser.spatial_index import SpatialIndex
+from clippy.crawler.selectors import ExtractSelector
+
+
+class _OfflineCrawler:
+    # parse_tree only needs the snapshot, these are used for the live page
+    page = None
+    cdp_client = None
+
+
+def make_snapshot(nodes: list[tuple], frames: dict[int, tuple[list[tuple], tuple[int, int]]] = None) -> dict:
+    """build a DOMSnapshot.captureSnapshot like dict from
+    (parent_index, node_name, attributes, node_value, bounds | None, display | (display, background-color))
+    frames is iframe node -> (nodes of the document in it, (scroll x, scroll y)), bounds in frames are frame coords
+    """
+    strings = []
+    documents = []
+
+    def _s(value: str) -> int:
+        if value not in strings:
+            strings.append(value)
+        return strings.index(value)
+
+    def _document(nodes: list[tuple], scroll: tuple[int, int] = (0, 0)) -> dict:
+        doc_nodes = {
+            "parentIndex": [],
+            "nodeType": [],
+            "nodeName": [],
+            "nodeValue": [],
+            "backendNodeId": [],
+            "attributes": [],
+            "textValue": {"index": [], "value": []},
+            "inputValue": {"index": [], "value": []},
+            "inputChecked": {"index": []},
+            "isClickable": {"index": []},
+            "contentDocumentIndex": {"index": [], "value": []},
+        }
+        layout = {"nodeIndex": [], "bounds": [], "styles": [], "text": [], "paintOrders": []}
+        document = {"nodes": doc_nodes, "layout": layout, "textBoxes": {}}
+        document["scrollOffsetX"], document["scrollOffsetY"] = scroll
+        documents.append(document)
+
+        for idx, (parent, name, attributes, value, bounds, display) in enumerate(nodes):
+            doc_nodes["parentIndex"].append(parent)
+            doc_nodes["nodeType"].append(3 if name == "#text" else 1)
+            doc_nodes["nodeName"].append(_s(name))
+            doc_nodes["nodeValue"].append(_s(value) if value is not None else -1)
+            doc_nodes["backendNodeId"].append(100 * len(documents) + idx)
+            doc_nodes["attributes"].append([_s(v) for kv in attributes.items() for v in kv])
+            if name in ("A", "BUTTON"):
+                doc_nodes["isClickable"]["index"].append(idx)
+
+            if bounds is not None:
+                layout["nodeIndex"].append(idx)
+                layout["bounds"].append(bounds)
+                styles = (display,) if isinstance(display, str) else display
+                layout["styles"].append([_s(style) for style in styles])
+                layout["text"].append(-1)
+                layout["paintOrders"].append(len(layout["paintOrders"]))
+        return document
+
+    document = _document(nodes)
+    for iframe_node, (frame_nodes, scroll) in (frames or {}).items():
+        document["nodes"]["contentDocumentIndex"]["index"].append(iframe_node)
+        document["nodes"]["contentDocumentIndex"]["value"].append(len(documents))
+        _document(frame_nodes, scroll)
+
+    return {"strings": strings, "documents": documents}
+
+
+SIMPLE_PAGE_NODES = [
+    (-1, "#document", {}, None, [0, 0, 1280, 2000], "block"),
+    (0, "HTML", {}, None, [0, 0, 1280, 2000], "block"),
+    (1, "BODY", {}, None, [0, 0, 1280, 2000], "block"),
+    (2, "A", {"href": "/news", "class": "nav"}, None, [10, 10, 80, 20], "inline"),
+    (3, "#text", {}, "Hacker News", [10, 10, 80, 20], "inline"),
+    (2, "BUTTON", {"aria-label": "Search", "type": "submit"}, None, [100, 10, 60, 20], "inline-block"),
+    (2, "INPUT", {"type": "text", "placeholder": "search..."}, None, [200, 10, 200, 20], "inline-block"),
+    (2, "DIV", {"class": "hidden"}, None, [0, 50, 100, 100], "none"),
+    (7, "#text", {}, "should not show", None, "block"),
+    (2, "SPAN", {}, None, [0, 100, 100, 20], "inline"),
+    (9, "#text", {}, "some text", [0, 100, 100, 20], "inline"),
+    (2, "A", {"href": "/far"}, None, [10, 9000, 80, 20], "inline"),
+    (11, "#text", {}, "far away link", [10, 9000, 80, 20], "inline"),
+    (2, "SCRIPT", {}, None, None, "none"),
+]
+
+SIMPLE_PAGE = make_snapshot(SIMPLE_PAGE_NODES)
+
+
+class TestDOMSnapshotParser(unittest.TestCase):
+    def parse(self, tree: dict = SIMPLE_PAGE, **kwargs):
+        # keep_device_ratio so the darwin pixel ratio quirk does not change the bounds
+        kwargs.setdefault("cache", None)
+        parser = DOMSnapshotParser(_OfflineCrawler(), keep_device_ratio=True, **kwargs)
+        parser.parse_tree(copy.deepcopy(tree), 0, 1280, 0, 1080, 1)
+        return parser
+
+    def test_parse_tree(self):
+        parser = self.parse()
+        self.assertEqual(
+            parser.elements_of_interest,
+            [
+                'link 0 "Hacker News"',
+                'button 1 aria-label="Search"',
+                "input 2 text search...",
+                'text 3 "some text"',
+            ],
+        )
+        self.assertEqual(parser.ids_of_interest, [0, 1, 2, 3])
+
+        button = parser.page_element_buffer[1]
+        self.assertEqual((button["origin_x"], button["origin_y"]), (100, 10))
+        self.assertEqual((button["center_x"], button["center_y"]), (130, 20))
+
+    def test_numpy_engine_matches(self):
+        python_parser = self.parse(engine="python")
+        numpy_parser = self.parse(engine="numpy")
+
+        self.assertEqual(python_parser.elements_of_interest, numpy_parser.elements_of_interest)
+        self.assertEqual(python_parser.ids_of_interest, numpy_parser.ids_of_interest)
+        self.assertEqual(python_parser.page_element_buffer, numpy_parser.page_element_buffer)
+
+    def test_patch_tree(self):
+        parser = self.parse(incremental=True)
+
+        # button label changed, everything else on the page is the same
+        tree = copy.deepcopy(SIMPLE_PAGE)
+        strings = tree["strings"]
+        strings.append("Find")
+        tree["documents"][0]["nodes"]["attributes"][5][1] = len(strings) - 1
+
+        dirty_rects = [{"x": 100, "y": 10, "width": 60, "height": 20}]
+        parser.patch_tree(tree, dirty_rects, 0, 1280, 0, 1080, 1)
+
+        # button was parsed again but it is the same node so it keeps its id
+        self.assertEqual(
+            parser.elements_of_interest,
+            [
+                'link 0 "Hacker News"',
+                'button 1 aria-label="Find"',
+                "input 2 text search...",
+                'text 3 "some text"',
+            ],
+        )
+        self.assertEqual(parser.page_element_buffer[1]["backend_node_id"], 105)
+
+    def test_patch_tree_scrolled(self):
+        parser = self.parse(incremental=True)
+        # nothing changed but scrolled so the top of the page is out of view and the far link is in view
+        parser.patch_tree(parser.tree, [], 8000, 640, 0, 540, 1)
+        self.assertEqual(parser.elements_of_interest, ['link 4 "far away link"'])
+
+    def test_iter_tree(self):
+        expected = self.parse()
+        parser = DOMSnapshotParser(_OfflineCrawler(), keep_device_ratio=True, cache=None)
+
+        parsed = parser.iter_tree(copy.deepcopy(SIMPLE_PAGE), 0, 1280, 0, 1080, 1)
+        first = [next(parsed) for _ in range(2)]
+        self.assertEqual([el for el, _, _ in first], expected.elements_of_interest[:2])
+        self.assertEqual(parser.ids_of_interest, [0, 1])
+        self.assertEqual(first[1][2], expected.page_element_buffer[1])
+
+        self.assertEqual([el for el, _, _ in parsed], expected.elements_of_interest[2:])
+        self.assertEqual(parser.page_element_buffer, expected.page_element_buffer)
+
+    def test_iter_tree_visual(self):
+        tree = copy.deepcopy(SIMPLE_PAGE)
+        # move the link below the text
+        tree["documents"][0]["layout"]["bounds"][3] = [10, 200, 80, 20]
+        tree["documents"][0]["layout"]["bounds"][4] = [10, 200, 80, 20]
+
+        parser = DOMSnapshotParser(_OfflineCrawler(), keep_device_ratio=True, cache=None)
+        elements = [el for el, _, _ in parser.iter_tree(tree, 0, 1280, 0, 1080, 1, order="visual")]
+        self.assertEqual(elements[0], 'button 0 aria-label="Search"')
+        self.assertEqual(elements[-1], 'link 3 "Hacker News"')
+
+    def test_full_page(self):
+        parser = self.parse(full_page=True)
+        self.assertEqual(parser.elements_of_interest, self.parse().elements_of_interest)
+        self.assertEqual(parser.page_elements_of_interest[-1], 'link 4 "far away link"')
+
+        # scroll down to the far link without parsing again
+        parser.set_viewport(8000, 640, 0, 540, 1)
+        self.assertEqual(parser.elements_of_interest, ['link 4 "far away link"'])
+        self.assertIsNone(parser.out_of_viewport(4, {"width": 1280, "height": 1080}))
+
+        out_of_viewport = parser.out_of_viewport(0, {"width": 1280, "height": 1080})
+        self.assertEqual(out_of_viewport.scroll, (0, 10 + 10 - 540 - 8000))
+        self.assertEqual(parser.elements_at(130, 20), [1])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            DOMSnapshotParser(_OfflineCrawler(), engine="rust")
+
+
+class _FakeLocator:
+    def __init__(self, selector: str):
+        self.selector = selector
+
+
+class _FakePage:
+    viewport_size = {"width": 1280, "height": 1080}
+
+    def __init__(self, statuses: list[str]):
+        self.statuses = statuses
+        self.evaluate_calls = []
+
+    async def evaluate(self, script: str, arg=None):
+        self.evaluate_calls.append(arg)
+        return self.statuses[: len(arg)]
+
+    def locator(self, selector: str):
+        return _FakeLocator(selector)
+
+
+FRAME_NODES = [
+    (-1, "#document", {}, None, [0, 0, 400, 1000], "block"),
+    (0, "HTML", {}, None, [0, 0, 400, 1000], "block"),
+    (1, "BODY", {}, None, [0, 0, 400, 1000], "block"),
+    (2, "BUTTON", {"aria-label": "Pay"}, None, [20, 150, 100, 30], "inline-block"),
+    (2, "A", {"href": "/hidden"}, None, [20, 600, 100, 20], "inline"),
+    (4, "#text", {}, "scrolled out of the frame", [20, 600, 100, 20], "inline"),
+]
+
+FRAMED_PAGE = make_snapshot(
+    [
+        *SIMPLE_PAGE_NODES,
+        (2, "IFRAME", {"src": "/checkout"}, None, [500, 200, 400, 300], "inline"),
+    ],
+    frames={14: (FRAME_NODES, (0, 100))},
+)
+
+
+class _Page:
+    # stands in for the playwright page, the id table is per page object
+    url = "https://news.ycombinator.com/"
+
+
+class TestStableIds(unittest.TestCase):
+    def test_same_ids_across_parses(self):
+        crawler = _OfflineCrawler()
+        crawler.page = _Page()
+
+        # scrolled to the far link first so it gets the first id
+        scrolled = DOMSnapshotParser(crawler, keep_device_ratio=True, cache=None)
+        scrolled.parse_tree(copy.deepcopy(SIMPLE_PAGE), 8000, 640, 0, 540, 1)
+        self.assertEqual(scrolled.elements_of_interest, ['link 0 "far away link"'])
+
+        # a new parser for the same page (like every step) gives the elements it already saw the same ids
+        parser = DOMSnapshotParser(crawler, keep_device_ratio=True, cache=None)
+        parser.parse_tree(copy.deepcopy(SIMPLE_PAGE), 0, 1280, 0, 1080, 1)
+        self.assertEqual(
+            parser.elements_of_interest,
+            [
+                'link 1 "Hacker News"',
+                'button 2 aria-label="Search"',
+                "input 3 text search...",
+                'text 4 "some text"',
+            ],
+        )
+        self.assertEqual([el for el, _, _ in parser.iter_tree(copy.deepcopy(SIMPLE_PAGE))], parser.elements_of_interest)
+
+        parser.parse_tree(copy.deepcopy(SIMPLE_PAGE), 8000, 640, 0, 540, 1)
+        self.assertEqual(parser.elements_of_interest, ['link 0 "far away link"'])
+        # element from before the scroll can still be used
+        self.assertEqual(parser.page_element_buffer[2]["backend_node_id"], 105)
+
+    def test_new_document(self):
+        crawler = _OfflineCrawler()
+        crawler.page = _Page()
+        parser = DOMSnapshotParser(crawler, keep_device_ratio=True, cache=None)
+        parser.parse_tree(copy.deepcopy(SIMPLE_PAGE), 8000, 640, 0, 540, 1)
+
+        # navigated, every backendNodeId is new so the ids start over
+        tree = copy.deepcopy(SIMPLE_PAGE)
+        nodes = tree["documents"][0]["nodes"]
+        nodes["backendNodeId"] = [backend_node_id + 1000 for backend_node_id in nodes["backendNodeId"]]
+        parser = DOMSnapshotParser(crawler, keep_device_ratio=True, cache=None)
+        parser.parse_tree(tree, 0, 1280, 0, 1080, 1)
+        self.assertEqual(parser.ids_of_interest, [0, 1, 2, 3])
+
+
+class TestFrames(unittest.TestCase):
+    def test_parse_frames(self):
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        parser.parse_tree(copy.deepcopy(FRAMED_PAGE), 0, 1280, 0, 1080, 1)
+        main = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        main.parse_tree(copy.deepcopy(SIMPLE_PAGE), 0, 1280, 0, 1080, 1)
+
+        # main document ids are the same as without the frame, frame elements come after
+        self.assertEqual(parser.elements_of_interest[:4], main.elements_of_interest)
+        self.assertEqual(parser.elements_of_interest[4:], ['button 4 aria-label="Pay"'])
+
+        # bounds are page coords, iframe at 500,200 and the frame is scrolled down 100
+        button = parser.page_element_buffer[4]
+        self.assertEqual((button["origin_x"], button["origin_y"]), (520, 250))
+        self.assertEqual(button["backend_node_id"], 203)
+
+    def test_iter_tree_frames(self):
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        expected = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        expected.parse_tree(copy.deepcopy(FRAMED_PAGE), 0, 1280, 0, 1080, 1)
+
+        parsed = list(parser.iter_tree(copy.deepcopy(FRAMED_PAGE), 0, 1280, 0, 1080, 1))
+        self.assertEqual([element for element, _, _ in parsed], expected.elements_of_interest)
+
+    def test_frame_outside_window(self):
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        parser.parse_tree(copy.deepcopy(FRAMED_PAGE), 0, 200, 0, 100, 1)
+        self.assertNotIn('button 4 aria-label="Pay"', parser.elements_of_interest)
+
+
+# cookie banner painted over the top of SIMPLE_PAGE, covers all of the nav link and most of the search button
+OCCLUDED_PAGE = make_snapshot(
+    SIMPLE_PAGE_NODES
+    + [
+        (2, "DIV", {"class": "cookies"}, None, [0, 0, 150, 30], ("block", "rgb(255, 255, 255)")),
+        (14, "#text", {}, "we use cookies", [0, 0, 150, 30], "inline"),
+    ]
+)
+
+
+class TestOcclusion(unittest.TestCase):
+    def test_occluded(self):
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        parser.parse_tree(copy.deepcopy(OCCLUDED_PAGE), 0, 1280, 0, 1080, 1)
+
+        self.assertEqual(
+            parser.elements_of_interest,
+            [
+                'button 0 aria-label="Search"',
+                "input 1 text search...",
+                'text 2 "some text"',
+                'text 3 "we use cookies"',
+            ],
+        )
+        self.assertEqual(parser.page_element_buffer[0]["occluded"], 0.83)
+        self.assertNotIn("occluded", parser.page_element_buffer[1])
+
+    def test_iter_tree_matches(self):
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        expected = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        expected.parse_tree(copy.deepcopy(OCCLUDED_PAGE), 0, 1280, 0, 1080, 1)
+
+        parsed = list(parser.iter_tree(copy.deepcopy(OCCLUDED_PAGE), 0, 1280, 0, 1080, 1))
+        self.assertEqual([element for element, _, _ in parsed], expected.elements_of_interest)
+
+        # visual order has other ids but the same elements
+        parsed = list(parser.iter_tree(copy.deepcopy(OCCLUDED_PAGE), 0, 1280, 0, 1080, 1, order="visual"))
+        self.assertEqual(
+            sorted(entry["backend_node_id"] for _, _, entry in parsed),
+            sorted(expected.page_element_buffer[i]["backend_node_id"] for i in expected.ids_of_interest),
+        )
+
+    def test_disabled(self):
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=None, occlusion=False)
+        parser.parse_tree(copy.deepcopy(OCCLUDED_PAGE), 0, 1280, 0, 1080, 1)
+        self.assertEqual(parser.elements_of_interest[0], 'link 0 "Hacker News"')
+
+
+# what ExtractSelector.extract_js gives for SIMPLE_PAGE: the a/button/input/span and text nodes that are laid out
+# and in the window, plus the far away anchor (ancestor tags are always sent, the first pass drops it)
+EXTRACTED_SIMPLE_PAGE = {
+    "document": "doc-1",
+    "strings": [
+        "A", "class", "nav", "#text", "Hacker News", "BUTTON", "aria-label", "Search", "type", "submit", "INPUT",
+        "text", "placeholder", "search...", "SPAN", "some text",
+    ],
+    "parentIndex": [-1, 0, -1, -1, -1, 4, -1],
+    "nodeName": [0, 3, 5, 10, 14, 3, 0],
+    "nodeValue": [-1, 4, -1, -1, -1, 15, -1],
+    "backendNodeId": [-1, -2, -3, -4, -5, -6, -7],
+    "attributes": [1, 2, 6, 7, 8, 9, 8, 11, 12, 13],
+    "attributeCounts": [2, 0, 4, 4, 0, 0, 0],
+    "inputValue": {"index": [3], "value": [-1]},
+    "isClickable": [0, 2, 3, 6],
+    "layoutNodeIndex": [0, 1, 2, 3, 4, 5, 6],
+    "bounds": [
+        10, 10, 80, 20, 10, 10, 80, 20, 100, 10, 60, 20, 200, 10, 200, 20,
+        0, 100, 100, 20, 0, 100, 100, 20, 10, 9000, 80, 20,
+    ],
+}  # fmt: skip
+
+
+def _packed(payload: dict) -> dict:
+    """payload as extract_js sends it, the number arrays as base64 typed array buffers"""
+
+    def pack(values, dtype):
+        return base64.b64encode(np.asarray(values, dtype=dtype).tobytes()).decode()
+
+    packed = dict(payload, **{key: pack(payload[key], "<i4") for key in INT32_KEYS})
+    packed["inputValue"] = {key: pack(values, "<i4") for key, values in payload["inputValue"].items()}
+    packed["bounds"] = pack(payload["bounds"], "<f8")
+    return packed
+
+
+class _ExtractPage:
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.evaluate_calls = []
+
+    async def evaluate(self, script: str, arg=None):
+        self.evaluate_calls.append(arg)
+        return _packed(self.payload)
+
+
+class _ExtractCrawler:
+    cdp_client = None
+
+    def __init__(self, payload: dict):
+        self.page = _ExtractPage(payload)
+
+    async def page_size(self):
+        return 1, 0, 0, 0, 0, 1280, 1080
+
+
+class TestBrowserExtraction(unittest.IsolatedAsyncioTestCase):
+    def test_extracted_tree(self):
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        parser.parse_tree(extracted_tree(EXTRACTED_SIMPLE_PAGE), 0, 1280, 0, 1080, 1)
+        expected = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        expected.parse_tree(copy.deepcopy(SIMPLE_PAGE), 0, 1280, 0, 1080, 1)
+
+        self.assertEqual(parser.elements_of_interest, expected.elements_of_interest)
+        self.assertEqual(parser.page_element_buffer[1]["center_x"], expected.page_element_buffer[1]["center_x"])
+
+    async def test_parse(self):
+        crawler = _ExtractCrawler(EXTRACTED_SIMPLE_PAGE)
+        parser = DOMSnapshotParser(crawler, keep_device_ratio=True, cache=None, extraction="browser", engine="numpy")
+        elements = await parser.parse()
+
+        self.assertEqual(elements[0], 'link 0 "Hacker News"')
+        (options,) = crawler.page.evaluate_calls
+        self.assertEqual(options["window"], [0, 0, 2560, 2160])
+        self.assertIn("iframe", options["blacklist"])
+
+    async def test_new_document(self):
+        crawler = _ExtractCrawler(EXTRACTED_SIMPLE_PAGE)
+        crawler.page.url = "https://news.ycombinator.com/"
+        parser = DOMSnapshotParser(crawler, keep_device_ratio=True, cache=None, extraction="browser", engine="numpy")
+        await parser.parse()
+        # the cdp parsers share the table, their ids dont collide with the extracted ones and dont reset it
+        parser.stable_ids.use_document(100)
+        parser.stable_ids[100]
+        first = parser.ids_of_interest
+
+        # a new document starts its made up ids over, so the table has to start over too
+        payload = dict(EXTRACTED_SIMPLE_PAGE, document="doc-2", backendNodeId=[-7, -6, -5, -4, -3, -2, -1])
+        crawler.page.payload = payload
+        parser = DOMSnapshotParser(crawler, keep_device_ratio=True, cache=None, extraction="browser", engine="numpy")
+        await parser.parse()
+        self.assertEqual(parser.ids_of_interest, first)
+        self.assertEqual(parser.stable_ids.documents, {"extract": "doc-2"})
+        self.assertNotIn(100, parser.stable_ids)
+
+    def test_unknown_extraction(self):
+        with self.assertRaises(ValueError):
+            DOMSnapshotParser(extraction="html")
+
+    def test_unpack_payload(self):
+        self.assertEqual(unpack_payload(_packed(EXTRACTED_SIMPLE_PAGE)), EXTRACTED_SIMPLE_PAGE)
+
+
+# runs extract_js in node on a document with a single link, just enough of the DOM for the walk
+_NODE_HARNESS = """
+globalThis.window = globalThis
+window.scrollX = 0
+window.scrollY = 30
+globalThis.Node = { ELEMENT_NODE: 1, TEXT_NODE: 3 }
+globalThis.document = { nodeType: 9, nodeName: "#document", childNodes: [] }
+document.childNodes.push({
+    nodeType: 1,
+    nodeName: "A",
+    ownerDocument: document,
+    attributes: [{ name: "href", value: "/next" }, { name: "id", value: "more" }],
+    childNodes: [],
+    getAttribute: () => null,
+    hasAttribute: (name) => name === "href",
+    getClientRects: () => [{}],
+    getBoundingClientRect: () => ({ left: 10.5, top: 20.25, width: 80, height: 20 }),
+})
+const extract = eval(process.argv[1])
+console.log(JSON.stringify(extract(JSON.parse(process.argv[2]))))
+"""
+
+
+@unittest.skipUnless(shutil.which("node"), "needs node to run extract_js")
+class TestExtractScript(unittest.TestCase):
+    def test_packed(self):
+        options = {"blacklist": [], "attributes": ["href"], "tags": ["a"], "window": [0, 0, 2560, 2160]}
+        out = subprocess.run(
+            ["node", "-e", _NODE_HARNESS, ExtractSelector.extract_js, json.dumps(dict(options, devicePixelRatio=1))],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        packed = json.loads(out.stdout)
+        # the number arrays come over as base64 strings
+        self.assertIsInstance(packed["bounds"], str)
+
+        payload = unpack_payload(packed)
+        self.assertEqual(payload["strings"], ["A", "href", "/next"])
+        self.assertEqual(payload["attributes"], [1, 2])
+        self.assertEqual(payload["backendNodeId"], [-1])
+        self.assertEqual((payload["isClickable"], payload["layoutNodeIndex"]), ([0], [0]))
+        self.assertEqual(payload["bounds"], [10.5, 50.25, 80, 20])
+        self.assertEqual(payload["inputValue"], {"index": [], "value": []})
+
+
+class TestLocatorValidation(unittest.IsolatedAsyncioTestCase):
+    async def test_get_locators_elements(self):
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        parser.parse_tree(copy.deepcopy(SIMPLE_PAGE), 0, 1280, 0, 1080, 1)
+        parser.page = _FakePage(["hit", "out_of_viewport", "hit"])
+
+        elements, locators = await parser._get_locators_elements()
+
+        # link/button/input are allowed, all checked in one evaluate
+        self.assertEqual(len(parser.page.evaluate_calls), 1)
+        self.assertEqual(parser.page.evaluate_calls[0][1], (230, 30))
+        self.assertEqual(elements, ['link 0 "Hacker News"', "input 2 text search..."])
+        self.assertEqual(locators[0].selector, "pos=60,30")
+
+
+class TestParseCache(unittest.TestCase):
+    def test_cache_hit(self):
+        cache = ParseCache()
+        uncached = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+        uncached.parse_tree(copy.deepcopy(SIMPLE_PAGE), 0, 1280, 0, 1080, 1)
+
+        for _ in range(2):
+            parser = DOMSnapshotParser(keep_device_ratio=True, cache=cache)
+            parser.parse_tree(copy.deepcopy(SIMPLE_PAGE), 0, 1280, 0, 1080, 1)
+            self.assertEqual(parser.elements_of_interest, uncached.elements_of_interest)
+            self.assertEqual(parser.page_element_buffer, uncached.page_element_buffer)
+
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # different viewport is a different entry
+        parser.parse_tree(copy.deepcopy(SIMPLE_PAGE), 8000, 1280, 0, 1080, 1)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 2, 2))
+
+    def test_paint_order(self):
+        cache = ParseCache()
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=cache)
+        parser.parse_tree(copy.deepcopy(OCCLUDED_PAGE), 0, 1280, 0, 1080, 1)
+        self.assertNotIn('link 0 "Hacker News"', parser.elements_of_interest)
+
+        # same snapshot with the banner painted under everything else, nothing is covered anymore
+        snapshot = copy.deepcopy(OCCLUDED_PAGE)
+        paint_orders = snapshot["documents"][0]["layout"]["paintOrders"]
+        paint_orders[-2:] = [-2, -1]
+        parser = DOMSnapshotParser(keep_device_ratio=True, cache=cache)
+        parser.parse_tree(snapshot, 0, 1280, 0, 1080, 1)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertEqual(parser.elements_of_interest[0], 'link 0 "Hacker News"')
+
+    def test_eviction(self):
+        cache = ParseCache(max_entries=2)
+        for key in "abc":
+            cache.put(key, [{"node_index": key}])
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.evictions, 1)
+
+        cache.get("b")
+        cache.put("d", [])
+        self.assertEqual(set(cache._entries), {"b", "d"})
+
+        cache = ParseCache(max_bytes=100)
+        cache.put("a", [{"text": "x" * 60}])
+        cache.put("b", [{"text": "y" * 60}])
+        self.assertEqual(list(cache._entries), ["b"])
+        self.assertLessEqual(cache.n_bytes, 100)
+
+
+class TestParseExecutor(unittest.IsolatedAsyncioTestCase):
+    def test_encode_snapshot(self):
+        tree = decode_snapshot(encode_snapshot(SIMPLE_PAGE))
+        nodes, expected_nodes = tree["documents"][0]["nodes"], SIMPLE_PAGE["documents"][0]["nodes"]
+        for key in ["parentIndex", "nodeName", "nodeValue", "attributes", "inputValue", "isClickable"]:
+            self.assertEqual(nodes[key], expected_nodes[key])
+        self.assertEqual(tree["documents"][0]["layout"]["styles"], SIMPLE_PAGE["documents"][0]["layout"]["styles"])
+
+    async def test_parse_in_executor(self):
+        executor = ParseExecutor(max_workers=2, min_nodes=0)
+        try:
+            await executor.warm()
+            parsers = {}
+            for name, tree in (("simple", SIMPLE_PAGE), ("framed", FRAMED_PAGE), ("occluded", OCCLUDED_PAGE)):
+                parsers[name] = DOMSnapshotParser(keep_device_ratio=True, cache=None, executor=executor)
+                await parsers[name].parse_tree_async(copy.deepcopy(tree), 0, 1280, 0, 1080, 1)
+        finally:
+            executor.shutdown()
+
+        for name, tree in (("simple", SIMPLE_PAGE), ("framed", FRAMED_PAGE), ("occluded", OCCLUDED_PAGE)):
+            expected = DOMSnapshotParser(keep_device_ratio=True, cache=None)
+            expected.parse_tree(copy.deepcopy(tree), 0, 1280, 0, 1080, 1)
+            self.assertEqual(parsers[name].elements_of_interest, expected.elements_of_interest)
+            self.assertEqual(parsers[name].page_element_buffer, expected.page_element_buffer)
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def test_query(self):
+        boxes = [(0, 0, 1280, 5000), (10, 10, 100, 20), (10, 3000, 100, 20), (600, 4000, 10, 10)]
+        index = SpatialIndex([10, 11, 12, 13], boxes, cell_size=100)
+
+        self.assertEqual(index.query(0, 0, 1280, 1080), [10, 11])
+        self.assertEqual(index.query(0, 2900, 1280, 4500), [10, 12, 13])
+        self.assertEqual(index.query(-math.inf, -math.inf, math.inf, math.inf), [10, 11, 12, 13])
+        self.assertEqual(index.at_point(605, 4005), [13, 10])
+        self.assertEqual(index.at_point(5000, 5000), [])
+        self.assertEqual(index.box(12), (10, 3000, 100, 20))
+
+
+class TestElementTable(unittest.TestCase):
+    def element(self, i: int, selectors: bool = True) -> dict:
+        element = {
+            "node_index": str(i),
+            "backend_node_id": 100 + i,
+            "node_name": "button" if i % 2 else "a",
+            "node_value": None if i % 3 else "text",
+            "node_meta": [f"id=b{i}", "class=btn"],
+            "is_clickable": i % 2 == 1,
+            "origin_x": i,
+            "origin_y": 2 * i,
+            "center_x": i + 5,
+            "center_y": 2 * i + 5,
+            "bounds": [i, 2 * i, 10.5, 10.0],
+        }
+        if selectors:
+            element["selectors"] = {"meta": "btn", "inner_text": f"go {i}", "converted_node_name": "button"}
+        return element
+
+    def test_round_trip(self):
+        table = ElementTable(capacity=2)
+        elements = {i: self.element(i, selectors=i != 3) for i in range(200)}
+        for element_id, element in elements.items():
+            table[element_id] = element
+
+        self.assertEqual(table, elements)
+        self.assertEqual(dict(table[3]), elements[3])
+        self.assertNotIn("selectors", table[3])
+        self.assertIs(table[7]["is_clickable"], True)
+
+        del table[5]
+        self.assertNotIn(5, table)
+        self.assertEqual(len(table), 199)
+
+    def test_compact(self):
+        table = ElementTable()
+        for step in range(5):
+            for element_id in range(500):
+                table[element_id] = self.element(element_id + step)
+
+        # overwritten rows are dropped once they are most of the table
+        self.assertLess(table._n, 1100)
+        self.assertEqual(table, {i: self.element(i + 4) for i in range(500)})
+
+        table.clear()
+        self.assertEqual(len(table), 0)
+
+
+class TestSnapshotIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SnapshotIndex(SIMPLE_PAGE)
+
+    def test_layout_and_attributes(self):
+        self.assertEqual(self.index.layout_row(5), 5)
+        self.assertEqual(self.index.layout_row(13), -1)
+        self.assertEqual(self.index.node_name(5), "button")
+        self.assertEqual(self.index.attributes(5), {"aria-label": "Search", "type": "submit"})
+        self.assertEqual(self.index.find_attributes(3, ["class"]), {"class": "nav"})
+
+    def test_ancestry(self):
+        self.assertEqual(self.index.ancestor(4, "a"), (True, 3))
+        self.assertEqual(self.index.ancestor(4, "button"), (False, None))
+        self.assertTrue(self.index.is_descendant(4, 2))
+        self.assertFalse(self.index.is_descendant(4, 5))
+        self.assertEqual(self.index.children(2).tolist(), [3, 5, 6, 7, 9, 11, 13])
+
+    def test_deep_tree(self):
+        # the recursive ancestry would hit the recursion limit on this
+        depth = 20_000
+        nodes = [(i - 1, "DIV" if i != 1 else "A", {}, None, [0, 0, 10, 10], "block") for i in range(depth)]
+        index = SnapshotIndex(make_snapshot(nodes))
+        self.assertEqual(index.ancestor(depth - 1, "a"), (True, 1))
+        self.assertEqual(index.subtree_range(1), (1, depth - 1))
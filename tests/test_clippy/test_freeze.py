@@ -0,0 +1,134 @@
+import json
+import shutil
+import subprocess
+import unittest
+
+from clippy.crawler.crawler import Crawler
+from tests.test_clippy.test_browser_pool import _pool
+
+
+class TestFreeze(unittest.IsolatedAsyncioTestCase):
+    async def test_off(self):
+        pool = _pool()
+        crawler = Crawler(pool=pool)
+        await crawler.start()
+        self.assertEqual((crawler.page.media, crawler.page.init_scripts), ({}, []))
+        with self.assertRaises(ValueError):
+            await crawler.advance_time(100)
+        await crawler.end()
+        await pool.close()
+
+    async def test_modes(self):
+        pool = _pool()
+        for freeze in ["motion", "time"]:
+            crawler = Crawler(pool=pool, freeze=freeze)
+            await crawler.start()
+            self.assertEqual(crawler.page.media, {"reduced_motion": "reduce"})
+            # the options have to be set before the freeze script runs
+            options, script = crawler.page.init_scripts
+            self.assertEqual(options, f"window.__clippyFreezeOptions = {json.dumps({'time': freeze == 'time'})}")
+            self.assertEqual(script, Crawler.freeze_injection_script)
+
+            # tabs are frozen the same way
+            tab = await crawler.new_tab()
+            self.assertEqual(tab.page.init_scripts, crawler.page.init_scripts)
+            await tab.end()
+            await crawler.end()
+        await pool.close()
+
+    async def test_injection(self):
+        injected = []
+
+        class _Crawler(Crawler):
+            def injection(self, ctx, script):
+                injected.append(script)
+                return super().injection(ctx, script)
+
+        pool = _pool()
+        crawler = _Crawler(pool=pool, freeze="motion")
+        await crawler.start()
+        # subclasses that customise injection see the freeze script too
+        self.assertEqual(injected, [Crawler.freeze_injection_script])
+        await crawler.end()
+        await pool.close()
+
+    async def test_advance_time(self):
+        pool = _pool()
+        crawler = Crawler(pool=pool, freeze="time")
+        await crawler.start()
+        advanced = []
+
+        async def evaluate(js, arg=None):
+            if arg is None:
+                return {"readyState": "complete"}
+            advanced.append(arg)
+            return int(arg // 16)
+
+        crawler.page.evaluate = evaluate
+        crawler.page.url = "https://example.com"
+        crawler._page_metrics = {"scrollY": 0}
+        self.assertEqual(await crawler.advance_time(100), 6)
+        self.assertIsNone(crawler._page_metrics)
+
+        # the clock moves a fixed step with every action, otherwise held timers would never run
+        crawler.settle_quiet = 0
+        await crawler.wait_for_settle()
+        self.assertEqual(advanced, [100, crawler.freeze_time_step])
+        await crawler.end()
+        await pool.close()
+
+    def test_args(self):
+        with self.assertRaises(ValueError):
+            Crawler(freeze="paused")
+
+
+# runs freeze.js in node with just enough of a window for it, timers/frames are real node timers
+_NODE_HARNESS = """
+globalThis.window = globalThis
+globalThis.Element = class { scroll() {} scrollTo() {} scrollBy() {} scrollIntoView() {} animate() {} }
+globalThis.document = { documentElement: { appendChild() {} }, createElement: () => ({}) }
+window.requestAnimationFrame = (callback) => setTimeout(() => callback(performance.now()), 1)
+window.cancelAnimationFrame = (id) => clearTimeout(id)
+window.__clippyFreezeOptions = { time: true }
+require(process.argv[1])
+
+const log = []
+function loop() { log.push("frame"); requestAnimationFrame(loop) }
+requestAnimationFrame(loop)
+setTimeout(() => log.push("once"), 0)
+setTimeout(function chain() { log.push("chain"); setTimeout(chain, 300) }, 0)
+setInterval(() => log.push("interval"), 100)
+const cleared = setInterval(() => log.push("cleared"), 50)
+clearInterval(cleared)
+
+setTimeout(() => {
+    const before = [...log]
+    log.length = 0
+    const ran = window.__clippyAdvanceTime(300)
+    console.log(JSON.stringify({ before, after: log, ran }))
+}, 50)
+"""
+
+
+@unittest.skipUnless(shutil.which("node"), "needs node to run freeze.js")
+class TestFreezeScript(unittest.TestCase):
+    def test_time(self):
+        out = subprocess.run(
+            ["node", "-e", _NODE_HARNESS, Crawler.freeze_injection_script],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result = json.loads(out.stdout)
+        # one-off timers and the first frame/timeout run for real, loops/intervals/chains are held
+        self.assertEqual(sorted(result["before"]), ["chain", "frame", "once"])
+
+        # 300ms of virtual time: a frame every 16ms, the interval every 100ms and the chain once (at 300), in order
+        after = result["after"]
+        self.assertEqual(after.count("frame"), 300 // 16)
+        self.assertEqual(after.count("interval"), 3)
+        self.assertEqual(after.count("chain"), 1)
+        self.assertNotIn("cleared", after)
+        self.assertEqual(result["ran"], len(after))
+        self.assertEqual(after.index("interval"), 100 // 16)
+        self.assertEqual(after[-1], "chain")
@@ -0,0 +1,110 @@
+import unittest
+
+from clippy.crawler.parser.dom_parser_text import LocatorResolver, element_strategies, locator_strategies
+
+
+class _Locator(tuple):
+    # compares like a tuple, count() is what playwright finds for it (the probe's count unless set in page.actual)
+    page = None
+
+    def count(self):
+        self.page.counted.append(self)
+        return self.page.actual.get(self, self.page.counts.get(self.strategy, 0))
+
+
+class _Page:
+    # counts for each strategy (what the probe would find in the page), locators are tuples with a count()
+    def __init__(self, url: str, counts: dict):
+        self.url = url
+        self.counts = counts
+        self.actual = {}
+        self.probed = []
+        self.counted = []
+
+    def evaluate(self, js, specs):
+        self.probed.append([spec["strategy"] for spec in specs])
+        return [self.counts.get(spec["strategy"], 0) for spec in specs]
+
+    def _locator(self, strategy, *values):
+        locator = _Locator(values)
+        locator.page, locator.strategy = self, strategy
+        return locator
+
+    def locator(self, css):
+        strategy = {".btn.primary": "class", '[aria-label="Search"]': "aria-label"}.get(css, css)
+        return self._locator(strategy, "locator", css)
+
+    def get_by_text(self, text, exact=False):
+        return self._locator("text", "text", text)
+
+    def get_by_role(self, role, name=None, exact=False):
+        return self._locator("role", "role", role, name)
+
+
+def _element_buffer(node_meta, inner_text="", converted_node_name="button", node_name="BUTTON"):
+    return {
+        "node_index": "1",
+        "node_meta": node_meta,
+        "node_name": node_name,
+        "node_value": "",
+        "selectors": {"inner_text": inner_text, "converted_node_name": converted_node_name},
+    }
+
+
+BUTTON = _element_buffer(['aria-label="Search"', "btn primary"], inner_text="Go")
+
+
+class TestLocatorResolver(unittest.TestCase):
+    def test_strategies(self):
+        strategies = {s.strategy: s for s in locator_strategies(BUTTON)}
+        self.assertEqual(list(strategies), ["aria-label", "role", "text", "class", "class+text"])
+        self.assertEqual(strategies["aria-label"].css, '[aria-label="Search"]')
+        self.assertEqual(strategies["class"].css, ".btn.primary")
+        self.assertEqual((strategies["role"].role, strategies["role"].text), ("button", "Go"))
+
+        strategies = element_strategies('role="button" "Sign in"')
+        self.assertEqual([(s.strategy, s.role, s.text) for s in strategies], [("role", "button", "Sign in")])
+
+    def test_resolve(self):
+        resolver = LocatorResolver()
+        # aria-label is on more than one element, the role is the first unique one
+        page = _Page("https://example.com/search?q=1", {"aria-label": 2, "role": 1, "class": 1})
+
+        self.assertEqual(resolver.resolve(BUTTON, page), ("role", "button", "Go"))
+        self.assertEqual(len(page.probed), 1)
+        self.assertEqual(resolver.wins[("example.com", "button")]["role"], 1)
+
+        # next time role goes first and on its own, checked with a single count() and no probe
+        page.probed.clear()
+        page.counted.clear()
+        self.assertEqual(resolver.resolve(BUTTON, page), ("role", "button", "Go"))
+        self.assertEqual((page.probed, page.counted), ([], [("role", "button", "Go")]))
+
+        # if it stops working the rest are probed in one go
+        page.counts["role"] = 0
+        page.probed.clear()
+        self.assertEqual(resolver.resolve(BUTTON, page), ("locator", ".btn.primary"))
+        self.assertEqual(page.probed, [["aria-label", "text", "class", "class+text"]])
+
+        page.counts = {}
+        self.assertIsNone(resolver.resolve(BUTTON, page))
+
+        stats = resolver.stats()
+        self.assertEqual((stats["resolved"], stats["unresolved"], stats["first_try_hits"]), (3, 1, 1))
+        self.assertEqual(stats["strategies"]["role"]["attempts"], 4)
+        self.assertEqual(stats["strategies"]["role"]["hits"], 2)
+        self.assertEqual(stats["strategies"]["role"]["wins"], 2)
+
+        # other sites dont use what was learned here
+        self.assertEqual(resolver.order("other.com", "button", locator_strategies(BUTTON))[0].strategy, "aria-label")
+
+    def test_confirm(self):
+        resolver = LocatorResolver()
+        # the probe thinks the role is unique but get_by_role finds 2 (e.g. a name the probe got wrong)
+        page = _Page("https://example.com", {"role": 1, "class": 1})
+        page.actual[("role", "button", "Go")] = 2
+
+        self.assertEqual(resolver.resolve(BUTTON, page), ("locator", ".btn.primary"))
+        self.assertEqual(resolver.wins[("example.com", "button")], {"class": 1})
+        stats = resolver.stats()["strategies"]["role"]
+        self.assertEqual((stats["hits"], stats["mismatches"]), (0, 1))
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from clippy.crawler.crawler import Crawler
+from tests.test_clippy.test_browser_pool import _pool, _Request
+
+
+class _Route:
+    def __init__(self, request):
+        self.request = request
+        self.result = None
+
+    async def abort(self, error_code=None):
+        self.result = error_code or "aborted"
+
+    async def continue_(self):
+        self.result = "network"
+
+    async def fallback(self):
+        self.result = "fallback"
+
+
+async def _route(ctx, request, recorded):
+    """what playwright does with a request: the last route registered goes first, then the har router"""
+    for _, handler in reversed(ctx.routes):
+        route = _Route(request)
+        await handler(route)
+        if route.result != "fallback":
+            return route.result
+    # route_from_har with not_found="abort"
+    return "har" if request.url in recorded else "aborted"
+
+
+class TestNetworkModes(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.har_path = os.path.join(self.tmp.name, "task", Crawler.har_file)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_record_replay(self):
+        pool = _pool(reuse_contexts=True)
+
+        crawler = Crawler(pool=pool, network="record", har_path=self.har_path)
+        await crawler.start()
+        ctx = crawler.ctx
+        har_options = {"update": True, "update_content": "attach", "update_mode": "minimal"}
+        self.assertEqual(ctx.har, (self.har_path, har_options))
+        await crawler.end()
+        # closed so the har is written, even though contexts are reused
+        self.assertTrue(ctx.closed)
+
+        with self.assertRaises(FileNotFoundError):
+            await Crawler(pool=pool, network="replay", har_path=self.har_path).start()
+        self.assertEqual(pool.stats()["leased"], 0)
+
+        open(self.har_path, "w").close()
+        crawler = Crawler(pool=pool, network="replay", har_path=self.har_path)
+        await crawler.start()
+        self.assertEqual(crawler.ctx.har, (self.har_path, {"not_found": "abort"}))
+        await crawler.end()
+        await pool.close()
+
+    async def test_replay_intercept(self):
+        os.makedirs(os.path.dirname(self.har_path))
+        open(self.har_path, "w").close()
+        pool = _pool()
+        crawler = Crawler(pool=pool, network="replay", har_path=self.har_path, block_profile="lean-exact")
+        await crawler.start()
+        ctx, recorded = crawler.ctx, {"https://example.com/", "https://example.com/app.js"}
+
+        self.assertEqual(await _route(ctx, _Request("https://example.com/app.js", "script"), recorded), "har")
+        # not recorded, aborted by the har router rather than fetched
+        self.assertEqual(await _route(ctx, _Request("https://example.com/api", "fetch"), recorded), "aborted")
+        self.assertEqual(await _route(ctx, _Request("https://example.com/logo", "image"), recorded), "blockedbyclient")
+
+        # a popup the site opens is in the same context so its requests go through the same routes
+        watched = []
+        crawler.request_stats.watch = watched.append
+        popup = await ctx.new_page()
+        self.assertEqual(watched, [popup])
+        self.assertEqual(await _route(ctx, _Request("https://example.com/", "document"), recorded), "har")
+        self.assertEqual(await _route(ctx, _Request("https://ads.example.com/", "document"), recorded), "aborted")
+        await crawler.end()
+        await pool.close()
+
+    def test_args(self):
+        with self.assertRaises(ValueError):
+            Crawler(network="record")
+        with self.assertRaises(ValueError):
+            Crawler(network="offline", har_path=self.har_path)
@@ -0,0 +1,45 @@
+import unittest
+
+from clippy.crawler.plugins.page_parser import (
+    Parser,
+    TextCache,
+    extract_text_fast,
+    extract_text_using_library,
+    iter_visible_text,
+)
+
+PARAGRAPH = "Some <b>bold</b> text that is long enough to be the content of the page. " + "lorem ipsum " * 40
+
+HTML = f"""<html><head><title>Title</title><style>.a {{}}</style></head>
+<body><nav>menu</nav><article><h1>Hello</h1><p>{PARAGRAPH}</p><!-- comment --><script>var x = 1</script>
+<p>Second paragraph &amp; more.</p></article></body></html>"""
+
+
+class TestPageParser(unittest.IsolatedAsyncioTestCase):
+    def test_fast(self):
+        self.assertEqual(extract_text_fast(HTML), extract_text_using_library(HTML))
+
+    def test_iter_visible_text(self):
+        chunks = list(iter_visible_text(HTML, chunk_size=100, feed_size=32))
+        self.assertGreater(len(chunks), 1)
+        text = " ".join(chunks)
+        self.assertTrue(text.startswith("menu Hello Some bold text"))
+        self.assertTrue(text.endswith("Second paragraph & more."))
+        for hidden in ("Title", "var x", "comment", ".a"):
+            self.assertNotIn(hidden, text)
+        self.assertEqual(list(iter_visible_text("")), [])
+
+    async def test_process_async(self):
+        cache = TextCache(max_entries=1)
+        text = await Parser(HTML, cache=cache).process_async()
+        self.assertEqual(text, extract_text_using_library(HTML))
+        self.assertEqual(await Parser(HTML, cache=cache).process_async(), text)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # fast is cached separately and only 1 entry fits
+        self.assertEqual(Parser(HTML, fast=True, cache=cache).process(), text)
+        self.assertEqual((len(cache), cache.evictions), (1, 1))
+
+    async def test_stream_async(self):
+        chunks = [chunk async for chunk in Parser(HTML).stream_async(chunk_size=100)]
+        self.assertEqual(chunks, list(iter_visible_text(HTML, chunk_size=100)))
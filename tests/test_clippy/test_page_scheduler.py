@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+from collections import Counter
+
+from clippy.crawler.crawler import Crawler
+from clippy.crawler.page_scheduler import PageScheduler, item_domain
+from tests.test_clippy.test_browser_pool import _pool
+
+URLS = [f"https://a.com/{i}" for i in range(6)] + [f"https://b.com/{i}" for i in range(3)] + ["https://c.com/"]
+
+
+class TestPageScheduler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = _pool()
+        self.crawler = Crawler(pool=self.pool)
+        await self.crawler.start()
+
+    async def asyncTearDown(self):
+        await self.crawler.end()
+        await self.pool.close()
+
+    async def test_map(self):
+        active, max_active, max_domain, tabs = Counter(), [0], Counter(), set()
+
+        async def handler(tab, url):
+            domain = item_domain(url)
+            active[domain] += 1
+            max_active[0] = max(max_active[0], sum(active.values()))
+            max_domain[domain] = max(max_domain[domain], active[domain])
+            tabs.add(tab)
+            await asyncio.sleep(0.01)
+            active[domain] -= 1
+            if url.endswith("/5"):
+                raise ValueError(url)
+            return url
+
+        async with PageScheduler(self.crawler, handler, concurrency=4, max_per_domain=2, max_queue=3) as scheduler:
+            results = await scheduler.map(URLS)
+            # each tab is its own page with its own cdp session in the crawler's context
+            self.assertEqual(len(scheduler.tabs), 4)
+            self.assertTrue(all(tab.ctx is self.crawler.ctx and tab.parent is self.crawler for tab in tabs))
+            self.assertEqual(len({id(tab.cdp_client) for tab in tabs}), 4)
+
+        self.assertEqual(results[:5] + results[6:], URLS[:5] + URLS[6:])
+        self.assertIsInstance(results[5], ValueError)
+        self.assertEqual(max_active[0], 4)
+        self.assertEqual(max(max_domain.values()), 2)
+        # tabs are closed with the scheduler, the crawler's own page is not
+        self.assertTrue(all(tab.page.closed for tab in tabs))
+        self.assertFalse(self.crawler.page.closed)
+        self.assertFalse(self.crawler.ctx.closed)
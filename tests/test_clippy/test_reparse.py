@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from clippy.crawler.parser.dom_snapshot import DOMSnapshotParser
+from clippy.dm.reparse import elements_path, find_snapshots, reparse_snapshot, reparse_snapshots, write_snapshot
+from tests.test_clippy.test_dom_snapshot import FRAMED_PAGE, SIMPLE_PAGE, SIMPLE_PAGE_NODES, make_snapshot
+
+PAGE_SIZE = [1, 0, 0, 0, 0, 1280, 1080]
+
+# SIMPLE_PAGE captured scrolled down to the far away link, page_size is
+# (pixel ratio, scrollX, scrollY, pageYOffset, pageXOffset, screen width, screen height) like Crawler.page_size
+SCROLLED_PAGE = make_snapshot(SIMPLE_PAGE_NODES)
+SCROLLED_PAGE["documents"][0]["scrollOffsetY"] = 8500
+SCROLLED_PAGE_SIZE = [1, 0, 8500, 8500, 0, 1280, 1080]
+
+
+class _CDPClient:
+    async def send(self, method, params=None):
+        return json.loads(json.dumps(SCROLLED_PAGE))
+
+
+class _ScrolledCrawler:
+    page = None
+    cdp_client = _CDPClient()
+
+    async def page_size(self):
+        return SCROLLED_PAGE_SIZE
+
+
+class TestReparse(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.task_data_dir = Path(self.tmp.name)
+        for task, tree in (("task1", SIMPLE_PAGE), ("task2", FRAMED_PAGE)):
+            os.makedirs(self.task_data_dir / task)
+            write_snapshot(self.task_data_dir / task / "step1.snapshot.json.gz", tree, PAGE_SIZE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reparse(self):
+        summary = reparse_snapshots(self.task_data_dir, workers=2, chunk_size=1)
+        self.assertEqual(summary, {"parsed": 2, "errors": []})
+
+        output = elements_path(self.task_data_dir / "task1" / "step1.snapshot.json.gz")
+        self.assertEqual(output.name, "step1.elements.json")
+        with open(output) as f:
+            result = json.load(f)
+        self.assertEqual(result["elements_of_interest"][0], 'link 0 "Hacker News"')
+        self.assertEqual(result["elements"]["1"]["backend_node_id"], 105)
+
+        # already done so nothing to do unless override
+        self.assertEqual(reparse_snapshots(self.task_data_dir, workers=1)["parsed"], 0)
+        self.assertEqual(reparse_snapshots(self.task_data_dir, workers=1, override=True)["parsed"], 2)
+
+    def test_stable_ids(self):
+        # ids from the page's table when the snapshot was stored, so they match the element_ids of the step's actions
+        path = self.task_data_dir / "task1" / "step1.snapshot.json.gz"
+        elements = reparse_snapshot(path)["elements"]
+        backend_node_ids = [elements[element_id]["backend_node_id"] for element_id in range(len(elements))]
+
+        write_snapshot(path, SIMPLE_PAGE, PAGE_SIZE, backend_node_ids=[1] + backend_node_ids[::-1])
+        reparsed = reparse_snapshot(path)["elements"]
+        self.assertEqual(reparsed[1]["backend_node_id"], backend_node_ids[-1])
+        self.assertEqual(reparsed[len(elements)]["backend_node_id"], backend_node_ids[0])
+
+    def test_errors(self):
+        with open(self.task_data_dir / "task1" / "step2.snapshot.json", "w") as f:
+            f.write("not json")
+
+        self.assertEqual(len(list(find_snapshots(self.task_data_dir))), 3)
+        summary = reparse_snapshots(self.task_data_dir, workers=1)
+        self.assertEqual(summary["parsed"], 2)
+        self.assertEqual([Path(path).name for path, _ in summary["errors"]], ["step2.snapshot.json"])
+
+
+class TestReparseScrolled(unittest.IsolatedAsyncioTestCase):
+    async def test_scrolled(self):
+        # the live step parses the window it was scrolled to, reparsing the stored snapshot has to give the same
+        parser = DOMSnapshotParser(_ScrolledCrawler(), cache=None)
+        await parser.parse()
+        self.assertEqual(parser.elements_of_interest, ['link 0 "far away link"'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "step1.snapshot.json.gz"
+            write_snapshot(path, parser.tree, parser.page_size, list(parser.stable_ids._backend_node_ids))
+            result = reparse_snapshot(path)
+
+        self.assertEqual(result["elements_of_interest"], parser.elements_of_interest)
+        self.assertEqual(result["ids_of_interest"], parser.ids_of_interest)
+        for element_id in parser.ids_of_interest:
+            self.assertEqual(result["elements"][element_id], dict(parser.page_element_buffer[element_id]))
@@ -0,0 +1,85 @@
+import time
+import unittest
+
+from clippy.crawler.block_profiles import RequestStats
+from clippy.crawler.settle import SettleResult, SettleTimes, busy_reasons, wait_for_settle
+
+
+class _Page:
+    """evaluate returns the next of the given states (the last one repeats), None raises like mid navigation"""
+
+    def __init__(self, *states):
+        self.states = list(states)
+        self.url = "https://example.com/page"
+
+    async def evaluate(self, js):
+        state = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        if state is None:
+            raise Exception("Execution context was destroyed")
+        return state
+
+
+class _Request:
+    def __init__(self, resource_type: str, navigation: bool = False):
+        self.resource_type = resource_type
+        self.navigation = navigation
+
+    def is_navigation_request(self):
+        return self.navigation
+
+
+def _state(readyState="complete", sinceMutation=1000, sinceShift=1000, pendingFrames=0):
+    return dict(readyState=readyState, sinceMutation=sinceMutation, sinceShift=sinceShift, pendingFrames=pendingFrames)
+
+
+class TestSettle(unittest.IsolatedAsyncioTestCase):
+    def test_busy_reasons(self):
+        self.assertEqual(busy_reasons(_state(), 0, quiet=0.3, elapsed=1), [])
+        self.assertEqual(busy_reasons(None, 0, quiet=0.3, elapsed=1), ["navigating"])
+        self.assertEqual(busy_reasons(_state(), 0, quiet=0.3, elapsed=0.1), ["waiting"])
+        self.assertEqual(
+            busy_reasons(_state("loading", 100, 50, 2), 3, quiet=0.3, elapsed=1),
+            ["loading", "network", "mutations", "layout-shift", "animation-frames"],
+        )
+        # without the injected script only the ready state is known
+        self.assertEqual(busy_reasons({"readyState": "interactive"}, 0, quiet=0.3, elapsed=1), [])
+
+    async def test_wait_for_settle(self):
+        page = _Page(None, _state("loading"), _state(sinceMutation=10), _state())
+        result = await wait_for_settle(page, quiet=0.05, timeout=5, poll=0.01)
+        self.assertTrue(result.settled)
+        self.assertEqual(result.busy, [])
+        # returns as soon as it is settled, not after the timeout
+        self.assertLess(result.elapsed, 1)
+
+        in_flight = iter([2, 1, 0])
+        result = await wait_for_settle(_Page(_state()), in_flight=lambda: next(in_flight, 0), quiet=0, poll=0.01)
+        self.assertTrue(result.settled)
+
+    async def test_timeout(self):
+        result = await wait_for_settle(_Page(_state(pendingFrames=1)), quiet=0, timeout=0.05, poll=0.01)
+        self.assertFalse(result.settled)
+        self.assertEqual(result.busy, ["animation-frames"])
+        self.assertGreaterEqual(result.elapsed, 0.05)
+
+    def test_settle_times(self):
+        times = SettleTimes()
+        times.record("a.com", SettleResult(True, 0.5, []))
+        times.record("a.com", SettleResult(False, 1.5, ["network"]))
+        times.record("b.com", SettleResult(True, 0.2, []))
+        self.assertEqual(times.stats()["a.com"], {"count": 2, "mean": 1.0, "max": 1.5, "timeouts": 1})
+        self.assertEqual(times.stats()["b.com"]["timeouts"], 0)
+
+    def test_in_flight_max_age(self):
+        stats = RequestStats(current="https://example.com")
+        now = time.monotonic()
+        poll, xhr = _Request("xhr"), _Request("fetch")
+        stats._pending = {poll: ("https://example.com", now - 30), xhr: ("https://example.com", now)}
+        self.assertEqual(stats.in_flight(), 2)
+        # the long poll does not count
+        self.assertEqual(stats.in_flight(max_age=2), 1)
+
+        # a navigation to a slow server is never aged out, the page is still going somewhere
+        stats._pending[_Request("document", navigation=True)] = ("https://example.com", now - 30)
+        stats._pending[_Request("script")] = ("https://example.com", now - 30)
+        self.assertEqual(stats.in_flight(max_age=2), 3)
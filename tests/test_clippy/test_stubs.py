@@ -2,6 +2,7 @@ import unittest
 
 from clippy import logger
 from clippy.stubs import StubTemplates
+from clippy.stubs.compact import compact_elements
 from clippy.crawler.parser.dom_snapshot import filter_page_elements
 from clippy.states.actions import Actions
 import pytest
@@ -108,3 +109,48 @@ def test_stub_filter_prompt(elements, objective, title, url):
     )
 
     assert prompt_str.endswith("Filtered Browser Content:\n")
+
+
+story_elements = [
+    'link 0 class="hnuser" "Hacker News"',
+    'link 1 class="storylink" rel="nofollow" "first story"',
+    'link 2 class="storylink" rel="nofollow" "second story"',
+    'link 3 class="storylink" rel="nofollow" "third story"',
+    'button 4 aria-label="Search"',
+    "input 5 text search...",
+    'link 6 class="hnuser" "' + "x" * 200 + '"',
+]
+
+
+def test_compact_elements():
+    compact = compact_elements(story_elements)
+
+    assert compact.legend == [
+        "a=link btn=button in=input",
+        '@1 = class="storylink"',
+        '@2 = rel="nofollow"',
+    ]
+    assert compact.lines[:4] == [
+        # only used twice, not worth a legend entry
+        'a 0 class="hnuser" "Hacker News"',
+        'a @1 @2: 1 "first story"; 2 "second story"; 3 "third story"',
+        'btn 4 aria-label="Search"',
+        "in 5 text search...",
+    ]
+    # long text is capped
+    assert compact.lines[-1].endswith("x…\"")
+    assert len(compact.lines[-1]) < len(story_elements[-1])
+    assert compact.tokens_saved > 0
+
+    # what the model gives back maps to the original elements by id
+    assert compact.original(compact.lines[1]) == story_elements[1:4]
+    assert compact.original("btn 4") == [story_elements[4]]
+
+    state = StubTemplates.state.render(
+        objective="test objective",
+        url="https://website-dot-com",
+        browser_content=compact.lines,
+        element_legend=compact.legend,
+    )
+    assert 'Legend (short names and repeated attributes used below):\n  a=link' in state
+    assert "\na @1 @2: 1" in state